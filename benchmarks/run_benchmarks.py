@@ -0,0 +1,198 @@
+"""Benchmarks for GemiCoder's local hot paths.
+
+Runs entirely offline with the fake model backend and writes the results to
+a JSON file so they can be compared between releases:
+
+    python benchmarks/run_benchmarks.py --sizes 10,1000,10000 --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Nunca chamar a API real durante os benchmarks
+os.environ['GEMICODER_BACKEND'] = 'fake'
+os.environ.pop('GEMICODER_CASSETTE', None)
+# Históricos longos passariam do orçamento e um resumo em segundo plano rodaria durante as medições
+os.environ['GEMICODER_HISTORY_BUDGET'] = str(10 ** 12)
+
+import main
+from modules import project_manager
+from modules.model_backend import Content
+from synthetic_project import generate_project, generate_projects_dir
+
+def measure(func, repeat):
+    """Runs func repeat times and returns timing stats in seconds"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "max": max(times),
+        "runs": repeat
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def new_app(base_dir):
+    app = main.GemiCoder()
+    app.base_dir = base_dir
+    return app
+
+def bench_project(workspace, size, repeat, results):
+    project = f"synthetic_{size}"
+    project_dir = os.path.join(workspace, "projects", project)
+    started = time.perf_counter()
+    total_bytes = generate_project(project_dir, size)
+    print(f"  generated {size} files ({total_bytes / 1024 / 1024:.1f} MB) in {time.perf_counter() - started:.1f}s")
+    params = {"files": size, "bytes": total_bytes}
+
+    # Índice frio: sem cache em disco nem em memória
+    def cold_structure():
+        shutil.rmtree(os.path.join(workspace, "cache", project), ignore_errors=True)
+        new_app(workspace).get_project_structure(project_dir)
+    results.append({"name": "get_project_structure.cold", "params": params, **measure(cold_structure, repeat)})
+
+    # Nova sessão com o índice persistido em disco
+    results.append({"name": "get_project_structure.persisted_index", "params": params,
+                    **measure(lambda: new_app(workspace).get_project_structure(project_dir), repeat)})
+
+    warm_app = new_app(workspace)
+    warm_app.get_project_structure(project_dir)
+    results.append({"name": "get_project_structure.warm", "params": params,
+                    **measure(lambda: warm_app.get_project_structure(project_dir), repeat)})
+
+    def add_folder(app):
+        app.persistent_files.clear()
+        app.add_folder(project, project_dir, "")
+    results.append({"name": "add_folder.new_session", "params": params,
+                    **measure(lambda: add_folder(new_app(workspace)), repeat)})
+    results.append({"name": "add_folder.warm", "params": params,
+                    **measure(lambda: add_folder(warm_app), repeat)})
+
+    results.append({"name": "codebase_prompt.new_session", "params": params,
+                    **measure(lambda: new_app(workspace).build_codebase_prompt(project_dir, "find security issues"), repeat)})
+    results.append({"name": "codebase_prompt.warm", "params": params,
+                    **measure(lambda: warm_app.build_codebase_prompt(project_dir, "find security issues"), repeat)})
+
+def make_history(length, message_size):
+    history = [Content("user", ["system prompt " * 40])]
+    for index in range(length):
+        role = "user" if index % 2 == 0 else "model"
+        history.append(Content(role, [f"message {index} " + "x" * message_size]))
+    return history
+
+def bench_chat(workspace, length, message_size, repeat, results):
+    params = {"messages": length, "message_bytes": message_size}
+    project = "chat_bench"
+    chats_dir = os.path.join(workspace, "chats", project)
+    os.makedirs(chats_dir, exist_ok=True)
+    chat_file = os.path.join(chats_dir, f"main_{length}.jsonl")
+
+    app = new_app(workspace)
+    chat = main.model.start_chat(make_history(length, message_size))
+
+    # Primeira gravação (arquivo inteiro)
+    def full_save():
+        app.chat_logs.pop(chat_file, None)
+        if os.path.exists(chat_file):
+            os.remove(chat_file)
+        app.save_chat_history(chat, chat_file)
+    results.append({"name": "save_chat_history.full", "params": params, **measure(full_save, repeat)})
+
+    # Um turno típico: duas mensagens novas em um histórico longo
+    def turn_save():
+        chat.history.append(Content("user", ["next prompt"]))
+        chat.history.append(Content("model", ["next answer " + "y" * message_size]))
+        app.save_chat_history(chat, chat_file)
+    results.append({"name": "save_chat_history.turn", "params": params, **measure(turn_save, repeat)})
+
+    chat_name = os.path.splitext(os.path.basename(chat_file))[0]
+    def load():
+        fresh = new_app(workspace)
+        fresh.start_project_chat(project, workspace, main.model, "system prompt", chat_name)
+    results.append({"name": "start_project_chat.load", "params": params, **measure(load, repeat)})
+
+def bench_list_projects(workspace, count, repeat, results):
+    projects_root = os.path.join(workspace, f"list_{count}")
+    generate_projects_dir(os.path.join(projects_root, "projects"), count)
+
+    original_dir = os.getcwd()
+    os.chdir(projects_root)
+    try:
+        manager = project_manager.ProjectManager()
+        results.append({"name": "list_projects", "params": {"projects": count},
+                        **measure(manager.list_projects, repeat)})
+    finally:
+        os.chdir(original_dir)
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark GemiCoder's local hot paths")
+    parser.add_argument("--sizes", default="10,1000,10000", help="Comma separated project sizes (files)")
+    parser.add_argument("--history", default="100,1000,5000", help="Comma separated chat history lengths")
+    parser.add_argument("--message-size", type=int, default=2000, help="Bytes per chat message")
+    parser.add_argument("--projects", default="10,1000", help="Comma separated project counts for list_projects")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--workspace", help="Directory for the synthetic data (temporary by default)")
+    args = parser.parse_args()
+
+    # Não poluir a saída com o que os comandos imprimem
+    main.console.quiet = True
+    project_manager.console.quiet = True
+
+    workspace = args.workspace or tempfile.mkdtemp(prefix="gemicoder-bench-")
+    results = []
+    try:
+        for size in [int(s) for s in args.sizes.split(",") if s]:
+            print(f"Project with {size} files")
+            bench_project(workspace, size, args.repeat, results)
+        for length in [int(s) for s in args.history.split(",") if s]:
+            print(f"Chat history with {length} messages")
+            bench_chat(workspace, length, args.message_size, args.repeat, results)
+        for count in [int(s) for s in args.projects.split(",") if s]:
+            print(f"list_projects over {count} projects")
+            bench_list_projects(workspace, count, args.repeat, results)
+    finally:
+        if not args.workspace:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat
+        },
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=4)
+
+    for result in results:
+        print(f"{result['name']:40} {json.dumps(result['params']):45} median {result['median'] * 1000:9.2f} ms")
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,87 @@
+import os
+import json
+import random
+
+# Extensões usadas nos projetos sintéticos (texto e binários)
+TEXT_EXTENSIONS = ['.py', '.js', '.ts', '.tsx', '.html', '.css', '.json', '.md', '.yml', '.sql', '.go', '.java']
+BINARY_EXTENSIONS = ['.png', '.jpg', '.woff2', '.zip']
+
+# Diretórios que GemiCoder deve ignorar
+IGNORED_DIRS = ['node_modules', '.git', '__pycache__', 'dist', 'venv']
+
+WORDS = [
+    'user', 'project', 'config', 'handler', 'service', 'model', 'view', 'router',
+    'request', 'response', 'cache', 'index', 'token', 'session', 'client', 'server'
+]
+
+def random_size(rng, min_size=100, max_size=50000):
+    # Distribuição log-uniforme: muitos arquivos pequenos, alguns grandes
+    low, high = min_size.bit_length(), max_size.bit_length()
+    return min(max_size, max(min_size, int(2 ** rng.uniform(low, high))))
+
+def text_content(rng, size):
+    lines = []
+    length = 0
+    while length < size:
+        line = f"{rng.choice(WORDS)}_{rng.randint(0, 999)} = {rng.choice(WORDS)}({rng.randint(0, 99)})  # {' '.join(rng.choices(WORDS, k=6))}"
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines)[:size]
+
+def generate_project(root, file_count, seed=42, ignored_ratio=0.1, binary_ratio=0.1, max_depth=4):
+    """Creates a synthetic project with file_count visible files.
+
+    About ignored_ratio * file_count extra files are placed inside nested
+    ignored directories, which GemiCoder must skip.
+    """
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+
+    dirs = [""]
+    dir_count = max(1, file_count // 20)
+    for _ in range(dir_count):
+        parent = rng.choice(dirs)
+        if parent.count(os.sep) + 1 >= max_depth:
+            parent = ""
+        dirs.append(os.path.join(parent, f"{rng.choice(WORDS)}_{len(dirs)}"))
+
+    total_bytes = 0
+    for index in range(file_count):
+        directory = rng.choice(dirs)
+        if rng.random() < binary_ratio:
+            extension = rng.choice(BINARY_EXTENSIONS)
+            size = random_size(rng, 200, 200000)
+            data = rng.getrandbits(size * 8).to_bytes(size, 'little')
+        else:
+            extension = rng.choice(TEXT_EXTENSIONS)
+            data = text_content(rng, random_size(rng)).encode('utf-8')
+        path = os.path.join(root, directory, f"{rng.choice(WORDS)}_{index}{extension}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        total_bytes += len(data)
+
+    # Arquivos em diretórios ignorados (aninhados)
+    for index in range(int(file_count * ignored_ratio)):
+        ignored = rng.choice(IGNORED_DIRS)
+        nested = os.path.join(rng.choice(dirs), ignored, f"pkg_{index % 7}", "src")
+        path = os.path.join(root, nested, f"dep_{index}.js")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text_content(rng, random_size(rng, 100, 5000)))
+
+    return total_bytes
+
+def generate_projects_dir(projects_dir, count, seed=42):
+    """Creates count small projects with a project.json each"""
+    rng = random.Random(seed)
+    for index in range(count):
+        project_dir = os.path.join(projects_dir, f"project_{index}")
+        os.makedirs(project_dir, exist_ok=True)
+        with open(os.path.join(project_dir, "project.json"), "w") as f:
+            json.dump({
+                "name": f"project_{index}",
+                "description": " ".join(rng.choices(WORDS, k=8)),
+                "steps": [],
+                "status": "planning"
+            }, f, indent=4)
@@ -1,27 +1,38 @@
 import os
+import threading
 from dotenv import load_dotenv
-import google.generativeai as genai
 from rich.console import Console
 from rich.prompt import Prompt
+from rich.markup import escape
 from modules.project_manager import ProjectManager
 from modules.chat_manager import ChatManager
 from modules.file_manager import FileManager
+from modules.model_backend import create_backend
+from modules.stream_renderer import StreamRenderer
+from modules.action_parser import ActionStreamParser, ActionTextFilter
+from modules.codebase_index import CodebaseIndex, is_text_file
+from modules.retrieval_index import RetrievalIndex
+from modules.symbol_index import SymbolIndex
+from modules.codebase_summarizer import CodebaseSummarizer
+from modules.project_watcher import ProjectWatcher
+from modules.file_context import FileContextBuilder
+from modules.tokens import format_size, format_tokens, tokens_for_length
+from modules.chat_history import detach_request, drop_inline_data
+from modules.chat_log import ChatLog, LOG_EXTENSION, chat_path, list_chats, remove_chat
+from modules.history_compactor import HistoryCompactor
+from modules.plan_runner import PlanRunner
+from modules.image_processor import ImageProcessor
+from modules.blob_store import BlobStore, image_reference, find_image_references
+from modules.command_runner import CommandRunner
+from modules.patcher import summarize
+from modules.batch_apply import BatchApplier, BatchError, FILE_ACTIONS
 import json
 
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini AI
-genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
-model = genai.GenerativeModel(
-    'gemini-2.0-flash-exp',
-    generation_config=genai.GenerationConfig(
-        max_output_tokens=8192,
-        temperature=0.9,
-        top_p=1,
-        top_k=1
-    )
-)
+# Configure the model backend (Gemini by default, GEMICODER_BACKEND=fake for offline runs)
+model = create_backend(cache_dir=os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "responses"))
 
 console = Console()
 
@@ -31,54 +42,287 @@ class GemiCoder:
         self.chat_manager = ChatManager()
         self.file_manager = FileManager(model)
         self.persistent_files = {}
+        self.codebase_indexes = {}
+        self.retrieval_indexes = {}
+        self.symbol_indexes = {}
+        self.summarizers = {}
+        self.watchers = {}
+        self.index_lock = threading.Lock()  # índices de busca/símbolos são atualizados também pelo watcher
+        self.disk_changes = {}  # project -> arquivos ativos atualizados pelo watcher desde o último prompt
+        self.chat_logs = {}
+        self.compactors = {}
+        self.file_context = FileContextBuilder(os.getenv('GEMICODER_CONTEXT_MODE', 'full'))
+        self.stream_renderer = StreamRenderer(enabled=os.getenv('GEMICODER_STREAM', '1') != '0')
         self.base_dir = os.path.dirname(os.path.abspath(__file__))  # GemiCoder base directory
+        self.image_processor = ImageProcessor(os.path.join(self.base_dir, "cache", "images"))
+        self.blob_store = BlobStore(os.path.join(self.base_dir, "blobs"))
+        self.attachments = {}  # chat_file -> imagens a enviar com o próximo prompt
+        self.command_runner = CommandRunner()
+        self.batch_apply = os.getenv('GEMICODER_BATCH_APPLY', '1') != '0'
         
+    def get_codebase_index(self, project_dir):
+        """Retorna o índice persistente do projeto (compartilhado por todos os comandos)"""
+        project_dir = os.path.abspath(project_dir)
+        if project_dir not in self.codebase_indexes:
+            project = os.path.basename(project_dir)
+            index_file = os.path.join(self.base_dir, "cache", project, "index.json")
+            self.codebase_indexes[project_dir] = CodebaseIndex(project_dir, index_file)
+        return self.codebase_indexes[project_dir]
+
+    def get_retrieval_index(self, project_dir):
+        """Índice de busca (BM25) do projeto, persistido ao lado do índice de arquivos"""
+        project_dir = os.path.abspath(project_dir)
+        if project_dir not in self.retrieval_indexes:
+            project = os.path.basename(project_dir)
+            index_dir = os.path.join(self.base_dir, "cache", project, "retrieval")
+            self.retrieval_indexes[project_dir] = RetrievalIndex(self.get_codebase_index(project_dir), index_dir)
+        return self.retrieval_indexes[project_dir]
+
+    def get_symbol_index(self, project_dir):
+        """Índice de símbolos e importações do projeto"""
+        project_dir = os.path.abspath(project_dir)
+        if project_dir not in self.symbol_indexes:
+            project = os.path.basename(project_dir)
+            index_file = os.path.join(self.base_dir, "cache", project, "symbols.json")
+            self.symbol_indexes[project_dir] = SymbolIndex(self.get_codebase_index(project_dir), index_file)
+        return self.symbol_indexes[project_dir]
+
+    def get_codebase_summarizer(self, project_dir):
+        """Resumos por arquivo do projeto (map-reduce do /codebase-map)"""
+        project_dir = os.path.abspath(project_dir)
+        if project_dir not in self.summarizers:
+            project = os.path.basename(project_dir)
+            summaries_file = os.path.join(self.base_dir, "cache", project, "summaries.json")
+            self.summarizers[project_dir] = CodebaseSummarizer(model, self.get_codebase_index(project_dir), summaries_file)
+        return self.summarizers[project_dir]
+
     def get_project_structure(self, project_dir):
         """Retorna uma lista com todos os caminhos de arquivos no projeto"""
-        file_paths = []
+        index = self.get_codebase_index(project_dir)
+        watcher = self.watchers.get(os.path.abspath(project_dir))
+        if watcher and watcher.live:
+            # Com inotify o índice já está atualizado: não é preciso percorrer a árvore
+            watcher.sync()
+        else:
+            index.refresh()
+        return index.files()
+
+    def start_watcher(self, project, project_dir):
+        """Mantém arquivos ativos e índices atualizados enquanto o projeto está aberto"""
+        mode = os.getenv('GEMICODER_WATCH', '1')
+        if mode == '0':
+            return None
+        key = os.path.abspath(project_dir)
+        self.stop_watcher(project_dir)
+        watcher = ProjectWatcher(key, lambda files, dirs: self.apply_disk_changes(project, project_dir, files, dirs),
+                                 polling=mode == 'poll')
+        self.watchers[key] = watcher.start()
+        console.print(f"[dim]Watching project files ({watcher.backend.name})[/dim]")
+        return watcher
+
+    def stop_watcher(self, project_dir):
+        watcher = self.watchers.pop(os.path.abspath(project_dir), None)
+        if watcher:
+            watcher.stop()
+
+    def apply_disk_changes(self, project, project_dir, files, dirs):
+        """Callback do watcher (thread em segundo plano) com um lote de mudanças"""
+        key = os.path.abspath(project_dir)
+        index = self.get_codebase_index(project_dir)
+        changed = set()
+        for subdir in dirs:
+            changed.update(index.refresh(subdir or None))
+        changed.update(index.refresh_paths(sorted(files)))
+        if not changed:
+            return
         
-        # Lista de diretórios a serem ignorados
-        ignored_dirs = {
-            '__pycache__',
-            'venv',
-            'env',
-            'node_modules',
-            '.git',
-            '.idea',
-            '.vscode',
-            'build',
-            'dist',
-            'site-packages',
-            'egg-info',
-            '.pytest_cache',
-            '.mypy_cache',
-            '.tox',
-            'coverage',
-            'htmlcov',
-            '.coverage',
-            'vendor',
-            'bower_components',
-            'jspm_packages',
-            'lib',
-            'libs',
-            'bin',
-            'obj',
-            'target',
-            'out'
-        }
+        active = self.persistent_files.get(project, {})
+        updated = []
+        for file_path in list(active):
+            if file_path not in changed:
+                continue
+            try:
+                content = index.read(file_path)
+            except (OSError, UnicodeDecodeError):
+                # Arquivo removido ou ilegível: manter o último conteúdo conhecido
+                continue
+            if file_path in active and active[file_path] != content:
+                active[file_path] = content
+                updated.append(file_path)
+        if updated:
+            self.disk_changes.setdefault(project, set()).update(updated)
         
-        for root, dirs, files in os.walk(project_dir):
-            # Filtrar diretórios ignorados e ocultos
-            dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ignored_dirs]
-            
-            for file in files:
-                if not file.startswith('.'):
-                    # Converter para caminho relativo ao diretório do projeto
-                    full_path = os.path.join(root, file)
-                    rel_path = os.path.relpath(full_path, project_dir)
-                    file_paths.append(rel_path)
+        # Só os índices já usados nesta sessão são mantidos
+        with self.index_lock:
+            for indexes in (self.retrieval_indexes, self.symbol_indexes):
+                if key in indexes:
+                    indexes[key].update()
+
+    def add_folder(self, project, project_dir, folder_path):
+        """Adiciona todos os arquivos de texto da pasta aos arquivos persistentes"""
+        full_folder_path = os.path.join(project_dir, folder_path) if folder_path else project_dir
+        
+        if not os.path.exists(full_folder_path):
+            console.print(f"[red]Folder not found: {folder_path}[/red]")
+            return 0
+        
+        rel_folder = os.path.relpath(full_folder_path, project_dir)
+        if rel_folder.startswith('..'):
+            console.print(f"[red]Folder must be inside the project: {folder_path}[/red]")
+            return 0
+        
+        # Inicializar dicionário do projeto se necessário
+        if project not in self.persistent_files:
+            self.persistent_files[project] = {}
+        
+        index = self.get_codebase_index(project_dir)
+        index.refresh(rel_folder)
+        
+        files_added = 0
+        for rel_path in index.text_files(rel_folder):
+            try:
+                self.persistent_files[project][rel_path] = index.read(rel_path)
+                files_added += 1
+            except Exception as e:
+                console.print(f"[yellow]Could not read {rel_path}: {str(e)}[/yellow]")
+        
+        if files_added > 0:
+            console.print(f"[green]Added {files_added} files from {folder_path or '.'} to persistent files[/green]")
+        else:
+            console.print("[yellow]No text files found in the specified folder[/yellow]")
+        return files_added
+
+    def add_dependencies(self, project, project_dir, target):
+        """Adiciona o arquivo (ou símbolo) e suas dependências transitivas aos arquivos persistentes"""
+        self.get_project_structure(project_dir)
+        symbols = self.get_symbol_index(project_dir)
+        budget = int(os.getenv('GEMICODER_DEPS_BUDGET', '20000'))
+        with self.index_lock:
+            symbols.update()
+            start_files, symbol = symbols.find_target(target)
+            definitions = symbols.find_definitions(symbol)[:10] if symbol else []
+            included, skipped = symbols.collect(start_files, budget) if start_files else ([], [])
+        
+        if not start_files:
+            console.print(f"[red]No file, module or symbol found for: {escape(target)}[/red]")
+            return 0
+        for rel_path, name, kind, line in definitions:
+            console.print(f"[dim]{kind} {escape(name)} defined in {escape(rel_path)}:{line}[/dim]")
+        
+        if project not in self.persistent_files:
+            self.persistent_files[project] = {}
+        index = self.get_codebase_index(project_dir)
+        for rel_path, depth, tokens in included:
+            self.persistent_files[project][rel_path] = index.read(rel_path)
+            console.print(f"{'  ' * depth}- {escape(rel_path)} [dim]({format_tokens(tokens)})[/dim]")
+        for rel_path, depth, tokens in skipped:
+            console.print(f"{'  ' * depth}- {escape(rel_path)} [yellow](skipped, {format_tokens(tokens)} over the budget)[/yellow]")
+        
+        used = sum(tokens for _, _, tokens in included)
+        console.print(f"[green]Added {len(included)} file(s) for {escape(target)} ({format_tokens(used)} of {format_tokens(budget)})[/green]")
+        return len(included)
+
+    def build_codebase_prompt(self, project_dir, query):
+        files = self.get_project_structure(project_dir)
+        index = self.get_codebase_index(project_dir)
+        
+        if query:
+            # Apenas os trechos mais relevantes; o resto do projeto vai só na lista de arquivos
+            return files, self.build_query_prompt(project_dir, files, query)
+        
+        # Projeto grande demais para um prompt: visão geral a partir dos resumos por arquivo
+        total_tokens = tokens_for_length(sum(index.size(file) for file in files if is_text_file(file)))
+        if total_tokens > int(os.getenv('GEMICODER_CODEBASE_MAP_THRESHOLD', '200000')):
+            console.print(f"[dim]Project has {format_tokens(total_tokens)} of text, using per-file summaries[/dim]")
+            return files, self.build_map_prompt(project_dir, files)
+        
+        # Lista para armazenar conteúdo dos arquivos
+        file_contents = []
+        for file in files:
+            if is_text_file(file):
+                try:
+                    content = index.read(file)
+                    file_contents.append(f"""
+File: {file}
+```
+{content}
+```
+""")
+                except Exception as e:
+                    console.print(f"[yellow]Could not read {file}: {str(e)}[/yellow]")
+        
+        analysis_prompt = f"""Project structure and contents:
+
+Files:
+{chr(10).join(f'- {f}' for f in files)}
+
+Contents:
+{chr(10).join(file_contents)}
+
+Please analyze the project structure and provide an overview of the codebase.
+"""
+        return files, analysis_prompt
+
+    def build_map_prompt(self, project_dir, files, query=None):
+        project = os.path.basename(os.path.abspath(project_dir))
+        summarizer = self.get_codebase_summarizer(project_dir)
+        text_files = [file for file in files if is_text_file(file)]
+        reused, summarized, failed = summarizer.update(project, text_files)
+        console.print(f"[dim]File summaries: {reused} reused, {summarized} new, {failed} failed[/dim]")
+        return summarizer.reduce_prompt(project, text_files, query)
+
+    def build_query_prompt(self, project_dir, files, query):
+        retrieval = self.get_retrieval_index(project_dir)
+        budget = int(os.getenv('GEMICODER_CODEBASE_BUDGET', '12000'))
+        top_k = int(os.getenv('GEMICODER_CODEBASE_TOP_K', '30'))
+        with self.index_lock:
+            retrieval.update()
+            excerpts, used = retrieval.select(query, budget, top_k)
         
-        return sorted(file_paths)
+        console.print(
+            f"[dim]Sending {len(excerpts)} relevant excerpt(s) from {len({excerpt[0] for excerpt in excerpts})} "
+            f"of {len(files)} files ({format_tokens(used)}, budget {format_tokens(budget)})[/dim]"
+        )
+        sections = [f"""
+File: {path} (lines {start}-{end})
+```
+{text}
+```
+""" for path, start, end, text in excerpts]
+        
+        return f"""Project structure and the most relevant excerpts:
+
+Files:
+{chr(10).join(f'- {f}' for f in files)}
+
+Excerpts (other files are only listed above):
+{chr(10).join(sections) if sections else '(no matching code found)'}
+
+User query: {query}
+
+Analyze the project based on the query, considering both structure and the excerpts. If a file that is not shown is needed to answer, say which one.
+"""
+
+    def refresh_persistent_files(self, project, project_dir):
+        """Atualiza o conteúdo dos arquivos ativos que mudaram no disco"""
+        files = self.persistent_files.get(project)
+        if not files:
+            return
+        index = self.get_codebase_index(project_dir)
+        watcher = self.watchers.get(os.path.abspath(project_dir))
+        if watcher:
+            # Mudanças vistas pelo watcher já foram aplicadas; só o resto precisa de stat
+            if watcher.live:
+                watcher.sync()
+            index.refresh_paths([file_path for file_path in files if not watcher.covers(file_path)])
+        else:
+            index.refresh_paths(list(files))
+        for file_path in list(files):
+            try:
+                files[file_path] = index.read(file_path)
+            except (OSError, ValueError):
+                # Arquivo removido, ilegível ou fora do projeto: manter o último conteúdo conhecido
+                pass
 
     def start_project_chat(self, project, project_dir, model, system_prompt, chat_name="main"):
         # Criar diretório de chats se não existir
@@ -87,18 +331,15 @@ class GemiCoder:
             os.makedirs(chats_dir)
         
         # Nome do arquivo de chat baseado no projeto e nome do chat
-        chat_file = os.path.join(chats_dir, f"{chat_name}.json")
+        chat_file = os.path.join(chats_dir, f"{chat_name}{LOG_EXTENSION}")
+        chat_log = self.get_chat_log(chat_file)
         
-        # Carregar ou iniciar histórico
+        # Carregar ou iniciar histórico (log JSONL ou arquivo JSON antigo)
         try:
-            if os.path.exists(chat_file):
-                try:
-                    with open(chat_file, "r", encoding='utf-8') as f:
-                        saved_history = json.load(f)
-                except json.JSONDecodeError:
-                    console.print("[yellow]Warning: Chat history file is corrupted. Starting new chat.[/yellow]")
-                    saved_history = []
-            else:
+            try:
+                saved_history = chat_log.load()
+            except json.JSONDecodeError:
+                console.print("[yellow]Warning: Chat history file is corrupted. Starting new chat.[/yellow]")
                 saved_history = []
         except Exception as e:
             console.print(f"[yellow]Error loading chat history: {str(e)}. Starting new chat.[/yellow]")
@@ -126,9 +367,53 @@ class GemiCoder:
             except Exception as e:
                 console.print(f"[yellow]Error processing chat message: {str(e)}[/yellow]")
         
+        # O log guarda todas as mensagens; o modelo recebe o resumo no lugar das antigas
+        compactor = self.get_compactor(project, chat_file)
+        prefix = 0
+        if chat_log.compaction:
+            start, summary = chat_log.compaction
+            compacted_history = compactor.compacted(chat_history, start, summary)
+            prefix = len(compacted_history) - (len(chat_history) - start)
+            chat_history = compacted_history
+        
         chat = model.start_chat(history=chat_history)
+        chat_log.attach(chat.history, prefix)
+        # Gera (em segundo plano) o próximo resumo se o histórico estiver acima do orçamento
+        compactor.schedule(chat)
         return chat, chat_file
 
+    def get_compactor(self, project, chat_file):
+        if chat_file not in self.compactors:
+            chat_name = os.path.splitext(os.path.basename(chat_file))[0]
+            cache_file = os.path.join(self.base_dir, "cache", project, f"summaries-{chat_name}.json")
+            self.compactors[chat_file] = HistoryCompactor(
+                model,
+                cache_file,
+                budget_tokens=int(os.getenv('GEMICODER_HISTORY_BUDGET', '100000')),
+                keep_turns=int(os.getenv('GEMICODER_KEEP_TURNS', '6'))
+            )
+        return self.compactors[chat_file]
+
+    def apply_compaction(self, chat, chat_file, project):
+        """Aplica um resumo pronto entre os turnos (nunca bloqueia o prompt)"""
+        compactor = self.get_compactor(project, chat_file)
+        if compactor.error:
+            console.print(f"[yellow]Could not summarize chat history: {str(compactor.error)}[/yellow]")
+            compactor.error = None
+        # O log precisa estar em dia para saber quais mensagens o resumo substitui
+        self.save_chat_history(chat, chat_file)
+        applied = compactor.apply(chat)
+        if applied:
+            # Os arquivos enviados nas mensagens resumidas não estão mais no histórico
+            self.file_context.reset(chat_file)
+            self.get_chat_log(chat_file).compact(chat.history, *applied)
+            console.print("[dim]Older messages were summarized to keep the chat within its token budget[/dim]")
+
+    def get_chat_log(self, chat_file):
+        if chat_file not in self.chat_logs:
+            self.chat_logs[chat_file] = ChatLog(chat_file)
+        return self.chat_logs[chat_file]
+
     def process_custom_command(self, command, project_dir, chat, project, chat_file=None):
         """Processa comandos customizados começando com /"""
         if command.startswith('/help'):
@@ -137,23 +422,42 @@ class GemiCoder:
 /help           - Show this help message
 /codebase       - Show all project files and analyze them
 /codebase query - Analyze project files with specific query
+/codebase-map [query] - Analyze a large project from per-file summaries made in parallel
 /add-file path  - Add file to active context
 /add-folder [path] - Add all files from folder (current dir if no path)
+/add-deps target - Add a file, module or symbol and the project files it imports
 /remove-file path - Remove file from active context
 /is-web         - Enable enhanced web development mode
-/add-image path - Add and analyze local PNG image
+/add-image path - Add a local image (PNG, JPEG, WEBP, GIF...) to the next prompt
+/images         - List the images referenced in this chat
+/attach-image n - Send image n (or a hash prefix) from /images with the next prompt
 /new-chat name  - Create a new chat session
 /open-chat name - Open an existing chat session
 /remove-chat name - Remove a chat session
 /chat-list      - List all available chats
 /exit           - Exit current project
 /plan           - Create and execute a project iteration plan
+/plan-parallel  - Plan with step dependencies and run independent steps in parallel
+/plan-pipeline  - Plan and request each next step while the current one is reviewed
+/plan-resume    - Continue the saved plan from the first unfinished step
 /plan-mode      - Enable automatic iteration planning for all requests
+/stream         - Toggle streaming of model responses
+/batch-apply    - Toggle applying file actions of a response as one transaction
+/compact        - Summarize older messages of this chat now
+/jobs           - List background commands
+/job-output id [lines] - Show the latest output of a background command
+/job-stop id    - Stop a background command and its child processes
+/cassette       - Show model traffic recorded or replayed in this session
+/cache [stats|clear|on|off] - Response cache statistics, clear it or bypass it
+/context-mode [full|delta|ephemeral] - How active files are sent and kept in history
 
 [bold]Examples:[/bold]
 /codebase find security issues
+/codebase-map how is authentication handled
 /add-file src/main.py
 /add-folder src/utils
+/add-deps src/main.py
+/add-deps AuthService
 /remove-file config.json
 /is-web         # Enable beautiful web UI generation
 /add-image designs/mockup.png
@@ -164,6 +468,100 @@ class GemiCoder:
 """)
             return True
             
+        elif command.startswith('/stream'):
+            self.stream_renderer.enabled = not self.stream_renderer.enabled
+            state = "enabled" if self.stream_renderer.enabled else "disabled"
+            console.print(f"[green]Response streaming {state}[/green]")
+            return True
+            
+        elif command.startswith('/batch-apply'):
+            self.batch_apply = not self.batch_apply
+            state = "enabled" if self.batch_apply else "disabled"
+            console.print(f"[green]Batch apply {state}[/green]")
+            return True
+            
+        elif command.startswith('/cassette'):
+            if hasattr(model, 'summary'):
+                console.print(model.summary())
+            else:
+                console.print("[yellow]No cassette active (set GEMICODER_CASSETTE and GEMICODER_CASSETTE_MODE)[/yellow]")
+            return True
+            
+        elif command.startswith('/cache'):
+            option = command[6:].strip().lower()
+            cache = getattr(model, 'cache', None)
+            if cache is None:
+                console.print("[yellow]Response cache is disabled (set GEMICODER_RESPONSE_CACHE=on to enable it)[/yellow]")
+            elif option == 'clear':
+                cache.clear()
+                console.print("[green]Response cache cleared[/green]")
+            elif option in ('on', 'off'):
+                model.bypass = option == 'off'
+                console.print(f"[green]Response cache {'bypassed' if model.bypass else 'enabled'}[/green]")
+            elif option in ('', 'stats'):
+                state = " [yellow](bypassed)[/yellow]" if model.bypass else ""
+                console.print(f"[bold]Response cache:[/bold] {cache.summary()}{state}")
+            else:
+                console.print("[red]Usage: /cache [stats|clear|on|off][/red]")
+            return True
+            
+        elif command.startswith('/jobs'):
+            if not self.command_runner.jobs:
+                console.print("[yellow]No background jobs[/yellow]")
+            for job in self.command_runner.jobs.values():
+                style = "green" if job.running else "dim"
+                console.print(f"{job.id}. [{style}]{job.status()}[/{style}] {escape(job.command)} [dim](pid {job.pid}, {job.elapsed():.0f}s, {job.total_lines} lines)[/dim]")
+            return True
+            
+        elif command.startswith('/job-output'):
+            args = command[11:].split()
+            job = self.command_runner.get(args[0]) if args else None
+            if not job:
+                console.print("[red]Usage: /job-output id [lines][/red]")
+                return True
+            lines = int(args[1]) if len(args) > 1 and args[1].isdigit() else 50
+            console.print(f"[bold]Job {job.id}[/bold] ({job.status()}): {escape(job.command)}")
+            console.print(job.tail(lines) or "(no output yet)", markup=False, highlight=False)
+            return True
+            
+        elif command.startswith('/job-stop'):
+            job = self.command_runner.get(command[9:].strip())
+            if not job:
+                console.print("[red]Usage: /job-stop id[/red]")
+                return True
+            job.stop()
+            console.print(f"[green]Job {job.id} stopped ({job.status()})[/green]")
+            return True
+            
+        elif command.startswith('/compact'):
+            compactor = self.get_compactor(project, chat_file)
+            try:
+                self.save_chat_history(chat, chat_file)
+                with console.status("[bold blue]Summarizing older messages...[/bold blue]"):
+                    compacted = compactor.compact_now(chat)
+                if compacted:
+                    self.file_context.reset(chat_file)
+                    self.get_chat_log(chat_file).compact(chat.history, *compacted)
+                    console.print(f"[green]Chat compacted to ~{compactor.history_tokens(chat.history)} tokens[/green]")
+                else:
+                    console.print("[yellow]Nothing to compact yet[/yellow]")
+            except Exception as e:
+                console.print(f"[red]Error compacting chat: {str(e)}[/red]")
+            return True
+            
+        elif command.startswith('/context-mode'):
+            mode = command[13:].strip()
+            if not mode:
+                console.print(f"Context mode: [bold]{self.file_context.mode}[/bold]")
+                return True
+            if mode not in FileContextBuilder.MODES:
+                console.print(f"[red]Unknown context mode: {mode} (use {', '.join(FileContextBuilder.MODES)})[/red]")
+                return True
+            self.file_context.mode = mode
+            self.file_context.reset()
+            console.print(f"[green]Context mode set to {mode}[/green]")
+            return True
+            
         elif command.startswith('/new-chat'):
             chat_name = command[10:].strip()
             if not chat_name:
@@ -175,16 +573,13 @@ class GemiCoder:
             if not os.path.exists(chats_dir):
                 os.makedirs(chats_dir)
                 
-            chat_file = os.path.join(chats_dir, f"{chat_name}.json")
-            
-            if os.path.exists(chat_file):
+            if chat_path(chats_dir, chat_name):
                 console.print(f"[red]Chat '{chat_name}' already exists[/red]")
                 return True
             
             # Criar arquivo de chat vazio
             try:
-                with open(chat_file, 'w', encoding='utf-8') as f:
-                    json.dump([], f)
+                self.get_chat_log(os.path.join(chats_dir, f"{chat_name}{LOG_EXTENSION}")).rewrite([])
                 console.print(f"[green]Created new chat: {chat_name}[/green]")
             except Exception as e:
                 console.print(f"[red]Error creating chat: {str(e)}[/red]")
@@ -198,9 +593,8 @@ class GemiCoder:
                 
             # Verificar se o chat existe
             chats_dir = os.path.join(self.base_dir, "chats", project)
-            chat_file = os.path.join(chats_dir, f"{chat_name}.json")
             
-            if not os.path.exists(chat_file):
+            if not chat_path(chats_dir, chat_name):
                 console.print(f"[red]Chat '{chat_name}' not found[/red]")
                 return True
             
@@ -233,9 +627,7 @@ class GemiCoder:
                     console.print(f"[red]Error migrating chat: {str(e)}[/red]")
             
             # Listar chats (agora todos estarão na pasta do projeto)
-            chats = []
-            if os.path.exists(project_chats_dir):
-                chats = [os.path.splitext(f)[0] for f in os.listdir(project_chats_dir) if f.endswith('.json')]
+            chats = list_chats(project_chats_dir)
             
             if not chats:
                 console.print("[yellow]No chats found for this project[/yellow]")
@@ -257,83 +649,15 @@ class GemiCoder:
         
         elif command.startswith('/add-folder'):
             folder_path = command[11:].strip()
-            if folder_path:
-                full_folder_path = os.path.join(project_dir, folder_path)
-            else:
-                full_folder_path = project_dir
-            
-            if not os.path.exists(full_folder_path):
-                console.print(f"[red]Folder not found: {folder_path}[/red]")
+            self.add_folder(project, project_dir, folder_path)
+            return True
+        
+        elif command.startswith('/add-deps'):
+            target = command[9:].strip()
+            if not target:
+                console.print("[red]Usage: /add-deps file|module|symbol[/red]")
                 return True
-            
-            # Lista de diretórios a serem ignorados
-            ignored_dirs = {
-                '__pycache__',
-                'venv',
-                'env',
-                'node_modules',
-                '.git',
-                '.idea',
-                '.vscode',
-                'build',
-                'dist',
-                'site-packages',
-                'egg-info',
-                '.pytest_cache',
-                '.mypy_cache',
-                '.tox',
-                'coverage',
-                'htmlcov',
-                '.coverage',
-                'vendor',
-                'bower_components',
-                'jspm_packages',
-                'lib',
-                'libs',
-                'bin',
-                'obj',
-                'target',
-                'out'
-            }
-            
-            # Extensões de arquivo que são consideradas texto
-            text_extensions = {
-                '.txt', '.py', '.js', '.html', '.css', '.json', '.md', '.yml', 
-                '.yaml', '.xml', '.csv', '.ini', '.conf', '.sh', '.bat', '.ps1',
-                '.env', '.gitignore', '.sql', '.java', '.cpp', '.c', '.h', '.hpp',
-                '.ts', '.jsx', '.tsx', '.vue', '.php', '.rb', '.pl', '.go'
-            }
-            
-            # Inicializar dicionário do projeto se necessário
-            if project not in self.persistent_files:
-                self.persistent_files[project] = {}
-            
-            files_added = 0
-            
-            # Listar arquivos no diretório e subdiretórios, ignorando pastas específicas
-            for root, dirs, files in os.walk(full_folder_path):
-                # Filtrar diretórios ignorados
-                dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ignored_dirs]
-                
-                for file in files:
-                    if not file.startswith('.'):
-                        file_path = os.path.join(root, file)
-                        # Verificar se é arquivo de texto
-                        if os.path.splitext(file)[1].lower() in text_extensions:
-                            try:
-                                with open(file_path, 'r', encoding='utf-8') as f:
-                                    content = f.read()
-                                    # Usar caminho relativo ao projeto
-                                    rel_path = os.path.relpath(file_path, project_dir)
-                                    self.persistent_files[project][rel_path] = content
-                                    files_added += 1
-                            except Exception as e:
-                                console.print(f"[yellow]Could not read {file}: {str(e)}[/yellow]")
-            
-            if files_added > 0:
-                console.print(f"[green]Added {files_added} files from {folder_path or '.'} to persistent files[/green]")
-            else:
-                console.print("[yellow]No text files found in the specified folder[/yellow]")
+            self.add_dependencies(project, project_dir, target)
             return True
         
         elif command.startswith('/add-file'):
@@ -342,6 +666,13 @@ class GemiCoder:
                 console.print("[red]Please specify a file path[/red]")
                 return True
             
+            try:
+                # Mesmo arquivo com outro caminho ("./a.py", absoluto) não deve virar outra entrada
+                file_path = self.get_codebase_index(project_dir).relative(file_path)
+            except ValueError as e:
+                console.print(f"[red]{str(e)}[/red]")
+                return True
+            
             full_path = os.path.join(project_dir, file_path)
             try:
                 content = self.file_manager.read_file(full_path)
@@ -360,6 +691,10 @@ class GemiCoder:
                 console.print("[red]Please specify a file path[/red]")
                 return True
             
+            try:
+                file_path = self.get_codebase_index(project_dir).relative(file_path)
+            except ValueError:
+                pass
             if project in self.persistent_files and file_path in self.persistent_files[project]:
                 del self.persistent_files[project][file_path]
                 console.print(f"[green]Removed {file_path} from persistent files[/green]")
@@ -367,74 +702,40 @@ class GemiCoder:
                 console.print(f"[yellow]File {file_path} not in persistent list[/yellow]")
             return True
         
+        elif command.startswith('/codebase-map'):
+            query = command[13:].strip()
+            analysis_prompt = None
+            try:
+                files = self.get_project_structure(project_dir)
+                analysis_prompt = self.build_map_prompt(project_dir, files, query)
+                self.stream_renderer.send_message(chat, analysis_prompt, title="Analysis:")
+            except Exception as e:
+                console.print(f"[red]Error analyzing codebase: {str(e)}[/red]")
+            finally:
+                if analysis_prompt and self.file_context.ephemeral:
+                    reference = f"Per-file summaries of {len(files)} files (attached to this request only)"
+                    detach_request(chat.history, analysis_prompt, f"{reference}\n\nUser query: {query or 'overview of the codebase'}")
+            return True
+        
         elif command.startswith('/codebase'):
             prompt = command[9:].strip()
-            files = self.get_project_structure(project_dir)
-            
-            # Lista para armazenar conteúdo dos arquivos
-            file_contents = []
-            
-            # Extensões de arquivo que são consideradas texto
-            text_extensions = {
-                '.txt', '.py', '.js', '.html', '.css', '.json', '.md', '.yml', 
-                '.yaml', '.xml', '.csv', '.ini', '.conf', '.sh', '.bat', '.ps1',
-                '.env', '.gitignore', '.sql', '.java', '.cpp', '.c', '.h', '.hpp',
-                '.ts', '.jsx', '.tsx', '.vue', '.php', '.rb', '.pl', '.go'
-            }
-            
-            for file in files:
-                full_path = os.path.join(project_dir, file)
-                # Verificar se é arquivo de texto baseado na extensão
-                if os.path.splitext(file)[1].lower() in text_extensions:
-                    try:
-                        with open(full_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            file_contents.append(f"""
-File: {file}
-```
-{content}
-```
-""")
-                    except Exception as e:
-                        console.print(f"[yellow]Could not read {file}: {str(e)}[/yellow]")
-            
-            if not prompt:
-                # Se não houver prompt, mostrar estrutura e enviar para IA
-                console.print("\n[bold]Project structure:[/bold]")
-                for file in files:
-                    console.print(f"- {file}")
-                
-                analysis_prompt = f"""Project structure and contents:
-
-Files:
-{chr(10).join(f'- {f}' for f in files)}
-
-Contents:
-{chr(10).join(file_contents)}
-
-Please analyze the project structure and provide an overview of the codebase.
-"""
-            else:
-                # Se houver prompt, usar na análise
-                analysis_prompt = f"""Project structure and contents:
-
-Files:
-{chr(10).join(f'- {f}' for f in files)}
-
-Contents:
-{chr(10).join(file_contents)}
+            analysis_prompt = None
+            try:
+                files, analysis_prompt = self.build_codebase_prompt(project_dir, prompt)
 
-User query: {prompt}
+                if not prompt:
+                    # Se não houver prompt, mostrar estrutura e enviar para IA
+                    console.print("\n[bold]Project structure:[/bold]")
+                    for file in files:
+                        console.print(f"- {escape(file)}")
 
-Analyze the project based on the query, considering both structure and file contents.
-"""
-            
-            try:
-                response = chat.send_message(analysis_prompt)
-                console.print("\n[bold]Analysis:[/bold]")
-                console.print(response.text)
+                self.stream_renderer.send_message(chat, analysis_prompt, title="Analysis:")
             except Exception as e:
-                console.print(f"[red]Error analyzing codebase: {str(e)}[/red]")
+                console.print(f"[red]Error analyzing codebase: {escape(str(e))}[/red]")
+            finally:
+                if analysis_prompt and self.file_context.ephemeral:
+                    reference = f"Project structure and {'relevant excerpts' if prompt else 'contents'} of {len(files)} files (attached to this request only)"
+                    detach_request(chat.history, analysis_prompt, f"{reference}\n\nUser query: {prompt or 'overview of the codebase'}")
             
             return True
         
@@ -628,35 +929,19 @@ Respond with a confirmation if you understand these requirements."""
                     console.print(f"[red]Image not found: {image_path}[/red]")
                     return True
                 
-                if not image_path.lower().endswith('.png'):
-                    console.print("[red]Only PNG images are supported[/red]")
-                    return True
-                
                 console.print("[bold blue]Reading image...[/bold blue]")
                 
                 try:
                     with open(image_path, 'rb') as img_file:
-                        image_bytes = img_file.read()
-                        import base64
-                        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-                        
-                        # Criar prompt com a imagem
-                        image_prompt = {
-                            "role": "user",
-                            "parts": [
-                                {
-                                    "inline_data": {
-                                        "mime_type": "image/png",
-                                        "data": image_base64
-                                    }
-                                }
-                            ]
-                        }
-                        
-                        # Adicionar imagem ao histórico do chat
-                        chat.history.append(image_prompt)
-                        console.print("[green]Image added to context. Your next prompt will include the image analysis.[/green]")
-                        console.print("[dim]The image will be removed from context after your next prompt.[/dim]")
+                        # Formato real detectado, imagem reduzida e recodificada
+                        image_bytes, mime_type, info = self.image_processor.process(img_file.read())
+                        console.print(f"[dim]{self.image_processor.describe(info)}[/dim]")
+                    
+                    # A imagem fica no blob store; o histórico guarda só a referência
+                    digest = self.blob_store.put(image_bytes, mime_type)
+                    self.attach_image(chat_file, digest, mime_type, os.path.basename(image_path))
+                    console.print("[green]Image added to context. Your next prompt will include the image analysis.[/green]")
+                    console.print("[dim]The chat history keeps a reference; use /attach-image to send it again later.[/dim]")
                         
                 except Exception as e:
                     console.print(f"[red]Error reading image: {str(e)}[/red]")
@@ -666,8 +951,41 @@ Respond with a confirmation if you understand these requirements."""
                 console.print(f"[red]Error processing image: {str(e)}[/red]")
             return True
         
+        elif command.startswith('/images'):
+            pending = self.attachments.get(chat_file, [])
+            images = find_image_references(chat.history)
+            if not images and not pending:
+                console.print("[yellow]No images in this chat[/yellow]")
+            for index, (digest, mime_type, name) in enumerate(images, 1):
+                missing = "" if self.blob_store.exists(digest, mime_type) else " [red](missing from store)[/red]"
+                console.print(f"{index}. {name or 'image'} [dim]{digest[:12]} {mime_type}[/dim]{missing}")
+            for digest, mime_type, name in pending:
+                console.print(f"- {name or 'image'} [dim]{digest[:12]}[/dim] [yellow](attached to the next prompt)[/yellow]")
+            count, total = self.blob_store.usage()
+            console.print(f"[dim]Image store: {count} images, {format_size(total)} (shared by all projects)[/dim]")
+            return True
+        
+        elif command.startswith('/attach-image'):
+            selector = command[13:].strip()
+            images = find_image_references(chat.history)
+            if selector.isdigit() and 0 < int(selector) <= len(images):
+                matches = [images[int(selector) - 1]]
+            else:
+                matches = [image for image in images if selector and image[0].startswith(selector)]
+            if len(matches) != 1:
+                console.print("[red]Please give the number or hash prefix of one image from /images[/red]")
+                return True
+            
+            digest, mime_type, name = matches[0]
+            if not self.blob_store.exists(digest, mime_type):
+                console.print(f"[red]Image {digest[:12]} is missing from the image store[/red]")
+                return True
+            self.attach_image(chat_file, digest, mime_type, name)
+            console.print(f"[green]{name or 'Image'} will be sent with your next prompt[/green]")
+            return True
+        
         elif command.startswith('/add-local-image'):
-            image_path = command[15:].strip()
+            image_path = command[16:].strip()
             if not image_path:
                 console.print("[red]Please provide the image path[/red]")
                 return True
@@ -682,10 +1000,13 @@ Respond with a confirmation if you understand these requirements."""
                 # Try to open the image
                 try:
                     with open(image_path, 'rb') as img_file:
+                        image_bytes, mime_type, info = self.image_processor.process(img_file.read())
+                        console.print(f"[dim]{self.image_processor.describe(info)}[/dim]")
                         image_data = {
-                            "mime_type": "image/jpeg",  # Adjust based on file type if needed
-                            "data": img_file.read()
+                            "mime_type": mime_type,
+                            "data": image_bytes
                         }
+                    digest = self.blob_store.put(image_bytes, mime_type)
                 except FileNotFoundError:
                     console.print(f"[red]Image file not found: {image_path}[/red]")
                     return True
@@ -730,7 +1051,7 @@ Respond with a confirmation if you understand these requirements."""
                 
                 if user_prompt.lower() != 'skip':
                     # Send both image description and user prompt to chat
-                    full_prompt = f"""Visual Reference:
+                    full_prompt = f"""Visual Reference {image_reference(digest, mime_type, os.path.basename(image_path))}:
 {image_description}
 
 Implementation Request: {user_prompt}
@@ -745,9 +1066,7 @@ Based on the visual reference above and the implementation request, please:
 Respond with actions to create the implementation."""
                     
                     try:
-                        response = chat.send_message(full_prompt)
-                        console.print("\n[bold]Implementation Plan:[/bold]")
-                        console.print(response.text)
+                        self.stream_renderer.send_message(chat, full_prompt, title="Implementation Plan:")
                     except Exception as e:
                         console.print(f"[red]Error processing request: {str(e)}[/red]")
                 
@@ -769,147 +1088,46 @@ Respond with actions to create the implementation."""
                 
             # Verificar se o chat existe
             chats_dir = os.path.join(self.base_dir, "chats", project)
-            chat_file = os.path.join(chats_dir, f"{chat_name}.json")
             
-            if not os.path.exists(chat_file):
+            if not chat_path(chats_dir, chat_name):
                 console.print(f"[red]Chat '{chat_name}' not found[/red]")
                 return True
             
             # Remover arquivo do chat
             try:
-                os.remove(chat_file)
+                remove_chat(chats_dir, chat_name)
                 console.print(f"[green]Removed chat: {chat_name}[/green]")
             except Exception as e:
                 console.print(f"[red]Error removing chat: {str(e)}[/red]")
             return True
         
+        elif command.startswith('/plan-resume'):
+            try:
+                PlanRunner(self, model, chat, chat_file, project, project_dir).resume()
+            except Exception as e:
+                console.print(f"[red]Error resuming plan: {str(e)}[/red]")
+            return True
+        
+        elif command.startswith('/plan-parallel'):
+            project_query = command[14:].strip()
+            try:
+                PlanRunner(self, model, chat, chat_file, project, project_dir).start(project_query, mode="parallel")
+            except Exception as e:
+                console.print(f"[red]Error creating/executing plan: {str(e)}[/red]")
+            return True
+        
+        elif command.startswith('/plan-pipeline'):
+            project_query = command[14:].strip()
+            try:
+                PlanRunner(self, model, chat, chat_file, project, project_dir).start(project_query, mode="pipeline")
+            except Exception as e:
+                console.print(f"[red]Error creating/executing plan: {str(e)}[/red]")
+            return True
+        
         elif command.startswith('/plan'):
             project_query = command[6:].strip()
             try:
-                # Modificar o prompt para enfatizar o uso do diretório raiz
-                planning_prompt = f"""Create an iteration plan for the project.
-{f'Project requirements: {project_query}' if project_query else 'Analyze the current project state and create a plan for completion.'}
-
-Rules for the plan:
-1. Each iteration must have maximum 4 steps
-2. Each step should be clear and achievable
-3. Steps should be in logical order
-4. Each iteration should have a clear goal
-5. Consider dependencies between steps
-6. Include testing and validation when needed
-7. IMPORTANT: All files and directories must be created in the root directory '.'
-   - DO NOT create a new project directory inside the project
-   - Use relative paths starting with './' or just the filename
-   - Example: './src/App.js' or 'package.json', not 'my-app/src/App.js'
-   - All commands should run in the current directory
-   - For npm/yarn init, use the current directory
-
-Format your response as:
-```plan
-Iteration 1: [Goal Description]
-1. [Step 1]
-2. [Step 2]
-3. [Step 3]
-4. [Step 4]
-
-Iteration 2: [Goal Description]
-1. [Step 1]
-...
-```
-
-Then explain why you chose this order and any important considerations.
-
-Remember: All files and commands must work in the current directory '.' - DO NOT create a new project directory!"""
-
-                response = chat.send_message(planning_prompt)
-                plan_text = response.text
-                
-                # Extrair o plano entre ```plan e ```
-                import re
-                plan_match = re.search(r'```plan\n(.*?)\n```', plan_text, re.DOTALL)
-                if not plan_match:
-                    console.print("[red]Could not parse the plan format[/red]")
-                    return True
-                    
-                plan = plan_match.group(1)
-                
-                # Mostrar o plano e a explicação
-                console.print("\n[bold blue]Project Iteration Plan:[/bold blue]")
-                console.print(plan)
-                
-                # Mostrar explicação (texto após o bloco do plano)
-                explanation = plan_text.split('```')[-1].strip()
-                if explanation:
-                    console.print("\n[bold]Plan Explanation:[/bold]")
-                    console.print(explanation)
-                
-                # Perguntar se quer começar as iterações
-                if Prompt.ask("\nStart executing iterations?", choices=["y", "n"]) == "y":
-                    # Separar iterações
-                    iterations = re.findall(r'Iteration \d+:.*?(?=\nIteration \d+:|$)', plan, re.DOTALL)
-                    
-                    for i, iteration in enumerate(iterations, 1):
-                        console.print(f"\n[bold blue]Starting Iteration {i}[/bold blue]")
-                        console.print(iteration.strip())
-                        
-                        if i > 1 and Prompt.ask("\nContinue to next iteration?", choices=["y", "n"]) != "y":
-                            break
-                        
-                        # Extrair os passos da iteração
-                        steps = re.findall(r'\d+\.\s*(.*?)(?=\n\d+\.|$)', iteration, re.DOTALL)
-                        
-                        for j, step in enumerate(steps, 1):
-                            console.print(f"\n[bold]Step {j}:[/bold] {step.strip()}")
-                            
-                            # Criar prompt para executar o passo
-                            step_prompt = f"""Current Iteration: {i}
-Current Step: {j} - {step.strip()}
-
-Based on this step, please:
-1. Analyze what needs to be done
-2. Generate necessary actions (file creation, modifications, terminal commands)
-3. Ensure all changes are properly tested
-4. Consider dependencies from previous steps
-
-Respond with specific actions to implement this step."""
-
-                            if Prompt.ask(f"\nExecute step {j}?", choices=["y", "n"]) == "y":
-                                try:
-                                    response = chat.send_message(step_prompt)
-                                    text = response.text.strip()
-                                    
-                                    # Procurar por ações JSON na resposta
-                                    start = text.find('[')
-                                    end = text.rfind(']') + 1
-                                    
-                                    if start != -1 and end != 0:
-                                        actions = json.loads(text[start:end])
-                                        
-                                        # Mostrar e confirmar ações
-                                        console.print("\n[bold]Proposed actions:[/bold]")
-                                        for action in actions:
-                                            console.print(f"\n- {action['description']}")
-                                            if action['action_type'] == 'terminal':
-                                                console.print(f"  Command: {action['content']}")
-                                        
-                                        if Prompt.ask("\nProceed with these actions?", choices=["y", "n"]) == "y":
-                                            for action in actions:
-                                                self.execute_action(action, chat)
-                                    else:
-                                        console.print("\n[bold]AI Response:[/bold]")
-                                        console.print(text)
-                                    
-                                except Exception as e:
-                                    console.print(f"[red]Error in step {j}: {str(e)}[/red]")
-                                    if Prompt.ask("Continue to next step?", choices=["y", "n"]) != "y":
-                                        break
-                            
-                            # Salvar histórico após cada passo
-                            if chat_file:
-                                self.save_chat_history(chat, chat_file)
-                        
-                    console.print("\n[bold green]Project plan execution completed![/bold green]")
-                
+                PlanRunner(self, model, chat, chat_file, project, project_dir).start(project_query)
             except Exception as e:
                 console.print(f"[red]Error creating/executing plan: {str(e)}[/red]")
             return True
@@ -1044,8 +1262,12 @@ Respond with 'PLAN_MODE_ENABLED' if you understand."""
             You can create, edit, read, move and delete files.
             You can also execute terminal commands in the project directory using the 'terminal' action type.
             When asked to perform terminal operations, respond with appropriate terminal action.
+            Commands run without keyboard input, so use non-interactive flags (e.g. npm init -y).
+            For dev servers and watchers add "background": true to the terminal action.
             
             IMPORTANT: Always use 'edit' action_type when modifying existing files, never 'create' for files that already exist.
+            For small changes to existing files prefer 'patch' with SEARCH/REPLACE blocks (or a unified diff) instead of
+            rewriting the whole file with 'edit'. SEARCH text must be copied exactly from the current file and be unique.
             
             Always respond with a JSON array of actions when asked to modify the project.
             Example action format:
@@ -1062,6 +1284,12 @@ Respond with 'PLAN_MODE_ENABLED' if you understand."""
                     "content": "def hello():\\n    print('Hello World')",
                     "description": "Modify main.py to use a function"
                 }},
+                {{
+                    "action_type": "patch",
+                    "path": "src/main.py",
+                    "content": "<<<<<<< SEARCH\n    print('Hello World')\n=======\n    print('Hello, World!')\n>>>>>>> REPLACE",
+                    "description": "Change only the greeting line"
+                }},
                 {{
                     "action_type": "terminal",
                     "content": "npm install express",
@@ -1071,9 +1299,14 @@ Respond with 'PLAN_MODE_ENABLED' if you understand."""
             
             # Iniciar chat do projeto com novo system prompt
             chat, chat_file = self.start_project_chat(project, project_dir, model, system_prompt)
+            self.start_watcher(project, project_dir)
             
             try:
                 while True:
+                    changed = self.disk_changes.pop(project, None)
+                    if changed:
+                        console.print(f"[dim]Updated from disk: {', '.join(sorted(changed))}[/dim]")
+                    
                     # Mostrar arquivos persistentes antes de cada prompt
                     self.show_persistent_files(project)
                     
@@ -1087,81 +1320,261 @@ Respond with 'PLAN_MODE_ENABLED' if you understand."""
                             continue
                     
                     try:
+                        self.apply_compaction(chat, chat_file, project)
+                        
                         # Adicionar conteúdo dos arquivos persistentes ao prompt
-                        files_content = ""
-                        if project in self.persistent_files:
-                            for file_path, content in self.persistent_files[project].items():
-                                files_content += f"\nFile: {file_path}\n```\n{content}\n```\n"
+                        self.refresh_persistent_files(project, project_dir)
+                        files_content, context_stats = self.file_context.build(
+                            self.persistent_files.get(project, {}), chat_file
+                        )
                         
+                        stored_prompt = None
                         if files_content:
-                            full_prompt = f"""Active files in context:
+                            delta_note = ""
+                            if self.file_context.mode == "delta":
+                                self.show_context_stats(context_stats)
+                                delta_note = "\n(Files marked unchanged are identical to the version sent earlier in this chat; diffs apply to that version.)\n"
+                            full_prompt = f"""Active files in context:{delta_note}
 {files_content}
 
+User request: {prompt}"""
+                            if self.file_context.ephemeral:
+                                # O histórico guarda apenas uma referência aos arquivos
+                                stored_prompt = f"""{self.file_context.reference(self.persistent_files[project])}
+
 User request: {prompt}"""
                         else:
                             full_prompt = prompt
                         
-                        # Enviar prompt para o chat
-                        response = chat.send_message(full_prompt)
-                        
-                        # Remover imagem do histórico após o prompt se existir
-                        if chat.history and len(chat.history) >= 2:
-                            previous_msg = chat.history[-2]  # Mensagem anterior à resposta atual
-                            if (hasattr(previous_msg, 'parts') and 
-                                len(previous_msg.parts) > 0 and 
-                                hasattr(previous_msg.parts[0], 'inline_data')):
-                                # Remover a mensagem com a imagem
-                                chat.history.pop(-2)
-                                console.print("[dim]Image removed from context[/dim]")
+                        # Imagens anexadas vão só nesta mensagem; o histórico guarda referências
+                        outgoing = full_prompt
+                        attachments = self.attachments.get(chat_file, [])
+                        if attachments:
+                            outgoing = [full_prompt] + [self.blob_store.part(digest, mime_type) for digest, mime_type, _ in attachments]
+                            references = "\n".join(image_reference(*attachment) for attachment in attachments)
+                            stored_prompt = f"{stored_prompt or full_prompt}\n\n{references}"
                         
-                        text = response.text.strip()
-                        
-                        # Procurar por ações JSON na resposta
-                        start = text.find('[')
-                        end = text.rfind(']') + 1
+                        # Enviar prompt para o chat e executar as ações conforme chegam
+                        try:
+                            self.send_and_dispatch(chat, outgoing)
+                        finally:
+                            if stored_prompt:
+                                detach_request(chat.history, full_prompt, stored_prompt)
+                        self.attachments.pop(chat_file, None)
                         
-                        if start != -1 and end != 0:
-                            try:
-                                actions = json.loads(text[start:end])
-                                
-                                # Mostrar e confirmar ações
-                                console.print("\n[bold]Proposed actions:[/bold]")
-                                for action in actions:
-                                    console.print(f"\n- {action['description']}")
-                                    if action['action_type'] == 'terminal':
-                                        console.print(f"  Command: {action['content']}")
-                                
-                                if Prompt.ask("\nProceed with these actions?", choices=["y", "n"]) == "y":
-                                    for action in actions:
-                                        self.execute_action(action, chat)
-                            except json.JSONDecodeError:
-                                # Se não conseguir decodificar como JSON, mostrar resposta normal
-                                console.print("\n[bold]AI Response:[/bold]")
-                                console.print(text)
-                        else:
-                            # Se não encontrar ações JSON, mostrar resposta normal
-                            console.print("\n[bold]AI Response:[/bold]")
-                            console.print(text)
+                        # Remover imagem do histórico após o prompt se existir
+                        if drop_inline_data(chat.history):
+                            console.print("[dim]Image removed from context[/dim]")
                         
                         # Salvar histórico do chat
                         if chat_file:
                             self.save_chat_history(chat, chat_file)
+                            self.get_compactor(project, chat_file).schedule(chat)
                         
                     except Exception as e:
+                        # O modelo pode não ter recebido os arquivos: reenviar completos
+                        self.file_context.reset(chat_file)
                         console.print(f"[red]Error: {str(e)}[/red]")
                 
             finally:
+                self.stop_watcher(project_dir)
+                # Jobs em segundo plano têm sessão própria e não morrem com o GemiCoder
+                stopped = self.command_runner.stop_all()
+                if stopped:
+                    console.print(f"[yellow]Stopped {stopped} background job(s)[/yellow]")
                 # Restore original directory when exiting project
                 os.chdir(original_dir)
     
-    def execute_action(self, action, chat):
+    def attach_image(self, chat_file, digest, mime_type, name=""):
+        pending = self.attachments.setdefault(chat_file, [])
+        if all(attachment[0] != digest for attachment in pending):
+            pending.append((digest, mime_type, name))
+
+    def show_context_stats(self, stats):
+        console.print(
+            f"[dim]Active files: sent {format_size(stats['sent_bytes'])} ({format_tokens(stats['sent_tokens'])}) "
+            f"instead of {format_size(stats['full_bytes'])}, saved {format_size(stats['saved_bytes'])} "
+            f"({format_tokens(stats['saved_tokens'])}); {format_size(stats['total_saved_bytes'])} saved this session[/dim]"
+        )
+
+    def action_timeout(self, action):
+        """Timeout requested by a terminal action, or the default when it is missing or invalid"""
+        try:
+            timeout = float(action.get('timeout'))
+        except (TypeError, ValueError):
+            return self.command_runner.timeout
+        # NaN e valores não positivos também ficam com o padrão
+        return timeout if timeout > 0 else self.command_runner.timeout
+
+    def show_action(self, action):
+        console.print(f"\n- {action.get('description', action.get('action_type', 'action'))}")
+        if action.get('action_type') == 'terminal':
+            console.print(f"  Command: {action.get('content')}")
+
+    def send_and_dispatch(self, chat, prompt, results=None):
+        """Envia o prompt e executa cada ação assim que ela termina de chegar.
+
+        Returns the full response text and the list of parsed actions; the
+        result of every executed action is appended to results when given.
+        """
+        parser = ActionStreamParser()
+        actions = []
+
+        if not self.stream_renderer.enabled:
+            text = self.stream_renderer.send_message(chat, prompt, echo=False).strip()
+            return text, self.dispatch_response(chat, text, parser, results)
+
+        # Análises de comandos só podem ser enviadas depois que a resposta terminar
+        pending_analysis = []
+        # Texto fora do array de ações é mostrado normalmente; o array (com colchetes e bloco de código) não
+        display = ActionTextFilter(parser)
+
+        def on_text(chunk):
+            new_actions, before, after = display.feed(chunk)
+            
+            if new_actions:
+                if before:
+                    self.stream_renderer.print_title()
+                    console.print(before, markup=False, highlight=False)
+                    before = ""
+                if not actions:
+                    console.print("\n[bold]Proposed actions:[/bold]")
+                for action in new_actions:
+                    actions.append(action)
+                    self.show_action(action)
+                # Executar já o que chegou; só ações que chegaram juntas formam um lote
+                executed.extend(self.execute_actions(new_actions, chat, pending_analysis))
+            return before + after
+
+        executed = []
+        text = self.stream_renderer.send_message(chat, prompt, on_text=on_text).strip()
+        rest = display.flush()
+        if rest.strip():
+            self.stream_renderer.print_title()
+            console.print(rest, markup=False, highlight=False)
+        if results is not None:
+            results.extend(executed)
+        self.report_parse_problems(parser, actions)
+
+        for analysis_prompt in pending_analysis:
+            try:
+                self.stream_renderer.send_message(chat, analysis_prompt, title="Analysis:")
+            except Exception as e:
+                console.print(f"[yellow]Could not analyze result: {str(e)}[/yellow]")
+        return text, actions
+
+    def dispatch_response(self, chat, text, parser=None, results=None):
+        """Shows a complete response and executes its actions after one confirmation"""
+        parser = parser or ActionStreamParser()
+        actions = parser.feed(text)
+        if actions:
+            console.print("\n[bold]Proposed actions:[/bold]")
+            for action in actions:
+                self.show_action(action)
+            
+            if Prompt.ask("\nProceed with these actions?", choices=["y", "n"]) == "y":
+                executed = self.execute_actions(actions, chat)
+                if results is not None:
+                    results.extend(executed)
+            elif results is not None:
+                results.extend(self.action_result(action, "declined") for action in actions)
+        else:
+            console.print("\n[bold]AI Response:[/bold]")
+            console.print(text)
+        self.report_parse_problems(parser, actions)
+        return actions
+
+    def report_parse_problems(self, parser, actions):
+        if parser.errors:
+            console.print(f"[yellow]Skipped {len(parser.errors)} malformed action(s): {'; '.join(parser.errors)}[/yellow]")
+        if parser.truncated:
+            console.print(f"[yellow]Response ended before the action list was closed; recovered {len(actions)} complete action(s)[/yellow]")
+
+    def execute_actions(self, actions, chat, pending_analysis=None):
+        """Executes actions in order; with batch apply on, each run of file actions is one transaction.
+
+        Only the given actions are batched: while streaming it is called with
+        the actions that already arrived, so nothing waits for the rest.
+        """
+        results, batch = [], []
+        for action in actions:
+            if self.batch_apply and action.get('action_type') in FILE_ACTIONS:
+                batch.append(action)
+                continue
+            results.extend(self.flush_batch(batch, chat, pending_analysis))
+            results.append(self.execute_action(action, chat, pending_analysis))
+        results.extend(self.flush_batch(batch, chat, pending_analysis))
+        return results
+
+    def flush_batch(self, batch, chat, pending_analysis=None):
+        """Applies and empties the pending file actions (a single one keeps its own prompt)"""
+        actions = batch[:]
+        batch.clear()
+        if len(actions) == 1:
+            return [self.execute_action(actions[0], chat, pending_analysis)]
+        if actions:
+            return self.apply_batch(actions)
+        return []
+
+    def apply_batch(self, actions):
+        """Validates file actions together and applies them as one transaction after a single confirmation"""
+        applier = BatchApplier(os.getcwd(), patch=self.file_manager.resolve_patch)
+        operations, problems = applier.validate(actions)
+        invalid = {id(action): reason for action, reason in problems}
+        if problems:
+            console.print(f"\n[yellow]{len(problems)} action(s) cannot be applied:[/yellow]")
+            for action, reason in problems:
+                console.print(f"[yellow]  - {escape(reason)}[/yellow]")
+
+        status, detail = "failed", "not applied"
+        if operations:
+            console.print(f"\n[bold]Batch of {len(operations)} file change(s):[/bold]")
+            for op in operations:
+                target = applier.rel(op['path'])
+                if op['type'] == 'move':
+                    target += f" -> {applier.rel(op['dest'])}"
+                note = f" [dim]({op['note']})[/dim]" if op['note'] else ""
+                console.print(f"  {op['type']:<6} {escape(target)}{note}")
+
+            if Prompt.ask(f"\nApply these {len(operations)} changes as one batch?", choices=["y", "n"]) == "y":
+                try:
+                    applier.apply(operations)
+                    console.print(f"[green]Applied {len(operations)} file change(s)[/green]")
+                    status, detail = "applied", None
+                except BatchError as e:
+                    console.print(f"[red]Batch failed, no file was changed: {escape(str(e))}[/red]")
+                    detail = f"batch rolled back: {e}"
+            else:
+                status, detail = "declined", None
+
+        notes = {id(op['action']): op['note'] for op in operations}
+        results = []
+        for action in actions:
+            if id(action) in invalid:
+                results.append(self.action_result(action, "failed", invalid[id(action)]))
+            elif status == "applied":
+                results.append(self.action_result(action, status, notes.get(id(action))))
+            else:
+                results.append(self.action_result(action, status, detail))
+        return results
+
+    def action_result(self, action, status, detail=None):
+        result = {"action_type": action.get('action_type'), "path": action.get('path'), "status": status}
+        if action.get('action_type') == 'terminal':
+            result["command"] = action.get('content')
+        if detail:
+            result["detail"] = detail
+        return result
+
+    def execute_action(self, action, chat, pending_analysis=None):
+        """Executa uma ação e retorna o resultado (status applied, declined ou failed)"""
         try:
             if action['action_type'] == 'create':
                 # Validar se o path está vazio ou None
                 if not action.get('path') or action['path'].strip() == '':
                     console.print("[red]Error: Invalid or empty file path[/red]")
                     console.print(f"[yellow]Debug - Received path: '{action.get('path')}'[/yellow]")
-                    return
+                    return self.action_result(action, "failed", "empty path")
                 
                 # Normalizar o path para evitar problemas com barras
                 action['path'] = os.path.normpath(action['path'].strip())
@@ -1169,7 +1582,7 @@ User request: {prompt}"""
                 # Validar se o conteúdo existe
                 if 'content' not in action or action['content'] is None:
                     console.print("[red]Error: No content provided for file[/red]")
-                    return
+                    return self.action_result(action, "failed", "no content")
                 
                 # Criar diretórios necessários
                 file_dir = os.path.dirname(action['path'])
@@ -1178,32 +1591,54 @@ User request: {prompt}"""
                         os.makedirs(file_dir)
                     except Exception as e:
                         console.print(f"[red]Error creating directory {file_dir}: {str(e)}[/red]")
-                        return
+                        return self.action_result(action, "failed", str(e))
                 
                 if Prompt.ask(f"Create {action['path']}?", choices=["y", "n"]) == "y":
                     try:
                         with open(action['path'], 'w', encoding='utf-8') as f:
                             f.write(action['content'])
                         console.print(f"[green]Created {action['path']}[/green]")
+                        return self.action_result(action, "applied")
                     except Exception as e:
                         console.print(f"[red]Error creating file {action['path']}: {str(e)}[/red]")
                         console.print(f"[yellow]Debug - Path: '{action['path']}'[/yellow]")
                         console.print(f"[yellow]Debug - Content length: {len(action['content'])}[/yellow]")
+                        return self.action_result(action, "failed", str(e))
                     
             elif action['action_type'] == 'edit':
                 # Validar se o path está vazio
                 if not action.get('path'):
                     console.print("[red]Error: Empty file path provided[/red]")
-                    return
+                    return self.action_result(action, "failed", "empty path")
                 
                 if Prompt.ask(f"Edit {action['path']}?", choices=["y", "n"]) == "y":
-                    self.file_manager.edit_file(action['path'], action['content'])
+                    if self.file_manager.edit_file(action['path'], action['content']):
+                        return self.action_result(action, "applied")
+                    return self.action_result(action, "failed", "could not write file")
+                    
+            elif action['action_type'] == 'patch':
+                # Validar se o path está vazio
+                if not action.get('path'):
+                    console.print("[red]Error: Empty file path provided[/red]")
+                    return self.action_result(action, "failed", "empty path")
+                if not os.path.isfile(action['path']):
+                    console.print(f"[red]Error: {action['path']} does not exist (use create for new files)[/red]")
+                    return self.action_result(action, "failed", "file does not exist")
+                if not action.get('content'):
+                    console.print("[red]Error: Empty patch[/red]")
+                    return self.action_result(action, "failed", "empty patch")
+                
+                if Prompt.ask(f"Patch {action['path']}?", choices=["y", "n"]) == "y":
+                    result = self.file_manager.patch_file(action['path'], action['content'])
+                    if result is None:
+                        return self.action_result(action, "failed", "could not patch file")
+                    return self.action_result(action, "applied" if result["applied"] and not result["failed"] else "failed", summarize(result))
                     
             elif action['action_type'] == 'move':
                 # Validar paths
                 if not action.get('path') or not action.get('content'):
                     console.print("[red]Error: Source or destination path is empty[/red]")
-                    return
+                    return self.action_result(action, "failed", "empty path")
                 
                 if Prompt.ask(f"Move {action['path']} to {action['content']}?", choices=["y", "n"]) == "y":
                     # Criar diretório de destino se necessário
@@ -1211,76 +1646,102 @@ User request: {prompt}"""
                     if dest_dir and not os.path.exists(dest_dir):
                         os.makedirs(dest_dir)
                     os.rename(action['path'], action['content'])
+                    return self.action_result(action, "applied")
                     
             elif action['action_type'] == 'remove':
                 # Validar se o path está vazio
                 if not action.get('path'):
                     console.print("[red]Error: Empty file path provided[/red]")
-                    return
+                    return self.action_result(action, "failed", "empty path")
                 
                 if Prompt.ask(f"Remove {action['path']}?", choices=["y", "n"]) == "y":
-                    self.file_manager.delete_file(action['path'])
+                    if self.file_manager.delete_file(action['path']):
+                        return self.action_result(action, "applied")
+                    return self.action_result(action, "failed", "could not remove")
                     
             elif action['action_type'] == 'terminal':
                 # Validar se o comando está vazio
                 if not action.get('content'):
                     console.print("[red]Error: Empty terminal command[/red]")
-                    return
+                    return self.action_result(action, "failed", "empty command")
                 
-                if Prompt.ask(f"Run command: {action['content']}?", choices=["y", "n"]) == "y":
+                background = bool(action.get('background'))
+                choice = Prompt.ask(
+                    f"Run command{' in the background' if background else ''}: {action['content']}? (b = background)",
+                    choices=["y", "n", "b"]
+                )
+                if choice == "b" or (choice == "y" and background):
+                    job = self.command_runner.background(action['content'])
+                    console.print(f"[green]Started background job {job.id} (pid {job.pid}). Use /jobs, /job-output {job.id} and /job-stop {job.id}[/green]")
+                    return self.action_result(action, "applied", f"background job {job.id}")
+                
+                if choice == "y":
                     try:
-                        import signal
-                        
                         console.print("[bold blue]Executing command... (Press CTRL+C to stop)[/bold blue]")
                         
-                        try:
-                            # Executar comando usando os.system
-                            exit_code = os.system(action['content'])
-                            
+                        # Saída mostrada ao vivo e guardada (últimas linhas) para a análise
+                        job = self.command_runner.run(action['content'], timeout=self.action_timeout(action))
+                        exit_code = job.exit_code
+                        
+                        if job.timed_out:
+                            console.print(f"\n[red]Command timed out after {job.elapsed():.0f}s and was stopped[/red]")
+                            outcome = f"timed out after {job.elapsed():.0f}s"
+                        elif job.interrupted:
+                            console.print("\n[yellow]Command interrupted by user[/yellow]")
+                            outcome = "interrupted"
+                        else:
                             if exit_code != 0:
                                 console.print(f"\n[red]Command failed with exit code: {exit_code}[/red]")
-                            
-                        except KeyboardInterrupt:
-                            console.print("\n[yellow]Command interrupted by user[/yellow]")
-                            # Em sistemas Unix, enviar SIGINT para o grupo de processo
-                            if os.name != 'nt':
-                                os.kill(0, signal.SIGINT)
+                            outcome = f"exit code {exit_code}"
                         
                         # Análise opcional do resultado
                         if Prompt.ask("\nAnalyze command result?", choices=["y", "n"]) == "y":
                             try:
+                                output = job.tail() or "(no output)"
                                 analysis_prompt = f"""Command: {action['content']}
-Exit code: {exit_code if 'exit_code' in locals() else 'interrupted'}
+Exit code: {exit_code if not (job.timed_out or job.interrupted) else outcome}
+
+Output (last {len(job.output)} of {job.total_lines} lines):
+```
+{output}
+```
 
 Please provide a brief analysis:
 1. Success/failure status
 2. Suggested next steps"""
 
-                                response = chat.send_message(analysis_prompt)
-                                console.print("\n[bold]Analysis:[/bold]")
-                                console.print(response.text)
+                                if pending_analysis is not None:
+                                    # A resposta atual ainda está chegando
+                                    pending_analysis.append(analysis_prompt)
+                                    console.print("[dim]Analysis will run when the current response finishes[/dim]")
+                                else:
+                                    self.stream_renderer.send_message(chat, analysis_prompt, title="Analysis:")
                                 
                             except Exception as e:
                                 console.print(f"[yellow]Could not analyze result: {str(e)}[/yellow]")
+                        
+                        if job.timed_out or job.interrupted or exit_code != 0:
+                            return self.action_result(action, "failed", outcome)
+                        return self.action_result(action, "applied")
                     
                     except Exception as e:
                         console.print(f"[red]Error executing command: {str(e)}[/red]")
+                        return self.action_result(action, "failed", str(e))
+            
+            else:
+                console.print(f"[yellow]Unknown action type: {action.get('action_type')}[/yellow]")
+                return self.action_result(action, "failed", "unknown action type")
+            
+            # O usuário recusou a ação
+            return self.action_result(action, "declined")
                     
         except Exception as e:
             console.print(f"[red]Error executing action: {str(e)}[/red]")
+            return self.action_result(action, "failed", str(e))
 
     def save_chat_history(self, chat, chat_file):
-        # Converter histórico para formato serializável
-        history_to_save = []
-        for msg in chat.history:
-            if hasattr(msg, 'parts') and hasattr(msg, 'role'):
-                history_to_save.append({
-                    "parts": [{"text": part.text} for part in msg.parts],
-                    "role": msg.role
-                })
-        
-        with open(chat_file, "w") as f:
-            json.dump(history_to_save, f, indent=4)
+        # Grava apenas as mensagens novas no log (append-only)
+        self.get_chat_log(chat_file).sync(chat.history)
 
 if __name__ == "__main__":
     app = GemiCoder()
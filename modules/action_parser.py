@@ -0,0 +1,195 @@
+import re
+import json
+
+# Abertura de bloco de código (```json) no fim do texto, possivelmente incompleta
+FENCE_TAIL = re.compile(r'(^|\n)[ \t]*`{1,3}[\w+-]*[ \t]*\n?[ \t]*$')
+
+class ActionStreamParser:
+    """Incremental parser for the JSON action array returned by the model.
+
+    Text can be fed in arbitrary chunks; every object of the array is returned
+    by feed() as soon as its closing brace arrives. Malformed objects are
+    skipped and truncated arrays keep every object that was completed.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.offset = 0          # posição absoluta do início do buffer
+        self.pos = 0             # próximo caractere a analisar dentro do buffer
+        self.array_start = None  # posição absoluta do '[' que abre o array
+        self.array_closed = False
+        self.array_end = None    # posição absoluta logo após o ']' que fecha o array
+        self.object_start = None
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.errors = []
+
+    @property
+    def in_array(self):
+        return self.array_start is not None
+
+    @property
+    def truncated(self):
+        """True when the array was opened but never closed"""
+        return self.in_array and not self.array_closed
+
+    def feed(self, text):
+        self.buffer += text
+        objects = []
+
+        while self.pos < len(self.buffer) and not self.array_closed:
+            if not self.in_array:
+                if not self._find_array_start():
+                    break
+                continue
+
+            char = self.buffer[self.pos]
+
+            if self.object_start is None:
+                if char == '{':
+                    self.object_start = self.pos
+                    self.depth = 1
+                elif char == ']':
+                    self.array_closed = True
+                    self.array_end = self.offset + self.pos + 1
+                self.pos += 1
+                continue
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+                if self.depth == 0:
+                    obj = self._decode(self.buffer[self.object_start:self.pos + 1])
+                    if obj is not None:
+                        objects.append(obj)
+                    self.object_start = None
+                    self._trim(self.pos + 1)
+                    continue
+            self.pos += 1
+
+        return objects
+
+    def _find_array_start(self):
+        """Procura um '[' seguido de '{' (ignorando espaços)"""
+        while True:
+            start = self.buffer.find('[', self.pos)
+            if start == -1:
+                # Nada útil no buffer, manter apenas o final
+                self._trim(len(self.buffer))
+                return False
+
+            rest = self.buffer[start + 1:].lstrip()
+            if not rest:
+                # Ainda não sabemos o que vem depois do '['
+                self._trim(start)
+                return False
+            if rest[0] == '{':
+                self.array_start = self.offset + start
+                self.pos = start + 1
+                return True
+            self.pos = start + 1
+
+    def _trim(self, index):
+        self.buffer = self.buffer[index:]
+        self.offset += index
+        self.pos = 0
+
+    def _decode(self, raw):
+        try:
+            # strict=False aceita quebras de linha literais dentro das strings
+            obj = json.loads(raw, strict=False)
+        except json.JSONDecodeError as e:
+            self.errors.append(f"{e.msg} at char {e.pos}")
+            return None
+
+        if not isinstance(obj, dict):
+            self.errors.append("Array item is not an object")
+            return None
+        return obj
+
+class ActionTextFilter:
+    """Splits streamed text into the parts shown to the user, hiding the action array.
+
+    The array, its brackets and the code fence around it are never shown.
+    Text that may still turn out to be the start of the array (a '[' or a
+    fence opener at the end of what was received) is held back until the
+    next chunk decides it; flush() releases it when the response ends.
+    """
+
+    def __init__(self, parser=None):
+        self.parser = parser or ActionStreamParser()
+        self.text = ""
+        self.shown = 0        # tudo antes desta posição já foi decidido
+        self.fenced = False   # o array estava dentro de um bloco de código
+
+    def feed(self, chunk):
+        """Returns (actions, text before the array, text after the array) for this chunk"""
+        self.text += chunk
+        actions = self.parser.feed(chunk)
+        parser = self.parser
+        before = after = ""
+
+        if not parser.in_array:
+            # O buffer do parser começa no '[' que ainda pode abrir o array
+            before = self._release(parser.offset, hold_fence=True)
+        elif self.shown <= parser.array_start:
+            head = self.text[self.shown:parser.array_start]
+            match = FENCE_TAIL.search(head)
+            if match:
+                self.fenced = True
+                head = head[:match.start()] + match.group(1)
+            before = head
+            self.shown = parser.array_start + 1
+
+        if parser.array_closed:
+            self.shown = max(self.shown, parser.array_end)
+            after = self._after_array(final=False)
+        return actions, before, after
+
+    def flush(self):
+        """Text still held back when the response ends"""
+        if not self.parser.in_array:
+            return self._release(len(self.text), hold_fence=False)
+        if self.parser.array_closed:
+            return self._after_array(final=True)
+        return ""
+
+    def _release(self, end, hold_fence):
+        text = self.text[self.shown:end]
+        if hold_fence:
+            match = FENCE_TAIL.search(text)
+            if match:
+                text = text[:match.start()]
+        self.shown += len(text)
+        return text
+
+    def _after_array(self, final):
+        text = self.text[self.shown:]
+        if self.fenced:
+            stripped = text.lstrip()
+            if not final and (not stripped or "```".startswith(stripped)):
+                # Ainda não dá para saber se é o fechamento do bloco
+                return ""
+            if stripped.startswith("```"):
+                self.shown += len(text) - len(stripped) + 3
+                self.fenced = False
+                text = self.text[self.shown:]
+        self.shown += len(text)
+        return text
+
+def parse_actions(text):
+    """Returns every complete action object found in text"""
+    parser = ActionStreamParser()
+    actions = parser.feed(text)
+    return actions, parser
@@ -0,0 +1,47 @@
+import os
+import tempfile
+
+# Arquivos temporários ainda não renomeados (ignorados por quem lista diretórios)
+TMP_PREFIX = ".tmp-"
+
+def atomic_write_text(path, text, fsync=False):
+    """Writes text to path through a temporary file and an atomic rename.
+
+    Readers see either the old or the new content, never a partial file.
+    With fsync=True the data is flushed to disk before the rename.
+    """
+    _atomic_write(path, text, {"mode": "w", "encoding": "utf-8"}, fsync)
+
+def atomic_write_bytes(path, data, fsync=False):
+    """Same as atomic_write_text for binary data"""
+    _atomic_write(path, data, {"mode": "wb"}, fsync)
+
+def _atomic_write(path, data, open_args, fsync):
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=TMP_PREFIX, suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, **open_args) as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    if fsync:
+        fsync_directory(directory)
+
+def fsync_directory(directory):
+    # Garante que o rename foi persistido (não suportado no Windows)
+    if os.name == "nt":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
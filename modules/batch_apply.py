@@ -0,0 +1,222 @@
+import os
+import shutil
+import itertools
+from modules.worker_pool import ordered_map
+from modules.patcher import apply_patch, summarize
+
+FILE_ACTIONS = ("create", "edit", "patch", "move", "remove")
+WRITES = ("create", "edit", "patch")
+
+class BatchError(Exception):
+    pass
+
+class BatchApplier:
+    """Applies a group of file actions as one transaction.
+
+    validate() checks every action against the project (paths inside the
+    root, create vs edit by existence, move/remove sources, two actions on
+    the same path) and computes patched contents before anything is
+    touched. apply() writes the new contents to temporary files in
+    parallel, then commits them with atomic renames, keeping backups of
+    what it replaces; if any step fails every change already made is
+    rolled back.
+    """
+
+    counter = itertools.count()
+
+    def __init__(self, root=None, workers=None, patch=None):
+        self.root = os.path.abspath(root or os.getcwd())
+        self.workers = workers
+        # patch(path, content, patch_text) -> resultado de apply_patch
+        self.patch = patch or (lambda path, content, patch_text: apply_patch(content, patch_text))
+
+    def resolve(self, path):
+        full = os.path.normpath(os.path.join(self.root, path.strip()))
+        if os.path.commonpath([self.root, full]) != self.root:
+            raise BatchError(f"{path} is outside the project")
+        return full
+
+    def rel(self, full):
+        return os.path.relpath(full, self.root)
+
+    def validate(self, actions):
+        """Returns (operations, problems); problems are (action, reason) pairs"""
+        operations, problems = [], []
+        touched = {}
+        # Estado simulado do sistema de arquivos depois das operações anteriores
+        state = {}
+
+        def exists(full):
+            return state[full] if full in state else os.path.lexists(full)
+
+        for action in actions:
+            action_type = action.get('action_type')
+            try:
+                if not action.get('path') or not action['path'].strip():
+                    raise BatchError("empty path")
+                full = self.resolve(action['path'])
+                op = {"action": action, "type": action_type, "path": full, "note": None}
+                paths = [full]
+
+                if action_type in ("create", "edit"):
+                    if action.get('content') is None:
+                        raise BatchError(f"{self.rel(full)}: no content provided")
+                    if exists(full) and os.path.isdir(full):
+                        raise BatchError(f"{self.rel(full)} is a directory")
+                    if action_type == "create" and exists(full):
+                        op["type"], op["note"] = "edit", "already exists, will be replaced"
+                    elif action_type == "edit" and not exists(full):
+                        op["type"], op["note"] = "create", "does not exist, will be created"
+                    op["content"] = action['content']
+                    state[full] = True
+                elif action_type == "patch":
+                    if not action.get('content'):
+                        raise BatchError(f"{self.rel(full)}: empty patch")
+                    if not os.path.isfile(full):
+                        raise BatchError(f"{self.rel(full)} does not exist")
+                    try:
+                        with open(full, "r", encoding="utf-8", newline="") as f:
+                            current = f.read()
+                    except (OSError, ValueError) as e:
+                        raise BatchError(f"{self.rel(full)}: {e}")
+                    result = self.patch(self.rel(full), current, action['content'])
+                    if result["failed"] or not result["applied"]:
+                        raise BatchError(f"{self.rel(full)}: {summarize(result)}")
+                    op["content"], op["note"] = result["content"], summarize(result)
+                    state[full] = True
+                elif action_type == "move":
+                    if not action.get('content') or not action['content'].strip():
+                        raise BatchError(f"{self.rel(full)}: empty destination")
+                    dest = self.resolve(action['content'])
+                    if not exists(full):
+                        raise BatchError(f"{self.rel(full)} does not exist")
+                    if exists(dest):
+                        raise BatchError(f"{self.rel(dest)} already exists")
+                    op["dest"] = dest
+                    paths.append(dest)
+                    state[full], state[dest] = False, True
+                elif action_type == "remove":
+                    if not exists(full):
+                        raise BatchError(f"{self.rel(full)} does not exist")
+                    if os.path.isdir(full) and os.listdir(full):
+                        raise BatchError(f"{self.rel(full)} is a directory that is not empty")
+                    state[full] = False
+                else:
+                    raise BatchError(f"{action_type} is not a file action")
+
+                for path in paths:
+                    if path in touched:
+                        raise BatchError(f"{self.rel(path)} is also changed by another action in this batch")
+                for path in paths:
+                    touched[path] = op
+                operations.append(op)
+            except BatchError as e:
+                problems.append((action, str(e)))
+        return operations, problems
+
+    def temp_path(self, full, kind):
+        folder, name = os.path.split(full)
+        return os.path.join(folder, f".{name}.gemicoder-{kind}-{os.getpid()}-{next(self.counter)}")
+
+    def apply(self, operations):
+        created_dirs = []
+        temps = {}
+        undo = []
+        try:
+            # Diretórios necessários (anotados para o rollback)
+            for op in operations:
+                target = op.get("dest") or op["path"]
+                if op["type"] in WRITES + ("move",):
+                    self.make_parents(os.path.dirname(target), created_dirs)
+
+            # 1) Conteúdos gravados em arquivos temporários, em paralelo
+            def write(op):
+                tmp = self.temp_path(op["path"], "tmp")
+                # Conteúdo de patch já tem os finais de linha do arquivo
+                with open(tmp, "w", encoding="utf-8", newline="" if op["type"] == "patch" else None) as f:
+                    f.write(op["content"])
+                    f.flush()
+                    os.fsync(f.fileno())
+                if os.path.isfile(op["path"]):
+                    shutil.copymode(op["path"], tmp)
+                return tmp
+
+            # Esperar todas as gravações antes de falhar, para nenhum temporário ficar para trás
+            failure = None
+            writes = [op for op in operations if op["type"] in WRITES]
+            for op, tmp, error in ordered_map(write, writes, self.workers):
+                if error is not None:
+                    failure = failure or f"{self.rel(op['path'])}: {error}"
+                else:
+                    temps[id(op)] = tmp
+            if failure:
+                raise BatchError(failure)
+
+            # 2) Commit com renomeações atômicas
+            for op in operations:
+                path = op["path"]
+                if op["type"] in WRITES:
+                    if os.path.lexists(path):
+                        backup = self.temp_path(path, "bak")
+                        os.replace(path, backup)
+                        undo.append(("restore", path, backup))
+                    else:
+                        undo.append(("delete", path, None))
+                    os.replace(temps.pop(id(op)), path)
+                elif op["type"] == "move":
+                    os.replace(path, op["dest"])
+                    undo.append(("move", op["dest"], path))
+                elif op["type"] == "remove":
+                    backup = self.temp_path(path, "bak")
+                    os.replace(path, backup)
+                    undo.append(("restore", path, backup))
+        except Exception as e:
+            errors = self.rollback(undo, temps, created_dirs)
+            message = str(e) if isinstance(e, BatchError) else f"{type(e).__name__}: {e}"
+            if errors:
+                message += f" (rollback problems: {'; '.join(errors)})"
+            raise BatchError(message)
+
+        # Sucesso: descartar os backups
+        for kind, path, backup in undo:
+            if kind == "restore":
+                if os.path.isdir(backup):
+                    os.rmdir(backup)
+                else:
+                    os.remove(backup)
+
+    def make_parents(self, folder, created_dirs):
+        missing = []
+        while folder and not os.path.exists(folder):
+            missing.append(folder)
+            folder = os.path.dirname(folder)
+        for path in reversed(missing):
+            os.mkdir(path)
+            created_dirs.append(path)
+
+    def rollback(self, undo, temps, created_dirs):
+        errors = []
+        for kind, path, other in reversed(undo):
+            try:
+                if kind == "restore":
+                    if os.path.lexists(path) and not os.path.isdir(path):
+                        os.remove(path)
+                    os.replace(other, path)
+                elif kind == "delete":
+                    if os.path.lexists(path):
+                        os.remove(path)
+                elif kind == "move":
+                    os.replace(path, other)
+            except OSError as e:
+                errors.append(f"{self.rel(path)}: {e}")
+        for tmp in temps.values():
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+        for folder in reversed(created_dirs):
+            try:
+                os.rmdir(folder)
+            except OSError:
+                pass
+        return errors
@@ -0,0 +1,67 @@
+import os
+import re
+import hashlib
+from modules.chat_history import message_role, message_text
+from modules.atomic_io import TMP_PREFIX, atomic_write_bytes
+from modules.image_processor import EXTENSIONS
+
+REFERENCE_PATTERN = re.compile(r'\[image sha256:([0-9a-f]{64}) (\S+)(?: ([^\]]*))?\]')
+
+def image_reference(digest, mime_type, name=""):
+    """Text kept in the chat history in place of an image"""
+    return f"[image sha256:{digest} {mime_type}{' ' + name if name else ''}]"
+
+def find_image_references(history):
+    """Images referenced in a chat history, oldest first, without repeats"""
+    found = {}
+    for msg in history:
+        if message_role(msg) != "user":
+            continue
+        for digest, mime_type, name in REFERENCE_PATTERN.findall(message_text(msg)):
+            found.setdefault(digest, (digest, mime_type, name))
+    return list(found.values())
+
+class BlobStore:
+    """Content-addressed store for binary attachments such as images.
+
+    Blobs are kept as raw bytes (no base64) under <root>/<first two hex
+    digits>/<sha256><extension>, so the same image added from different
+    chats or projects is stored once. Chat histories only keep a reference.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, digest, mime_type):
+        return os.path.join(self.root, digest[:2], digest + EXTENSIONS.get(mime_type, ".bin"))
+
+    def put(self, data, mime_type):
+        """Stores data (if new) and returns its sha256 digest"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest, mime_type)
+        if not os.path.exists(path):
+            atomic_write_bytes(path, data)
+        return digest
+
+    def get(self, digest, mime_type):
+        with open(self.path(digest, mime_type), "rb") as f:
+            return f.read()
+
+    def exists(self, digest, mime_type):
+        return os.path.exists(self.path(digest, mime_type))
+
+    def part(self, digest, mime_type):
+        """Inline data part for a stored blob, ready to be sent to the model"""
+        return {"mime_type": mime_type, "data": self.get(digest, mime_type)}
+
+    def usage(self):
+        count, total = 0, 0
+        if not os.path.exists(self.root):
+            return count, total
+        for folder in os.scandir(self.root):
+            if folder.is_dir():
+                for entry in os.scandir(folder.path):
+                    if not entry.name.startswith(TMP_PREFIX):
+                        count += 1
+                        total += entry.stat().st_size
+        return count, total
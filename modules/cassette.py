@@ -0,0 +1,240 @@
+import json
+import time
+import base64
+import hashlib
+import threading
+from modules.model_backend import ModelBackend, FakeBackend, FakeResponse
+
+def canonical_parts(value):
+    """Flattens a prompt (str, parts list, dict or Content) into comparable parts"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [["text", value]]
+    if isinstance(value, (list, tuple)):
+        parts = []
+        for item in value:
+            parts.extend(canonical_parts(item))
+        return parts
+    if isinstance(value, dict):
+        if 'parts' in value:
+            return canonical_parts(list(value['parts']))
+        if 'content' in value:
+            return canonical_parts(value['content'])
+        if 'inline_data' in value:
+            return canonical_parts(value['inline_data'])
+        if 'mime_type' in value and 'data' in value:
+            return [["data", value['mime_type'], data_digest(value['data'])]]
+        return [["text", value.get('text') or ""]]
+    if hasattr(value, 'parts'):
+        return canonical_parts(list(value.parts))
+
+    inline_data = getattr(value, 'inline_data', None)
+    if inline_data and getattr(inline_data, 'data', None):
+        return [["data", inline_data.mime_type, data_digest(inline_data.data)]]
+    if isinstance(inline_data, dict):
+        return canonical_parts(inline_data)
+    return [["text", getattr(value, 'text', "") or ""]]
+
+def data_digest(data):
+    if isinstance(data, str):
+        # Imagens em base64 e em bytes devem gerar a mesma chave
+        try:
+            data = base64.b64decode(data, validate=True)
+        except ValueError:
+            data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+def prompt_digest(value):
+    canonical = json.dumps(canonical_parts(value), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def prompt_preview(value, limit=200):
+    text = " ".join(part[1] for part in canonical_parts(value) if part[0] == "text")
+    return text[:limit]
+
+def finish_reason_name(response):
+    try:
+        reason = response.candidates[0].finish_reason
+    except (AttributeError, IndexError, TypeError, ValueError):
+        return "STOP"
+    return getattr(reason, 'name', str(reason))
+
+class Cassette:
+    """JSONL file with one recorded model interaction per line"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def append(self, entry):
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def load(self):
+        entries = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+        return entries
+
+class RecordingStream:
+    """Proxy for a streamed response that records every chunk and its timing"""
+
+    def __init__(self, response, started, on_done):
+        self.response = response
+        self.started = started
+        self.on_done = on_done
+        self.chunks = []
+        self.chunk_times = []
+
+    def __iter__(self):
+        for chunk in self.response:
+            self.chunk_times.append(time.perf_counter() - self.started)
+            try:
+                self.chunks.append(chunk.text)
+            except Exception:
+                self.chunks.append("")
+            yield chunk
+        self.on_done(self)
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+class RecordingChat:
+    def __init__(self, chat, backend):
+        self.chat = chat
+        self.backend = backend
+
+    @property
+    def history(self):
+        return self.chat.history
+
+    @history.setter
+    def history(self, value):
+        self.chat.history = value
+
+    def send_message(self, content, stream=False, **kwargs):
+        return self.backend.record("chat", content, stream,
+                                   lambda: self.chat.send_message(content, stream=stream, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self.chat, name)
+
+class RecordingBackend(ModelBackend):
+    """Wraps a backend and records every request/response to a cassette"""
+
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.cassette = Cassette(path)
+        self.model_name = backend.model_name
+        self.generation_config = backend.generation_config
+        self.recorded = 0
+        self.model_time = 0.0
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        return self.record("generate", contents, stream,
+                           lambda: self.backend.generate_content(contents, stream=stream, **kwargs))
+
+    def start_chat(self, history=None):
+        return RecordingChat(self.backend.start_chat(history), self)
+
+    def record(self, kind, content, stream, call):
+        started = time.perf_counter()
+        response = call()
+        entry = {
+            "kind": kind,
+            "key": prompt_digest(content),
+            "prompt": prompt_preview(content),
+            "stream": stream
+        }
+
+        if stream:
+            def on_done(recorded):
+                entry.update({
+                    "text": "".join(recorded.chunks),
+                    "chunks": recorded.chunks,
+                    "chunk_times": recorded.chunk_times,
+                    "duration": time.perf_counter() - started,
+                    "finish_reason": finish_reason_name(response)
+                })
+                self.save(entry)
+            return RecordingStream(response, started, on_done)
+
+        entry.update({
+            "text": response.text,
+            "chunks": [response.text],
+            "chunk_times": [time.perf_counter() - started],
+            "duration": time.perf_counter() - started,
+            "finish_reason": finish_reason_name(response)
+        })
+        self.save(entry)
+        return response
+
+    def save(self, entry):
+        self.recorded += 1
+        self.model_time += entry["duration"]
+        self.cassette.append(entry)
+
+    def summary(self):
+        return f"Recording: {self.recorded} interactions, {self.model_time:.2f}s spent waiting for the model"
+
+class CassetteMiss(Exception):
+    pass
+
+class ReplayBackend(FakeBackend):
+    """Replays a recorded cassette.
+
+    Interactions are matched by the digest of the prompt (the message sent to
+    the chat, or the contents given to generate_content); repeated prompts
+    replay their recordings in order. speed=1 reproduces the recorded
+    latencies, speed=0 replays at full speed and other values scale them.
+    """
+
+    def __init__(self, path, speed=1.0):
+        super().__init__()
+        self.speed = speed
+        self.entries = {}
+        self.replayed = 0
+        self.model_time = 0.0
+        for entry in Cassette(path).load():
+            self.entries.setdefault(entry["key"], []).append(entry)
+        self.model_name = "replay"
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        return self.replay(prompt_digest(contents), stream)
+
+    def respond(self, history, stream=False):
+        return self.replay(prompt_digest(history[-1] if history else ""), stream)
+
+    def replay(self, key, stream):
+        with self.lock:
+            recordings = self.entries.get(key)
+            if not recordings:
+                raise CassetteMiss(f"No recorded response for this prompt (key {key[:12]})")
+            # A última gravação de um prompt repetido continua disponível
+            entry = recordings.pop(0) if len(recordings) > 1 else recordings[0]
+            self.replayed += 1
+
+        chunks = entry.get("chunks") or [entry.get("text", "")]
+        times = entry.get("chunk_times") or [entry.get("duration", 0.0)]
+        delays = [max(0.0, (t - (times[i - 1] if i else 0.0)) * self.speed) for i, t in enumerate(times)]
+        delays += [0.0] * (len(chunks) - len(delays))
+        self.model_time += sum(delays)
+
+        return FakeResponse(
+            entry.get("text", ""),
+            stream=stream,
+            chunks=chunks,
+            delays=delays,
+            finish_reason=entry.get("finish_reason", "STOP")
+        )
+
+    def summary(self):
+        return f"Replay: {self.replayed} interactions, {self.model_time:.2f}s of simulated model latency"
@@ -0,0 +1,73 @@
+# Helpers for chat history messages. Entries are either Gemini Content objects
+# (role + parts) or plain dicts with the same shape, so every helper accepts both.
+
+def message_role(msg):
+    if isinstance(msg, dict):
+        return msg.get('role')
+    return getattr(msg, 'role', None)
+
+def message_parts(msg):
+    if isinstance(msg, dict):
+        return msg.get('parts', [])
+    return getattr(msg, 'parts', [])
+
+def part_text(part):
+    if isinstance(part, dict):
+        return part.get('text') or ""
+    return getattr(part, 'text', "") or ""
+
+def part_has_inline_data(part):
+    # hasattr() é sempre verdadeiro em mensagens proto; 'in' verifica se o campo foi preenchido
+    try:
+        return 'inline_data' in part
+    except TypeError:
+        return getattr(part, 'inline_data', None) is not None
+
+def message_text(msg):
+    return "".join(part_text(part) for part in message_parts(msg))
+
+def message_to_dict(msg):
+    """Serializable form of a message (text parts only)"""
+    if isinstance(msg, dict) and 'content' in msg:
+        # Formato antigo: {"role": ..., "content": ...}
+        return {"role": msg['role'], "content": msg['content']}
+    return {
+        "parts": [{"text": part_text(part)} for part in message_parts(msg)],
+        "role": message_role(msg)
+    }
+
+def make_message(like, role, texts):
+    """Creates a text-only message of the same type as like"""
+    parts = [{"text": text} for text in texts]
+    if like is None or isinstance(like, dict):
+        return {"role": role, "parts": parts}
+    return type(like)(role=role, parts=parts)
+
+def replace_message_text(history, index, text):
+    msg = history[index]
+    history[index] = make_message(msg, message_role(msg), [text])
+
+def find_last_message(history, role, text):
+    """Index of the last message with this role and text, or None"""
+    for index in range(len(history) - 1, -1, -1):
+        msg = history[index]
+        if message_role(msg) == role and message_text(msg) == text:
+            return index
+    return None
+
+def detach_request(history, sent_text, reference_text):
+    """Replaces a sent user message by a short reference (ephemeral context)"""
+    index = find_last_message(history, "user", sent_text)
+    if index is None:
+        return False
+    replace_message_text(history, index, reference_text)
+    return True
+
+def drop_inline_data(history):
+    """Removes messages carrying inline data (images) after they were sent once"""
+    removed = 0
+    for index in range(len(history) - 1, -1, -1):
+        if any(part_has_inline_data(part) for part in message_parts(history[index])):
+            history.pop(index)
+            removed += 1
+    return removed
@@ -0,0 +1,210 @@
+import os
+import json
+from modules.atomic_io import atomic_write_text, fsync_directory
+from modules.chat_history import message_to_dict
+
+LOG_EXTENSION = ".jsonl"
+LEGACY_EXTENSION = ".json"
+
+def chat_path(chats_dir, chat_name):
+    """Path of an existing chat (new or legacy format), or None"""
+    for extension in (LOG_EXTENSION, LEGACY_EXTENSION):
+        path = os.path.join(chats_dir, chat_name + extension)
+        if os.path.exists(path):
+            return path
+    return None
+
+def list_chats(chats_dir):
+    if not os.path.exists(chats_dir):
+        return []
+    names = set()
+    for file in os.listdir(chats_dir):
+        name, extension = os.path.splitext(file)
+        if extension in (LOG_EXTENSION, LEGACY_EXTENSION):
+            names.add(name)
+    return list(names)
+
+def remove_chat(chats_dir, chat_name):
+    removed = False
+    for extension in (LOG_EXTENSION, LEGACY_EXTENSION):
+        path = os.path.join(chats_dir, chat_name + extension)
+        if os.path.exists(path):
+            os.remove(path)
+            removed = True
+    return removed
+
+class ChatLog:
+    """Append-only JSONL chat history.
+
+    Every line is a record: {"op": "append", "message": {...}} adds a message
+    and {"op": "truncate", "length": n} drops everything after the first n
+    messages (used when earlier messages are rewritten). Saving a turn only
+    appends the new records; the file is rewritten (atomically) only when the
+    dead records pile up. A torn last line left by a crash is ignored on load.
+
+    History compaction never removes messages from the log: a
+    {"op": "compact", "start": n, "summary": "..."} record says that the
+    model context replaces the messages before n (except the first) with
+    the summary. The chat history synced here is that context, whose first
+    `prefix` messages stand for the hidden ones.
+    """
+
+    COMPACT_MIN_RECORDS = 50
+
+    def __init__(self, path, fsync=True):
+        self.path = path
+        self.fsync = fsync
+        self.persisted = []     # mensagens (objetos) já gravadas, na ordem
+        self.hidden = []        # mensagens do log que o contexto substitui pelo resumo (dicts)
+        self.prefix = 0         # mensagens iniciais do contexto que representam self.hidden
+        self.summary = None
+        self.record_count = 0
+        self.tail_checked = False
+
+    @staticmethod
+    def legacy_path(path):
+        return os.path.splitext(path)[0] + LEGACY_EXTENSION
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    @property
+    def compaction(self):
+        """(start, summary) of the latest compaction, or None"""
+        return (len(self.hidden), self.summary) if self.summary is not None else None
+
+    def load(self):
+        """Returns every saved message as dicts; reads the legacy JSON file when there is no log yet.
+
+        The latest compaction, if any, is available in self.compaction.
+        """
+        if not self.exists():
+            legacy = self.legacy_path(self.path)
+            if os.path.exists(legacy):
+                with open(legacy, "r", encoding="utf-8") as f:
+                    messages = json.load(f)
+                return messages
+            return []
+
+        messages = []
+        start, self.summary = 0, None
+        self.record_count = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Linha incompleta (queda durante a escrita)
+                    continue
+                self.record_count += 1
+                if record.get("op") == "append":
+                    messages.append(record["message"])
+                elif record.get("op") == "truncate":
+                    del messages[record["length"]:]
+                    if start > record["length"]:
+                        start, self.summary = 0, None
+                elif record.get("op") == "compact":
+                    start, self.summary = record["start"], record["summary"]
+        self.hidden = messages[:start]
+        return messages
+
+    def attach(self, history, prefix=0):
+        """Marks the current history objects as already persisted.
+
+        With a loaded compaction, history is the compacted context and its
+        first prefix messages stand for the hidden ones.
+        """
+        self.persisted = list(history)
+        self.prefix = prefix if self.summary is not None else 0
+        if not self.exists():
+            # O arquivo antigo (legacy) é mantido como está; o log passa a ter prioridade
+            self.rewrite(history)
+        elif self.record_count > max(self.COMPACT_MIN_RECORDS, 2 * self.message_count(history)):
+            self.rewrite(history)
+
+    def message_count(self, history):
+        return len(self.hidden) + len(history) - self.prefix
+
+    def compact(self, history, cut, summary):
+        """Records that history[1:cut] of the last synced history was replaced by summary.
+
+        history is the new (compacted) context; its messages after the
+        summary must be the same objects as the synced ones from cut on.
+        """
+        cut = max(cut, self.prefix)
+        self.hidden.extend(message_to_dict(msg) for msg in self.persisted[self.prefix:cut])
+        self.prefix = len(history) - (len(self.persisted) - cut)
+        self.summary = summary
+        self._append_records([{"op": "compact", "start": len(self.hidden), "summary": summary}])
+        self.persisted = list(history)
+
+    def sync(self, history):
+        """Writes the messages that changed since the last sync"""
+        # As mensagens do resumo não são gravadas: só o que vem depois delas
+        tail, persisted = history[self.prefix:], self.persisted[self.prefix:]
+        # Ponto de divergência: primeira mensagem que não é o mesmo objeto já gravado
+        common = 0
+        limit = min(len(tail), len(persisted))
+        while common < limit and tail[common] is persisted[common]:
+            common += 1
+
+        if common == len(tail) and common == len(persisted):
+            self.persisted = list(history)
+            return
+
+        records = []
+        if common < len(persisted):
+            records.append({"op": "truncate", "length": len(self.hidden) + common})
+        records.extend({"op": "append", "message": message_to_dict(msg)} for msg in tail[common:])
+
+        if self.record_count + len(records) > max(self.COMPACT_MIN_RECORDS, 2 * self.message_count(history)):
+            self.rewrite(history)
+            return
+
+        self._append_records(records)
+        self.persisted = list(history)
+
+    def append(self, *messages):
+        """Appends plain messages without tracking a history list"""
+        self._append_records([{"op": "append", "message": message_to_dict(msg)} for msg in messages])
+
+    def rewrite(self, history):
+        """Compacts the log to one append record per live message (and the current compaction)"""
+        messages = self.hidden + [message_to_dict(msg) for msg in history[self.prefix:]]
+        lines = [json.dumps({"op": "append", "message": msg}, ensure_ascii=False) for msg in messages]
+        if self.summary is not None:
+            lines.append(json.dumps({"op": "compact", "start": len(self.hidden), "summary": self.summary}, ensure_ascii=False))
+        atomic_write_text(self.path, "".join(line + "\n" for line in lines), fsync=self.fsync)
+        self.record_count = len(lines)
+        self.persisted = list(history)
+        self.tail_checked = True
+
+    def _append_records(self, records):
+        if not records:
+            return
+        is_new = not self.exists()
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        if not is_new and not self.tail_checked and not self._ends_with_newline():
+            # Não colar o novo registro numa linha incompleta
+            data = "\n" + data
+        self.tail_checked = True
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(data)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        if is_new and self.fsync:
+            fsync_directory(os.path.dirname(self.path) or ".")
+        self.record_count += len(records)
+
+    def _ends_with_newline(self):
+        with open(self.path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return True
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
@@ -1,8 +1,8 @@
 import os
-import json
 from datetime import datetime
 from rich.console import Console
 from rich.prompt import Prompt
+from modules.chat_log import ChatLog
 
 console = Console()
 
@@ -17,9 +17,8 @@ class ChatManager:
             
     def start_chat_session(self, model):
         chat_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-        chat_file = os.path.join(self.chats_dir, f"chat_{chat_id}.json")
-        
-        chat_history = []
+        chat_file = os.path.join(self.chats_dir, f"chat_{chat_id}.jsonl")
+        chat_log = ChatLog(chat_file)
         
         console.print("[bold blue]Chat session started (type 'exit' to end)[/bold blue]")
         
@@ -29,15 +28,13 @@ class ChatManager:
             if user_input.lower() == "exit":
                 break
                 
-            chat_history.append({"role": "user", "content": user_input})
-            
             response = model.generate_content(user_input)
             console.print(f"[bold green]AI:[/bold green] {response.text}")
             
-            chat_history.append({"role": "assistant", "content": response.text})
-            
-            # Save chat history after each interaction
-            with open(chat_file, "w") as f:
-                json.dump(chat_history, f, indent=4)
+            # Save chat history after each interaction (only the new messages are appended)
+            chat_log.append(
+                {"role": "user", "content": user_input},
+                {"role": "assistant", "content": response.text}
+            )
                 
         console.print(f"[blue]Chat saved to: {chat_file}[/blue]") 
\ No newline at end of file
@@ -0,0 +1,234 @@
+import os
+import json
+import hashlib
+import threading
+from modules.atomic_io import atomic_write_text
+
+# Diretórios ignorados ao percorrer o projeto
+IGNORED_DIRS = {
+    '__pycache__',
+    'venv',
+    'env',
+    'node_modules',
+    '.git',
+    '.idea',
+    '.vscode',
+    'build',
+    'dist',
+    'site-packages',
+    'egg-info',
+    '.pytest_cache',
+    '.mypy_cache',
+    '.tox',
+    'coverage',
+    'htmlcov',
+    '.coverage',
+    'vendor',
+    'bower_components',
+    'jspm_packages',
+    'lib',
+    'libs',
+    'bin',
+    'obj',
+    'target',
+    'out'
+}
+
+# Extensões de arquivo que são consideradas texto
+TEXT_EXTENSIONS = {
+    '.txt', '.py', '.js', '.html', '.css', '.json', '.md', '.yml',
+    '.yaml', '.xml', '.csv', '.ini', '.conf', '.sh', '.bat', '.ps1',
+    '.env', '.gitignore', '.sql', '.java', '.cpp', '.c', '.h', '.hpp',
+    '.ts', '.jsx', '.tsx', '.vue', '.php', '.rb', '.pl', '.go'
+}
+
+def is_text_file(path):
+    return os.path.splitext(path)[1].lower() in TEXT_EXTENSIONS
+
+def ignored_dir(name):
+    return name.startswith('.') or name in IGNORED_DIRS
+
+def walk_files(project_dir, subdir=None):
+    """Lists files under subdir (relative to the project), skipping ignored and hidden entries"""
+    top = os.path.join(project_dir, subdir) if subdir else project_dir
+    for root, dirs, files in os.walk(top):
+        dirs[:] = [d for d in dirs if not ignored_dir(d)]
+        for file in files:
+            if not file.startswith('.'):
+                yield os.path.relpath(os.path.join(root, file), project_dir)
+
+def content_hash(content):
+    return hashlib.sha1(content.encode('utf-8', 'surrogatepass')).hexdigest()
+
+def changed_paths(before, after):
+    """Paths added, removed or changed between two CodebaseIndex.snapshot() results"""
+    return sorted(path for path in set(before) | set(after) if before.get(path) != after.get(path))
+
+class CodebaseIndex:
+    """Persistent per-project index of every file's mtime, size and content hash.
+
+    refresh() only stats the tree and re-reads the files whose mtime or size
+    changed since the last call (or the last session). Text contents read in
+    this session are kept in memory, keyed by hash.
+    """
+
+    VERSION = 1
+
+    def __init__(self, project_dir, index_file):
+        self.project_dir = os.path.abspath(project_dir)
+        self.index_file = index_file
+        self.entries = {}   # rel_path -> [mtime_ns, size, hash]
+        self.contents = {}  # rel_path -> (hash, content)
+        self.lock = threading.RLock()
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION:
+                # Entradas com caminhos não normalizados (versões antigas) são descartadas
+                self.entries = {rel_path: entry for rel_path, entry in data.get("files", {}).items()
+                                if self._normalized(rel_path) == rel_path}
+        except (OSError, ValueError):
+            # Índice corrompido: será reconstruído no próximo refresh
+            self.entries = {}
+
+    def save(self):
+        with self.lock:
+            data = {"version": self.VERSION, "files": self.entries}
+            atomic_write_text(self.index_file, json.dumps(data))
+            self.dirty = False
+
+    def walk(self, subdir=None):
+        return walk_files(self.project_dir, subdir)
+
+    def refresh(self, subdir=None):
+        """Brings the entries under subdir up to date and returns the changed paths"""
+        seen = set()
+        changed = []
+        with self.lock:
+            for rel_path in self.walk(subdir):
+                seen.add(rel_path)
+                if self._update(rel_path):
+                    changed.append(rel_path)
+
+            prefix = self._prefix(subdir)
+            for rel_path in list(self.entries):
+                if rel_path.startswith(prefix) and rel_path not in seen:
+                    self._forget(rel_path)
+                    changed.append(rel_path)
+
+            if self.dirty:
+                self.save()
+        return changed
+
+    def snapshot(self):
+        """Content hash of every file (mtime and size for binary ones), to compare with changed_paths()"""
+        with self.lock:
+            return {rel_path: entry[2] or (entry[0], entry[1]) for rel_path, entry in self.entries.items()}
+
+    def relative(self, path):
+        """Project-relative normalized key for path (relative or absolute); ValueError if outside the project"""
+        rel_path = self._normalized(path)
+        if rel_path is None:
+            raise ValueError(f"Path is outside the project: {path}")
+        return rel_path
+
+    def _normalized(self, path):
+        full_path = os.path.normpath(os.path.join(self.project_dir, path))
+        rel_path = os.path.relpath(full_path, self.project_dir)
+        if rel_path == os.curdir or rel_path == os.pardir or rel_path.startswith(os.pardir + os.sep):
+            return None
+        return rel_path
+
+    def refresh_paths(self, rel_paths):
+        """Same as refresh(), limited to the given files (paths outside the project are ignored)"""
+        changed = []
+        with self.lock:
+            for rel_path in dict.fromkeys(filter(None, map(self._normalized, rel_paths))):
+                if os.path.isfile(os.path.join(self.project_dir, rel_path)):
+                    if self._update(rel_path):
+                        changed.append(rel_path)
+                elif rel_path in self.entries:
+                    self._forget(rel_path)
+                    changed.append(rel_path)
+            if self.dirty:
+                self.save()
+        return changed
+
+    def files(self, subdir=None):
+        prefix = self._prefix(subdir)
+        with self.lock:
+            return sorted(p for p in self.entries if p.startswith(prefix))
+
+    def text_files(self, subdir=None):
+        return [p for p in self.files(subdir) if is_text_file(p)]
+
+    def size(self, rel_path):
+        entry = self.entries.get(rel_path)
+        return entry[1] if entry else 0
+
+    def file_hash(self, rel_path):
+        entry = self.entries.get(rel_path)
+        return entry[2] if entry else None
+
+    def read(self, rel_path):
+        """Returns the file content, reading from disk only when it changed"""
+        rel_path = self.relative(rel_path)
+        with self.lock:
+            entry = self.entries.get(rel_path)
+            cached = self.contents.get(rel_path)
+            if entry and cached and entry[2] and cached[0] == entry[2]:
+                return cached[1]
+
+            full_path = os.path.join(self.project_dir, rel_path)
+            st = os.stat(full_path)
+            with open(full_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            digest = content_hash(content)
+            self.entries[rel_path] = [st.st_mtime_ns, st.st_size, digest]
+            self.contents[rel_path] = (digest, content)
+            self.dirty = True
+            return content
+
+    def _update(self, rel_path):
+        """Atualiza a entrada se mtime/tamanho mudaram; retorna True se mudou"""
+        full_path = os.path.join(self.project_dir, rel_path)
+        try:
+            st = os.stat(full_path)
+        except OSError:
+            return False
+
+        entry = self.entries.get(rel_path)
+        if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            return False
+
+        digest = None
+        if is_text_file(rel_path):
+            try:
+                with open(full_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                digest = content_hash(content)
+                self.contents[rel_path] = (digest, content)
+            except (OSError, UnicodeDecodeError):
+                self.contents.pop(rel_path, None)
+
+        self.entries[rel_path] = [st.st_mtime_ns, st.st_size, digest]
+        self.dirty = True
+        # Só conta como mudança se o conteúdo realmente mudou
+        return not entry or digest is None or entry[2] != digest
+
+    def _forget(self, rel_path):
+        self.dirty = True
+        self.entries.pop(rel_path, None)
+        self.contents.pop(rel_path, None)
+
+    @staticmethod
+    def _prefix(subdir):
+        if not subdir or os.path.normpath(subdir) == '.':
+            return ""
+        return os.path.normpath(subdir) + os.sep
@@ -0,0 +1,188 @@
+import os
+import json
+from rich.console import Console
+from modules.atomic_io import atomic_write_text
+from modules.continuation import complete_text
+from modules.tokens import estimate_tokens, format_tokens
+from modules.worker_pool import ordered_map, max_workers
+
+console = Console()
+
+OVERVIEW_REQUEST = ("Please analyze the project structure and provide an overview of the codebase: "
+                    "architecture, main components, how they interact and any notable problems.")
+
+class CodebaseSummarizer:
+    """Map-reduce analysis for projects too big for a single prompt.
+
+    Map: the text files are grouped into shards of about shard_tokens and
+    each shard is summarized file by file by a separate model call, several
+    at a time. Summaries are stored in summaries_file keyed by the file's
+    content hash, so later runs only summarize files that changed. Reduce:
+    the summaries (condensed per directory first when they are too long
+    themselves) become the prompt for the final answer.
+    """
+
+    VERSION = 1
+
+    def __init__(self, model, codebase_index, summaries_file, shard_tokens=None, workers=None):
+        self.model = model
+        self.codebase_index = codebase_index
+        self.summaries_file = summaries_file
+        self.shard_tokens = shard_tokens or int(os.getenv('GEMICODER_SHARD_TOKENS', '24000'))
+        self.workers = workers
+        self.summaries = {}   # rel_path -> {"hash", "summary"}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.summaries_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION:
+                self.summaries = data.get("files", {})
+        except (OSError, ValueError):
+            self.summaries = {}
+
+    def save(self):
+        atomic_write_text(self.summaries_file, json.dumps({"version": self.VERSION, "files": self.summaries}))
+
+    def pending(self, files):
+        """Files without a summary for their current content"""
+        return [rel_path for rel_path in files
+                if self.summaries.get(rel_path, {}).get("hash") != self.codebase_index.file_hash(rel_path)]
+
+    def shards(self, files):
+        """Groups files (kept in directory order) into shards of about shard_tokens"""
+        shards, current, used = [], [], 0
+        for rel_path in sorted(files):
+            try:
+                content = self.codebase_index.read(rel_path)
+            except (OSError, UnicodeDecodeError):
+                continue
+            limit = self.shard_tokens * 4
+            if len(content) > limit:
+                # Arquivo maior que um shard: só o começo é resumido
+                content = content[:limit] + "\n[... truncated ...]"
+            tokens = estimate_tokens(content)
+            if current and used + tokens > self.shard_tokens:
+                shards.append(current)
+                current, used = [], 0
+            current.append((rel_path, self.codebase_index.file_hash(rel_path), content))
+            used += tokens
+        if current:
+            shards.append(current)
+        return shards
+
+    def shard_prompt(self, project, shard):
+        sections = "\n".join(f"""
+File: {rel_path}
+```
+{content}
+```""" for rel_path, _, content in shard)
+        return f"""Summarize each of the following files from the project '{project}' for a developer who has not seen them.
+For every file write 2-5 sentences: its purpose, the main classes/functions it defines and what it uses from other files.
+Respond only with a JSON object mapping each file path exactly as given to its summary.
+{sections}"""
+
+    def summarize_shard(self, project, shard):
+        text = complete_text(self.model, self.shard_prompt(project, shard))
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end == -1:
+            raise ValueError("response has no JSON object")
+        answer = json.loads(text[start:end + 1], strict=False)
+
+        summaries = {}
+        for rel_path, digest, _ in shard:
+            summary = answer.get(rel_path)
+            if summary is None:
+                # O modelo às vezes muda as barras ou o começo do caminho
+                normalized = rel_path.replace(os.sep, "/")
+                summary = next((value for key, value in answer.items()
+                                if key.replace("\\", "/").lstrip("./").endswith(normalized)), None)
+            if isinstance(summary, str) and summary.strip():
+                summaries[rel_path] = {"hash": digest, "summary": summary.strip()}
+        return summaries
+
+    def update(self, project, files):
+        """Summarizes the files whose content changed; returns (reused, summarized, failed)"""
+        # Resumos de arquivos removidos não são mais necessários
+        for rel_path in list(self.summaries):
+            if rel_path not in files:
+                del self.summaries[rel_path]
+
+        pending = self.pending(files)
+        reused = len(files) - len(pending)
+        if not pending:
+            return reused, 0, 0
+
+        shards = self.shards(pending)
+        workers = min(self.workers or max_workers(), len(shards))
+        console.print(f"[dim]Summarizing {len(pending)} file(s) in {len(shards)} shard(s) with up to {workers} "
+                      f"parallel requests; {reused} summaries reused[/dim]")
+
+        summarized, failed = 0, 0
+        for number, (shard, result, error) in enumerate(ordered_map(lambda s: self.summarize_shard(project, s), shards, workers), 1):
+            if error is not None:
+                console.print(f"[yellow]Shard {number}/{len(shards)} failed: {error}[/yellow]")
+                failed += len(shard)
+                continue
+            self.summaries.update(result)
+            summarized += len(result)
+            failed += len(shard) - len(result)
+            # Salvo a cada shard: uma execução interrompida não perde o que já foi feito
+            self.save()
+            console.print(f"[dim]Shard {number}/{len(shards)} done ({len(result)}/{len(shard)} files)[/dim]")
+        return reused, summarized, failed
+
+    def summary_lines(self, files):
+        return [f"- {rel_path}: {self.summaries[rel_path]['summary']}" for rel_path in files if rel_path in self.summaries]
+
+    def condense(self, project, lines, query):
+        """Condenses summary lines by directory when they do not fit in one prompt"""
+        groups, current, used = [], [], 0
+        for line in lines:
+            tokens = estimate_tokens(line)
+            if current and used + tokens > self.shard_tokens:
+                groups.append(current)
+                current, used = [], 0
+            current.append(line)
+            used += tokens
+        if current:
+            groups.append(current)
+
+        focus = f" Focus on what matters for this request: {query}" if query else ""
+
+        def condense_group(group):
+            return complete_text(self.model, f"""These are summaries of some files of the project '{project}':
+{chr(10).join(group)}
+
+Condense them into a summary of this part of the project (components, responsibilities, dependencies), keeping file paths.{focus}""").strip()
+
+        console.print(f"[dim]Condensing {len(lines)} summaries in {len(groups)} group(s)...[/dim]")
+        condensed = []
+        for group, result, error in ordered_map(condense_group, groups, self.workers):
+            # Grupo que falhou: manter os resumos originais
+            condensed.append("\n".join(group) if error is not None else result)
+        return condensed
+
+    def reduce_prompt(self, project, files, query=None):
+        """Final prompt built from the file summaries"""
+        lines = self.summary_lines(files)
+        missing = len(files) - len(lines)
+        parts = lines
+        label = "File summaries"
+        if estimate_tokens("\n".join(lines)) > self.shard_tokens * 2:
+            parts = self.condense(project, lines, query)
+            label = "Summaries of the parts of the project"
+
+        note = f"\n({missing} file(s) could not be summarized and are only listed by name.)" if missing else ""
+        console.print(f"[dim]Answer prompt built from {len(lines)} summaries ({format_tokens(estimate_tokens(chr(10).join(parts)))})[/dim]")
+        return f"""Project '{project}' analyzed file by file ({len(files)} text files).{note}
+
+Files:
+{chr(10).join(f'- {f}' for f in files)}
+
+{label}:
+{chr(10).join(parts)}
+
+{f'User query: {query}' if query else OVERVIEW_REQUEST}
+"""
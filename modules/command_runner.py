@@ -0,0 +1,178 @@
+import os
+import time
+import signal
+import threading
+import subprocess
+from collections import deque
+from rich.console import Console
+
+console = Console()
+
+class CommandJob:
+    """A shell command running in its own process group.
+
+    stdout and stderr are read by a background thread into a ring buffer of
+    the last max_lines lines (echoed live when echo is set).
+    """
+
+    MAX_LINE_LENGTH = 2000
+
+    def __init__(self, job_id, command, cwd=None, max_lines=200, echo=True):
+        self.id = job_id
+        self.command = command
+        self.cwd = cwd or os.getcwd()
+        self.echo = echo
+        self.output = deque(maxlen=max_lines)
+        self.total_lines = 0
+        self.started = time.time()
+        self.finished = None
+        self.timed_out = False
+        self.interrupted = False
+
+        kwargs = {}
+        if os.name == 'nt':
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            # Grupo de processos próprio: sinais atingem só este comando e seus filhos
+            kwargs["start_new_session"] = True
+        self.process = subprocess.Popen(
+            command, shell=True, cwd=self.cwd,
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            **kwargs
+        )
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    @property
+    def exit_code(self):
+        return self.process.poll()
+
+    @property
+    def running(self):
+        return self.process.poll() is None
+
+    def _read(self):
+        for raw in iter(self.process.stdout.readline, b""):
+            line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+            if len(line) > self.MAX_LINE_LENGTH:
+                line = line[:self.MAX_LINE_LENGTH] + " [...]"
+            self.output.append(line)
+            self.total_lines += 1
+            if self.echo:
+                console.print(line, markup=False, highlight=False)
+        self.process.stdout.close()
+        self.process.wait()
+        self.finished = time.time()
+
+    def wait(self, timeout=None):
+        """Waits for the command; stops it on timeout or CTRL+C"""
+        try:
+            self.process.wait(timeout=timeout or None)
+        except subprocess.TimeoutExpired:
+            self.timed_out = True
+            self.stop()
+        except KeyboardInterrupt:
+            self.interrupted = True
+            self.stop(first_signal=signal.SIGINT)
+        except Exception:
+            # Não deixar o grupo de processos rodando sem ninguém esperando por ele
+            self.stop()
+            self.reader.join(timeout=5)
+            raise
+        self.reader.join(timeout=5)
+        return self.exit_code
+
+    def signal_group(self, sig):
+        if os.name == 'nt':
+            if sig == signal.SIGINT:
+                self.process.send_signal(signal.CTRL_BREAK_EVENT)
+            else:
+                self.process.terminate()
+            return
+        try:
+            os.killpg(self.process.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def stop(self, first_signal=signal.SIGTERM, grace=3):
+        """Stops the whole process group, escalating to SIGKILL after grace seconds"""
+        if not self.running:
+            return
+        self.signal_group(first_signal)
+        try:
+            self.process.wait(timeout=grace)
+            return
+        except subprocess.TimeoutExpired:
+            pass
+        if first_signal != signal.SIGTERM:
+            self.signal_group(signal.SIGTERM)
+            try:
+                self.process.wait(timeout=grace)
+                return
+            except subprocess.TimeoutExpired:
+                pass
+        self.signal_group(signal.SIGKILL if os.name != 'nt' else signal.SIGTERM)
+        self.process.wait()
+
+    def tail(self, lines=None):
+        output = list(self.output)
+        if lines:
+            output = output[-lines:]
+        return "\n".join(output)
+
+    def status(self):
+        if self.running:
+            return "running"
+        if self.timed_out:
+            return "timed out"
+        if self.interrupted:
+            return "interrupted"
+        return f"exit {self.exit_code}"
+
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+class CommandRunner:
+    """Runs terminal actions with live output, timeouts and background jobs"""
+
+    def __init__(self, max_lines=None, timeout=None):
+        self.max_lines = max_lines or int(os.getenv('GEMICODER_OUTPUT_LINES', '200'))
+        self.timeout = timeout if timeout is not None else float(os.getenv('GEMICODER_COMMAND_TIMEOUT', '600'))
+        self.jobs = {}
+        self.next_id = 1
+
+    def _create(self, command, echo):
+        job = CommandJob(self.next_id, command, max_lines=self.max_lines, echo=echo)
+        self.next_id += 1
+        return job
+
+    def run(self, command, timeout=None):
+        """Runs a command in the foreground and returns the finished job"""
+        job = self._create(command, echo=True)
+        job.wait(timeout if timeout is not None else self.timeout)
+        return job
+
+    def background(self, command):
+        job = self._create(command, echo=False)
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        try:
+            return self.jobs.get(int(job_id))
+        except (TypeError, ValueError):
+            return None
+
+    def running_jobs(self):
+        return [job for job in self.jobs.values() if job.running]
+
+    def stop_all(self):
+        stopped = 0
+        for job in self.running_jobs():
+            job.stop()
+            stopped += 1
+        return stopped
@@ -0,0 +1,142 @@
+import os
+import re
+from modules.action_parser import ActionStreamParser
+from modules.cassette import finish_reason_name
+from modules.chat_history import message_role, message_text, replace_message_text
+
+FENCE = re.compile(r'^[ \t]*```', re.MULTILINE)
+# Respostas bloqueadas não devem ser continuadas
+BLOCKED = ("SAFETY", "RECITATION", "BLOCKLIST", "PROHIBITED_CONTENT")
+TAIL = 200          # fim da resposta citado no pedido de continuação
+MIN_OVERLAP = 12
+
+def max_continuations():
+    return int(os.getenv('GEMICODER_MAX_CONTINUATIONS', '3'))
+
+def open_fence(text):
+    return len(FENCE.findall(text)) % 2 == 1
+
+def truncation_reason(text, response=None):
+    """Why the response looks cut off, or None when it is complete"""
+    reason = finish_reason_name(response) if response is not None else "STOP"
+    if reason in BLOCKED:
+        return None
+    if reason == "MAX_TOKENS":
+        return "output token limit reached"
+    parser = ActionStreamParser()
+    parser.feed(text)
+    if parser.truncated:
+        return "JSON array not closed"
+    if open_fence(text):
+        return "code block not closed"
+    return None
+
+def quoted_tail(text):
+    return text[-TAIL:]
+
+def continuation_prompt(text):
+    return f"""Your previous response was cut off. Continue it exactly where it stopped, starting with the next character.
+Do not repeat anything, do not add any introduction and do not open a new code block or JSON array.
+Your response ended with:
+{quoted_tail(text)}"""
+
+def continuation_contents(content, previous, prompt):
+    """Multi-turn contents for continuing a stateless generate_content call"""
+    parts = list(content) if isinstance(content, (list, tuple)) else [content]
+    return [
+        {"role": "user", "parts": parts},
+        {"role": "model", "parts": [previous]},
+        {"role": "user", "parts": [prompt]}
+    ]
+
+def trim_continuation(previous, text):
+    """Removes the start of text when it echoes the tail quoted in the continuation prompt.
+
+    Anything else is kept, even when it happens to repeat the end of
+    previous (repetitive code is real output).
+    """
+    if open_fence(previous):
+        # O modelo às vezes reabre o bloco de código (```python ...)
+        stripped = text.lstrip("\n")
+        line_end = stripped.find("\n")
+        first_line = stripped[:line_end] if line_end != -1 else stripped
+        if first_line.startswith("```") and first_line[3:].strip():
+            text = stripped[line_end + 1:] if line_end != -1 else ""
+
+    # Só é cortado o que repete o trecho citado no pedido, do menor para o maior:
+    # a última linha recomeçada (resposta parou no meio dela) ou o trecho inteiro
+    tail = quoted_tail(previous)
+    echoes = [tail]
+    if not tail.endswith("\n") and "\n" in tail:
+        echoes.insert(0, tail[tail.rfind("\n") + 1:])
+    for echo in echoes:
+        if len(echo) >= MIN_OVERLAP and text.startswith(echo):
+            return text[len(echo):]
+    return text
+
+class Stitcher:
+    """Streams a continuation, holding back its start until the overlap with the previous text is known"""
+
+    def __init__(self, previous):
+        self.previous = previous
+        self.pending = ""
+        self.resolved = False
+        self.text = ""
+
+    def feed(self, chunk):
+        if self.resolved:
+            self.text += chunk
+            return chunk
+        self.pending += chunk
+        if len(self.pending) < TAIL:
+            return ""
+        return self.flush()
+
+    def flush(self):
+        if self.resolved:
+            return ""
+        self.resolved = True
+        piece = trim_continuation(self.previous, self.pending)
+        self.pending = ""
+        self.text += piece
+        return piece
+
+def merge_continuation(history, prompt, text):
+    """Folds a continuation request and its answer into the previous model message"""
+    if len(history) >= 3 and message_role(history[-2]) == "user" and message_text(history[-2]) == prompt:
+        del history[-2:]
+        replace_message_text(history, len(history) - 1, text)
+
+def complete(send, content, merge=None):
+    """Non-streaming request that asks for continuations until the response is complete.
+
+    send(message, previous) returns a response; previous is the text received
+    so far (None for the first call).
+    """
+    response = send(content, None)
+    text = response.text
+    for _ in range(max_continuations()):
+        if not truncation_reason(text, response):
+            break
+        prompt = continuation_prompt(text)
+        response = send(prompt, text)
+        text += trim_continuation(text, response.text)
+        if merge:
+            merge(prompt, text)
+    return text
+
+def complete_chat(chat, content):
+    """chat.send_message(content).text, continued when the response was cut off"""
+    return complete(
+        lambda message, previous: chat.send_message(message),
+        content,
+        lambda prompt, text: merge_continuation(chat.history, prompt, text)
+    )
+
+def complete_text(model, content):
+    """model.generate_content(content).text, continued when the response was cut off"""
+    def send(message, previous):
+        if previous is None:
+            return model.generate_content(message)
+        return model.generate_content(continuation_contents(content, previous, message))
+    return complete(send, content)
@@ -0,0 +1,90 @@
+import difflib
+from modules.tokens import estimate_tokens, tokens_for_length
+
+class FileContextBuilder:
+    """Builds the active files section of each prompt.
+
+    In "full" mode every file is sent on every turn. In "delta" mode a file is
+    sent in full once per chat; afterwards only a unified diff of its changes
+    (or an "unchanged" marker) is sent. "ephemeral" mode sends every file in
+    full, but the contents are attached to the outgoing request only and the
+    stored history keeps just a reference (see reference()).
+    """
+
+    MODES = ("full", "delta", "ephemeral")
+
+    def __init__(self, mode="full"):
+        self.mode = mode if mode in self.MODES else "full"
+        self.sent = {}  # chat key -> {path: content last sent}
+        self.total_saved_bytes = 0
+
+    def reset(self, key=None):
+        """Forgets what was sent, so the next turn sends every file in full again"""
+        if key is None:
+            self.sent.clear()
+        else:
+            self.sent.pop(key, None)
+
+    def build(self, files, key):
+        """Returns the files section and the stats of this turn"""
+        sent = self.sent.setdefault(key, {})
+        sections = []
+        full_bytes = 0
+
+        for file_path, content in files.items():
+            full_section = self.full_section(file_path, content)
+            full_bytes += len(full_section.encode('utf-8'))
+
+            if self.mode != "delta" or file_path not in sent:
+                sections.append(full_section)
+            elif sent[file_path] == content:
+                sections.append(f"\nFile: {file_path} (unchanged since it was last sent)\n")
+            else:
+                diff = self.diff_section(file_path, sent[file_path], content)
+                # Um diff maior que o arquivo não economiza nada
+                sections.append(diff if len(diff) < len(full_section) else full_section)
+            sent[file_path] = content
+
+        # Arquivos removidos do contexto deixam de ser rastreados
+        for file_path in list(sent):
+            if file_path not in files:
+                del sent[file_path]
+
+        files_content = "".join(sections)
+        sent_bytes = len(files_content.encode('utf-8'))
+        saved_bytes = full_bytes - sent_bytes
+        self.total_saved_bytes += saved_bytes
+
+        stats = {
+            "full_bytes": full_bytes,
+            "sent_bytes": sent_bytes,
+            "saved_bytes": saved_bytes,
+            "saved_tokens": tokens_for_length(saved_bytes),
+            "sent_tokens": estimate_tokens(files_content),
+            "total_saved_bytes": self.total_saved_bytes
+        }
+        return files_content, stats
+
+    @property
+    def ephemeral(self):
+        return self.mode == "ephemeral"
+
+    @staticmethod
+    def reference(files):
+        """Short text that replaces the attached files in the stored history"""
+        return f"Active files in context: {', '.join(files)} (contents were attached to this request only)"
+
+    @staticmethod
+    def full_section(file_path, content):
+        return f"\nFile: {file_path}\n```\n{content}\n```\n"
+
+    @staticmethod
+    def diff_section(file_path, old, new):
+        diff = difflib.unified_diff(
+            old.splitlines(keepends=True),
+            new.splitlines(keepends=True),
+            fromfile=f"a/{file_path}",
+            tofile=f"b/{file_path}"
+        )
+        diff_text = "".join(line if line.endswith("\n") else line + "\n" for line in diff)
+        return f"\nFile: {file_path} (changed since it was last sent, unified diff)\n```diff\n{diff_text}```\n"
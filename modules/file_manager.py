@@ -1,6 +1,7 @@
 import os
 from rich.console import Console
 from rich.prompt import Prompt
+from modules.patcher import apply_patch, parse_patch, retry_prompt, describe_hunk
 
 console = Console()
 
@@ -37,6 +38,52 @@ class FileManager:
             console.print(f"[red]Error editing file: {e}[/red]")
             return False
             
+    def resolve_patch(self, path, content, patch, retries=None):
+        """Applies a patch to content; only the hunks that fail are sent back to the model"""
+        if retries is None:
+            retries = int(os.getenv('GEMICODER_PATCH_RETRIES', '1'))
+        result = apply_patch(content, patch)
+        for _ in range(retries):
+            if not result["failed"]:
+                break
+            console.print(f"[yellow]{len(result['failed'])} hunk(s) did not apply to {path}, asking the model to redo only those[/yellow]")
+            try:
+                response = self.model.generate_content(retry_prompt(path, result["content"], result["failed"]))
+                hunks = parse_patch(response.text)
+            except Exception as e:
+                console.print(f"[red]Error retrying patch: {e}[/red]")
+                break
+            if not hunks:
+                break
+            retry = apply_patch(result["content"], hunks)
+            result = {"content": retry["content"], "applied": result["applied"] + retry["applied"], "failed": retry["failed"]}
+        return result
+
+    def patch_file(self, path, patch):
+        """Applies a unified diff or SEARCH/REPLACE blocks to a file; returns the patch result.
+
+        The file is only written when every hunk applies.
+        """
+        try:
+            # newline="" para manter os finais de linha (CRLF) do arquivo
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                content = f.read()
+            result = self.resolve_patch(path, content, patch)
+            if result["failed"]:
+                for hunk, reason in result["failed"]:
+                    console.print(f"[red]Not applied to {path}: {describe_hunk(hunk)}: {reason}[/red]")
+                console.print(f"[red]{path} was not changed ({len(result['failed'])} hunk(s) failed)[/red]")
+            elif result["applied"]:
+                with open(path, "w", encoding="utf-8", newline="") as f:
+                    f.write(result["content"])
+                fuzzy = [match for _, match in result["applied"] if match != "exact"]
+                note = f", {len(fuzzy)} matched approximately" if fuzzy else ""
+                console.print(f"[green]Patched: {path} ({len(result['applied'])} hunk(s){note})[/green]")
+            return result
+        except Exception as e:
+            console.print(f"[red]Error patching file: {e}[/red]")
+            return None
+            
     def delete_file(self, path):
         try:
             if os.path.isfile(path):
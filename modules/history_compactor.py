@@ -0,0 +1,167 @@
+import json
+import hashlib
+import threading
+from modules.atomic_io import atomic_write_text
+from modules.chat_history import message_role, message_text, make_message
+from modules.tokens import estimate_tokens
+
+SUMMARY_PREFIX = "Summary of the earlier conversation in this chat:\n"
+SUMMARY_ACK = "Understood. I will use this summary as the context of our earlier conversation."
+
+class HistoryCompactor:
+    """Keeps a project chat within a token budget.
+
+    The system prompt (first message) and the last keep_turns exchanges stay
+    verbatim; everything in between is replaced by a rolling summary written
+    by the model. Summaries are generated in a background thread, cached on
+    disk by the digest of the messages they cover, and applied between turns.
+    Only the model context is compacted; the caller records the compaction
+    in the chat log, which keeps every original message.
+    """
+
+    CHUNK_TOKENS = 60000
+    CACHE_ENTRIES = 20
+
+    def __init__(self, model, cache_file, budget_tokens=100000, keep_turns=6):
+        self.model = model
+        self.cache_file = cache_file
+        self.budget_tokens = budget_tokens
+        self.keep_turns = keep_turns
+        self.lock = threading.Lock()
+        self.job = None
+        self.result = None   # (digest, cut, summary)
+        self.error = None
+        self.cache = self.load_cache()
+
+    def load_cache(self):
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_cache(self):
+        # Manter apenas os resumos mais recentes
+        entries = list(self.cache.items())[-self.CACHE_ENTRIES:]
+        self.cache = dict(entries)
+        atomic_write_text(self.cache_file, json.dumps(self.cache))
+
+    def history_tokens(self, history):
+        return sum(estimate_tokens(message_text(msg)) for msg in history)
+
+    def cut_point(self, history):
+        """Index where the verbatim tail starts, or None if nothing can be compacted"""
+        cut = len(history) - 2 * self.keep_turns
+        # O trecho preservado deve começar com uma mensagem do usuário
+        while cut < len(history) and message_role(history[cut]) != "user":
+            cut += 1
+        # Evitar resumir a cada turno quando só há poucas mensagens novas
+        if cut - 1 < max(3, self.keep_turns) or cut >= len(history):
+            return None
+        return cut
+
+    def needs_compaction(self, history):
+        return self.history_tokens(history) > self.budget_tokens and self.cut_point(history) is not None
+
+    @staticmethod
+    def digest(messages):
+        h = hashlib.sha1()
+        for msg in messages:
+            h.update(f"{message_role(msg)}\0{message_text(msg)}\0".encode("utf-8", "surrogatepass"))
+        return h.hexdigest()
+
+    def compacted(self, history, cut, summary):
+        first = history[0]
+        return [
+            first,
+            make_message(first, "user", [SUMMARY_PREFIX + summary]),
+            make_message(first, "model", [SUMMARY_ACK])
+        ] + list(history[cut:])
+
+    def schedule(self, chat):
+        """Starts summarizing in the background when the chat is over budget"""
+        history = chat.history
+        with self.lock:
+            if self.job and self.job.is_alive():
+                return
+            if self.result or not self.needs_compaction(history):
+                return
+            cut = self.cut_point(history)
+            span = list(history[1:cut])
+            self.error = None
+            self.job = threading.Thread(target=self._summarize_job, args=(span, cut), daemon=True)
+            self.job.start()
+
+    def apply(self, chat):
+        """Replaces the summarized messages if a summary is ready; returns (cut, summary) when applied"""
+        with self.lock:
+            result, self.result = self.result, None
+        if not result:
+            return None
+
+        digest, cut, summary = result
+        history = chat.history
+        # O histórico pode ter mudado enquanto o resumo era gerado
+        if cut >= len(history) or self.digest(history[1:cut]) != digest:
+            return None
+        history[:] = self.compacted(history, cut, summary)
+        return cut, summary
+
+    def compact_now(self, chat):
+        """Summarizes and applies synchronously (used by /compact); returns (cut, summary) or None"""
+        history = chat.history
+        cut = self.cut_point(history)
+        if cut is None:
+            return None
+        span = list(history[1:cut])
+        summary = self.summarize(span)
+        history[:] = self.compacted(history, cut, summary)
+        return cut, summary
+
+    def _summarize_job(self, span, cut):
+        try:
+            summary = self.summarize(span)
+            with self.lock:
+                self.result = (self.digest(span), cut, summary)
+        except Exception as e:
+            self.error = e
+
+    def summarize(self, span):
+        digest = self.digest(span)
+        if digest in self.cache:
+            return self.cache[digest]
+
+        # Resumo incremental: cada bloco atualiza o resumo anterior
+        summary = ""
+        for chunk in self.chunks(span):
+            prompt = f"""You are compacting the history of a coding assistant chat.
+{f'Current summary:{chr(10)}{summary}{chr(10)}' if summary else ''}
+New messages:
+{chunk}
+
+Write an updated summary of the whole conversation so far. Keep every decision, requirement, file name,
+command and open problem that later turns may depend on. Omit pleasantries and full file contents.
+Answer only with the summary."""
+            response = self.model.generate_content(prompt)
+            summary = response.text.strip()
+
+        with self.lock:
+            self.cache[digest] = summary
+            self.save_cache()
+        return summary
+
+    def chunks(self, span):
+        chunk, tokens = [], 0
+        for msg in span:
+            text = message_text(msg)
+            if message_role(msg) == "user" and text.startswith(SUMMARY_PREFIX):
+                text = text[len(SUMMARY_PREFIX):]
+            line = f"{'User' if message_role(msg) == 'user' else 'Assistant'}: {text}"
+            line_tokens = estimate_tokens(line)
+            if chunk and tokens + line_tokens > self.CHUNK_TOKENS:
+                yield "\n\n".join(chunk)
+                chunk, tokens = [], 0
+            chunk.append(line[:self.CHUNK_TOKENS * 4])
+            tokens += line_tokens
+        if chunk:
+            yield "\n\n".join(chunk)
@@ -0,0 +1,117 @@
+import io
+import os
+import hashlib
+from modules.tokens import format_size
+from modules.atomic_io import atomic_write_bytes
+
+SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+]
+EXTENSIONS = {"image/jpeg": ".jpg", "image/webp": ".webp", "image/png": ".png", "image/gif": ".gif", "image/bmp": ".bmp"}
+# Formatos que a API aceita sem conversão
+UPLOAD_FORMATS = ("image/png", "image/jpeg", "image/webp")
+
+def sniff_mime(data):
+    """Real image type from the file signature (the extension is not trusted)"""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[4:12] in (b"ftypheic", b"ftypheix", b"ftypmif1"):
+        return "image/heic"
+    for signature, mime in SIGNATURES:
+        if data.startswith(signature):
+            return mime
+    return None
+
+class ImageProcessor:
+    """Prepares images before they are sent to the model.
+
+    Images are decoded with Pillow, rotated according to their EXIF
+    orientation, downscaled so the longest side is at most max_side and
+    re-encoded (WEBP when they have transparency, JPEG otherwise). The
+    original is kept when it is already smaller. Results are cached on disk
+    by the hash of the original bytes and the settings.
+    """
+
+    def __init__(self, cache_dir, max_side=None, quality=None):
+        self.cache_dir = cache_dir
+        self.max_side = max_side or int(os.getenv('GEMICODER_IMAGE_MAX_SIDE', '1568'))
+        self.quality = quality or int(os.getenv('GEMICODER_IMAGE_QUALITY', '85'))
+
+    def cache_key(self, data):
+        h = hashlib.sha256(data)
+        h.update(f"\0{self.max_side}\0{self.quality}".encode())
+        return h.hexdigest()
+
+    def cached(self, key):
+        for mime, extension in EXTENSIONS.items():
+            path = os.path.join(self.cache_dir, key + extension)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    return f.read(), mime
+        return None
+
+    def store(self, key, data, mime):
+        atomic_write_bytes(os.path.join(self.cache_dir, key + EXTENSIONS[mime]), data)
+
+    def process(self, data):
+        """Returns (bytes, mime_type, info) ready to be sent to the model"""
+        original_mime = sniff_mime(data)
+        info = {"original_mime": original_mime, "original_bytes": len(data), "cached": False}
+
+        key = self.cache_key(data)
+        hit = self.cached(key)
+        if hit:
+            info.update(cached=True, bytes=len(hit[0]), mime=hit[1])
+            return hit[0], hit[1], info
+
+        try:
+            # Importado aqui: sem Pillow as imagens são enviadas como estão
+            from PIL import Image, ImageOps
+        except ImportError:
+            if original_mime not in UPLOAD_FORMATS:
+                raise ValueError(f"Unsupported image format ({original_mime or 'unknown'}); install Pillow to convert it")
+            info.update(bytes=len(data), mime=original_mime)
+            return data, original_mime, info
+
+        try:
+            # GIF animado: apenas o primeiro quadro
+            image = Image.open(io.BytesIO(data))
+            image.load()
+        except Exception as e:
+            raise ValueError(f"Not a readable image ({original_mime or 'unknown format'}): {e}")
+
+        image = ImageOps.exif_transpose(image)
+        info["original_size"] = image.size
+        if max(image.size) > self.max_side:
+            image.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+        info["size"] = image.size
+
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        output = io.BytesIO()
+        if has_alpha:
+            image.convert("RGBA").save(output, "WEBP", quality=self.quality, method=4)
+            processed, mime = output.getvalue(), "image/webp"
+        else:
+            image.convert("RGB").save(output, "JPEG", quality=self.quality, optimize=True)
+            processed, mime = output.getvalue(), "image/jpeg"
+
+        # Manter o original quando ele já é menor e não precisou ser reduzido
+        if (original_mime in UPLOAD_FORMATS and info["size"] == info["original_size"]
+                and len(data) <= len(processed)):
+            processed, mime = data, original_mime
+
+        self.store(key, processed, mime)
+        info.update(bytes=len(processed), mime=mime)
+        return processed, mime, info
+
+    def describe(self, info):
+        size = ""
+        if info.get("original_size") and info.get("size") != info.get("original_size"):
+            size = f", {info['original_size'][0]}x{info['original_size'][1]} -> {info['size'][0]}x{info['size'][1]}"
+        source = " (cached)" if info.get("cached") else ""
+        return (f"{info.get('original_mime') or 'image'} {format_size(info['original_bytes'])} -> "
+                f"{info['mime']} {format_size(info['bytes'])}{size}{source}")
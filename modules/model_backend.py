@@ -0,0 +1,297 @@
+import os
+import re
+import json
+import time
+import threading
+from abc import ABC, abstractmethod
+
+DEFAULT_MODEL = 'gemini-2.0-flash-exp'
+DEFAULT_GENERATION_CONFIG = {
+    "max_output_tokens": 8192,
+    "temperature": 0.9,
+    "top_p": 1,
+    "top_k": 1
+}
+
+class ModelBackend(ABC):
+    """Interface GemiCoder uses to talk to a model.
+
+    It mirrors google.generativeai: generate_content() and the chats returned
+    by start_chat() (send_message()) accept stream=True. Responses expose
+    .text and .candidates; streamed responses are iterated chunk by chunk.
+    Chats keep their messages in a mutable history list.
+    """
+
+    model_name = None
+    generation_config = {}
+
+    @abstractmethod
+    def generate_content(self, contents, stream=False, **kwargs):
+        """Stateless request; returns a response (iterable when stream=True)"""
+
+    @abstractmethod
+    def start_chat(self, history=None):
+        """Returns a chat session with send_message() and a mutable history"""
+
+    def forget(self, contents, **kwargs):
+        """Drops the cached response for contents, so the next call asks the model again"""
+
+class GeminiBackend(ModelBackend):
+    def __init__(self, model_name=DEFAULT_MODEL, generation_config=None, api_key=None):
+        # Importado aqui para que o backend local funcione sem a biblioteca do Google
+        import google.generativeai as genai
+
+        self.model_name = model_name
+        self.generation_config = dict(generation_config or DEFAULT_GENERATION_CONFIG)
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(
+            model_name,
+            generation_config=genai.GenerationConfig(**self.generation_config)
+        )
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        return self.model.generate_content(contents, stream=stream, **kwargs)
+
+    def start_chat(self, history=None):
+        return self.model.start_chat(history=history or [])
+
+# Local backend ---------------------------------------------------------------
+
+class Part:
+    def __init__(self, text=None, inline_data=None):
+        self.text = text or ""
+        self.inline_data = inline_data
+
+    def __contains__(self, field):
+        # Mesmo comportamento das mensagens proto: campo presente e preenchido
+        return bool(getattr(self, field, None))
+
+    @classmethod
+    def from_value(cls, value):
+        if isinstance(value, Part):
+            return value
+        if isinstance(value, str):
+            return cls(text=value)
+        if isinstance(value, dict):
+            if 'inline_data' in value:
+                return cls(inline_data=value['inline_data'])
+            if 'mime_type' in value and 'data' in value:
+                return cls(inline_data=value)
+            return cls(text=value.get('text'))
+        return cls(text=getattr(value, 'text', str(value)))
+
+class Content:
+    def __init__(self, role=None, parts=None):
+        self.role = role
+        self.parts = [Part.from_value(part) for part in (parts or [])]
+
+    @classmethod
+    def from_value(cls, value, role="user"):
+        if isinstance(value, Content):
+            return value
+        if isinstance(value, dict) and 'parts' in value:
+            return cls(value.get('role') or role, value['parts'])
+        if isinstance(value, dict) and 'content' in value:
+            return cls(value.get('role') or role, [value['content']])
+        if isinstance(value, (list, tuple)):
+            return cls(role, list(value))
+        if hasattr(value, 'parts'):
+            return cls(getattr(value, 'role', None) or role, list(value.parts))
+        return cls(role, [value])
+
+    @property
+    def text(self):
+        return "".join(part.text for part in self.parts)
+
+class FinishReason:
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, other):
+        return self.name == getattr(other, 'name', other)
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def __repr__(self):
+        return self.name
+
+class Candidate:
+    def __init__(self, text, finish_reason="STOP"):
+        self.content = Content("model", [text])
+        self.finish_reason = FinishReason(finish_reason)
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+
+class FakeResponse:
+    """Scripted response that replays its text with the configured latency"""
+
+    def __init__(self, text, stream=False, latency=0.0, chunk_latency=0.0, chunk_size=40,
+                 finish_reason="STOP", chunks=None, delays=None):
+        self._text = text
+        self.stream = stream
+        self.candidates = [Candidate(text, finish_reason)]
+        if chunks is None:
+            chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)] or [""]
+        self.chunks = chunks
+        # Espera antes de cada chunk (a primeira é a latência até o primeiro token)
+        if delays is None:
+            delays = [latency] + [chunk_latency] * (len(chunks) - 1)
+        self.delays = delays
+        self.done = not stream
+        if not stream:
+            # Chamada sem streaming bloqueia até a resposta completa
+            time.sleep(sum(delays))
+
+    @property
+    def text(self):
+        if not self.done:
+            self.resolve()
+        return self._text
+
+    def __iter__(self):
+        if not self.stream:
+            yield Chunk(self._text)
+            return
+        for index, chunk in enumerate(self.chunks):
+            if index < len(self.delays) and self.delays[index] > 0:
+                time.sleep(self.delays[index])
+            yield Chunk(chunk)
+        self.done = True
+
+    def resolve(self):
+        for _ in self:
+            pass
+
+class FakeChatSession:
+    def __init__(self, backend, history=None):
+        self.backend = backend
+        self.history = [Content.from_value(msg) for msg in (history or [])]
+
+    def send_message(self, content, stream=False, **kwargs):
+        message = Content.from_value(content)
+        history = [Content.from_value(msg) for msg in self.history] + [message]
+        response = self.backend.respond(history, stream)
+        self.history.append(message)
+        self.history.append(response.candidates[0].content)
+        return response
+
+class FakeBackend(ModelBackend):
+    """Deterministic offline backend.
+
+    Responses come from a script: a JSON file with a "responses" list. Entries
+    with a "match" regex answer any prompt that matches it; entries without
+    one are used once each, in order. When nothing applies, the "default"
+    text (or an echo of the prompt) is returned. "latency", "chunk_latency"
+    and "chunk_size" control the simulated timing.
+    """
+
+    def __init__(self, script=None, latency=0.0, chunk_latency=0.0, chunk_size=40,
+                 model_name="fake-model", generation_config=None):
+        self.model_name = model_name
+        self.generation_config = dict(generation_config or DEFAULT_GENERATION_CONFIG)
+        script = script or {}
+        self.rules = [r for r in script.get("responses", []) if "match" in r]
+        self.queue = [r for r in script.get("responses", []) if "match" not in r]
+        self.default = script.get("default")
+        self.latency = script.get("latency", latency)
+        self.chunk_latency = script.get("chunk_latency", chunk_latency)
+        self.chunk_size = script.get("chunk_size", chunk_size)
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f), **kwargs)
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        if isinstance(contents, (list, tuple)) and contents and all(
+                isinstance(c, Content) or (isinstance(c, dict) and 'role' in c) for c in contents):
+            history = [Content.from_value(c) for c in contents]
+        else:
+            history = [Content.from_value(contents)]
+        return self.respond(history, stream)
+
+    def start_chat(self, history=None):
+        return FakeChatSession(self, history)
+
+    def respond(self, history, stream=False):
+        prompt = history[-1].text if history else ""
+        entry = self.pick(prompt)
+        return FakeResponse(
+            entry.get("text", ""),
+            stream=stream,
+            latency=entry.get("latency", self.latency),
+            chunk_latency=entry.get("chunk_latency", self.chunk_latency),
+            chunk_size=self.chunk_size,
+            finish_reason=entry.get("finish_reason", "STOP"),
+            chunks=entry.get("chunks")
+        )
+
+    def pick(self, prompt):
+        with self.lock:
+            self.calls += 1
+            for rule in self.rules:
+                if re.search(rule["match"], prompt, re.DOTALL):
+                    return rule
+            if self.queue:
+                return self.queue.pop(0)
+            if self.default is not None:
+                return {"text": self.default}
+            return {"text": f"Fake response #{self.calls} to: {prompt[:80]}"}
+
+def create_backend(cache_dir=None):
+    """Creates the backend selected by GEMICODER_BACKEND (gemini or fake).
+
+    With a cache_dir, stateless calls go through the response cache
+    (GEMICODER_RESPONSE_CACHE: auto caches the Gemini backend only, on and
+    off force it either way). The cache is never used with a cassette: a
+    recording must contain every call and a replay has nothing to cache.
+    """
+    kind = os.getenv('GEMICODER_BACKEND', 'gemini').lower()
+    model_name = os.getenv('GEMICODER_MODEL', DEFAULT_MODEL)
+
+    # Importado aqui para evitar import circular (cassette usa o backend local)
+    from modules.cassette import RecordingBackend, ReplayBackend
+    from modules.response_cache import CachingBackend, ResponseCache
+
+    cassette = os.getenv('GEMICODER_CASSETTE')
+    cassette_mode = os.getenv('GEMICODER_CASSETTE_MODE', 'replay' if cassette else '').lower()
+    if cassette and cassette_mode == 'replay':
+        return ReplayBackend(cassette, speed=float(os.getenv('GEMICODER_REPLAY_SPEED', '1')))
+
+    if kind == 'fake':
+        latency = float(os.getenv('GEMICODER_FAKE_LATENCY', '0'))
+        chunk_latency = float(os.getenv('GEMICODER_FAKE_CHUNK_LATENCY', '0'))
+        script = os.getenv('GEMICODER_FAKE_SCRIPT')
+        if script:
+            backend = FakeBackend.from_file(script, latency=latency, chunk_latency=chunk_latency)
+        else:
+            backend = FakeBackend(latency=latency, chunk_latency=chunk_latency)
+    elif kind == 'gemini':
+        backend = GeminiBackend(model_name, api_key=os.getenv('GOOGLE_API_KEY'))
+    else:
+        raise ValueError(f"Unknown model backend: {kind}")
+
+    if cassette and cassette_mode == 'record':
+        backend = RecordingBackend(backend, cassette)
+    elif cassette_mode not in ('', 'record'):
+        raise ValueError(f"Unknown cassette mode: {cassette_mode}")
+
+    cache_mode = os.getenv('GEMICODER_RESPONSE_CACHE', 'auto').lower()
+    if cache_mode not in ('auto', 'on', 'off'):
+        raise ValueError(f"Unknown response cache mode: {cache_mode}")
+    # O backend local é determinístico; o cache só vale a pena para o modelo real.
+    # Respostas do cache não passariam pelo gravador e faltariam no cassete
+    recording = cassette and cassette_mode == 'record'
+    if cache_dir and not recording and (cache_mode == 'on' or (cache_mode == 'auto' and kind == 'gemini')):
+        cache = ResponseCache(
+            cache_dir,
+            max_bytes=int(float(os.getenv('GEMICODER_CACHE_SIZE_MB', '100')) * 1024 * 1024),
+            ttl=float(os.getenv('GEMICODER_CACHE_TTL_HOURS', '168')) * 3600
+        )
+        backend = CachingBackend(backend, cache)
+    return backend
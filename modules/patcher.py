@@ -0,0 +1,219 @@
+import os
+import re
+import difflib
+
+SEARCH_PATTERN = re.compile(
+    r'^<{5,9} ?SEARCH[^\n]*\n(.*?)^={5,9}[ \t]*\n(.*?)^>{5,9} ?REPLACE[^\n]*$',
+    re.DOTALL | re.MULTILINE
+)
+HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@')
+
+def is_search_replace(patch):
+    return bool(SEARCH_PATTERN.search(patch))
+
+def parse_patch(patch):
+    """Splits a patch into hunks: {"number", "old", "new", "start", "kind"}.
+
+    Accepts SEARCH/REPLACE blocks or a unified diff (file headers optional,
+    "start" is the 1-based line from the @@ header when there is one).
+    """
+    patch = patch.replace("\r\n", "\n")
+    hunks = []
+    if is_search_replace(patch):
+        for match in SEARCH_PATTERN.finditer(patch):
+            hunks.append({
+                "number": len(hunks) + 1,
+                "old": match.group(1).splitlines(),
+                "new": match.group(2).splitlines(),
+                "start": None,
+                "kind": "search"
+            })
+        return hunks
+
+    current = None
+    for line in patch.split("\n"):
+        header = HUNK_HEADER.match(line)
+        if header:
+            current = {"number": len(hunks) + 1, "old": [], "new": [], "start": int(header.group(1)), "kind": "diff"}
+            hunks.append(current)
+            continue
+        if line.startswith(("--- ", "+++ ", "diff ", "index ", "```")) or line.startswith("\\"):
+            continue
+        if current is None:
+            if not line.startswith(("+", "-", " ")):
+                continue
+            # Diff sem cabeçalho @@: um único bloco sem posição
+            current = {"number": len(hunks) + 1, "old": [], "new": [], "start": None, "kind": "diff"}
+            hunks.append(current)
+        if line.startswith("+"):
+            current["new"].append(line[1:])
+        elif line.startswith("-"):
+            current["old"].append(line[1:])
+        else:
+            # Contexto (o modelo às vezes remove o espaço de linhas vazias)
+            text = line[1:] if line.startswith(" ") else line
+            current["old"].append(text)
+            current["new"].append(text)
+
+    # A linha vazia final do texto não faz parte do último bloco
+    for hunk in hunks:
+        while hunk["old"] and hunk["new"] and hunk["old"][-1] == "" and hunk["new"][-1] == "":
+            hunk["old"].pop()
+            hunk["new"].pop()
+    return [hunk for hunk in hunks if hunk["old"] != hunk["new"]]
+
+def format_hunk(hunk):
+    """A hunk as a SEARCH/REPLACE block (used to ask the model to redo it)"""
+    old = "\n".join(hunk["old"])
+    new = "\n".join(hunk["new"])
+    return f"<<<<<<< SEARCH\n{old}{chr(10) if old else ''}=======\n{new}{chr(10) if new else ''}>>>>>>> REPLACE"
+
+def describe_hunk(hunk):
+    first = next((line.strip() for line in hunk["old"] if line.strip()), "")
+    where = f" at line {hunk['start']}" if hunk.get("start") else ""
+    return f"hunk {hunk['number']}{where} ({first[:50] or 'insertion'})"
+
+def indentation(line):
+    return line[:len(line) - len(line.lstrip())]
+
+def merge_window(old, new, window):
+    """new with the lines the hunk does not change taken from the file itself.
+
+    Each changed line is reindented like the closest old line with the same
+    indentation (or, failing that, one whose indentation it extends), so a
+    block matched ignoring whitespace keeps the file's indentation line by
+    line.
+    """
+    pairs = [(k, indentation(o), indentation(w)) for k, (o, w) in enumerate(zip(old, window))
+             if o.strip() and w.strip()]
+
+    def reindent(line, i):
+        if not line.strip():
+            return line
+        indent = indentation(line)
+        for same in (True, False):
+            found = [(k, o, w) for k, o, w in pairs if (o == indent if same else indent.startswith(o))]
+            if found:
+                _, o, w = min(found, key=lambda pair: (abs(pair[0] - i), -len(pair[1])))
+                return w + line[len(o):]
+        return line
+
+    merged = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+        if tag == "equal":
+            merged.extend(window[i1:i2])
+            continue
+        for j in range(j1, j2):
+            merged.append(reindent(new[j], min(i1 + j - j1, i2 - 1) if i2 > i1 else i1))
+    return merged
+
+def nearest(candidates, hint):
+    if hint is None:
+        return candidates[0]
+    return min(candidates, key=lambda i: abs(i - hint))
+
+def locate(lines, old, hint=None, unique=False, threshold=0.8):
+    """Finds old in lines: exact, then ignoring whitespace, then fuzzy.
+
+    Returns (index, match) where match is "exact", "whitespace" or "fuzzy NN%",
+    or (None, reason) when the block cannot be placed.
+    """
+    size = len(old)
+    if size > len(lines):
+        return None, "context is longer than the file"
+    windows = range(len(lines) - size + 1)
+
+    for match, key in (("exact", lambda s: s), ("whitespace", lambda s: " ".join(s.split()))):
+        wanted = [key(line) for line in old]
+        keyed = [key(line) for line in lines]
+        found = [i for i in windows if keyed[i:i + size] == wanted]
+        if len(found) > 1 and unique and hint is None:
+            return None, f"matches {len(found)} places, needs more context"
+        if found:
+            return nearest(found, hint), match
+
+    # Similaridade entre blocos (ignorando indentação)
+    target = "\n".join(line.strip() for line in old)
+    stripped = [line.strip() for line in lines]
+    best, best_ratio = [], threshold
+    for i in windows:
+        matcher = difflib.SequenceMatcher(None, target, "\n".join(stripped[i:i + size]), autojunk=False)
+        if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+            continue
+        ratio = matcher.ratio()
+        if ratio > best_ratio:
+            best, best_ratio = [i], ratio
+        elif ratio == best_ratio:
+            best.append(i)
+    if best:
+        return nearest(best, hint), f"fuzzy {best_ratio:.0%}"
+    return None, "context not found"
+
+def apply_patch(content, patch, threshold=None):
+    """Applies every hunk that can be placed and reports the ones that cannot.
+
+    Returns {"content", "applied": [(hunk, match)], "failed": [(hunk, reason)]}.
+    Hunks are applied in order; line numbers from diff headers are only
+    used to pick between several matching places. "content" only has the
+    hunks that applied: callers write it when nothing failed. CRLF line
+    endings are kept.
+    """
+    if threshold is None:
+        threshold = float(os.getenv('GEMICODER_PATCH_FUZZ', '0.8'))
+    hunks = parse_patch(patch) if isinstance(patch, str) else patch
+    trailing_newline = content.endswith("\n") or not content
+    newline = "\r\n" if "\r\n" in content else "\n"
+    lines = content.replace("\r\n", "\n").split("\n")
+    if lines and lines[-1] == "":
+        lines.pop()
+
+    applied, failed = [], []
+    offset = 0
+    for hunk in hunks:
+        old, new = hunk["old"], hunk["new"]
+        hint = hunk["start"] - 1 + offset if hunk.get("start") else None
+
+        if not old:
+            # Apenas inserção: na linha indicada ou no fim do arquivo
+            index = len(lines) if hint is None else max(0, min(hint, len(lines)))
+            match = "insert"
+        else:
+            index, match = locate(lines, old, hint, unique=hunk["kind"] == "search", threshold=threshold)
+            if index is None:
+                failed.append((hunk, match))
+                continue
+            if match != "exact":
+                # Contexto aproximado: manter as linhas reais do arquivo
+                new = merge_window(old, new, lines[index:index + len(old)])
+
+        lines[index:index + len(old)] = new
+        offset += len(new) - len(old)
+        applied.append((hunk, match))
+
+    text = newline.join(lines)
+    if trailing_newline and lines:
+        text += newline
+    return {"content": text, "applied": applied, "failed": failed}
+
+def retry_prompt(path, content, failed):
+    blocks = "\n\n".join(format_hunk(hunk) for hunk, _ in failed)
+    reasons = "\n".join(f"- {describe_hunk(hunk)}: {reason}" for hunk, reason in failed)
+    return f"""These changes to {path} could not be applied because their SEARCH text does not match the file:
+{reasons}
+
+{blocks}
+
+Current content of {path}:
+```
+{content}
+```
+
+Reply only with corrected SEARCH/REPLACE blocks for these changes, in the same order. Copy the SEARCH lines exactly from the current content, with enough lines to be unique."""
+
+def summarize(result):
+    """Short text for action results: hunks applied, or the ones that failed"""
+    total = len(result["applied"]) + len(result["failed"])
+    if not result["failed"]:
+        return f"{total} of {total} hunk(s) applied"
+    return (f"{len(result['failed'])} of {total} hunk(s) failed, nothing written; failed: "
+            + "; ".join(f"{describe_hunk(hunk)}: {reason}" for hunk, reason in result["failed"]))
@@ -0,0 +1,509 @@
+import os
+import re
+import json
+import threading
+from datetime import datetime
+from rich.console import Console
+from rich.markup import escape
+from rich.prompt import Prompt
+from modules.action_parser import parse_actions
+from modules.atomic_io import atomic_write_text
+from modules.codebase_index import changed_paths
+from modules.continuation import complete_chat
+from modules.worker_pool import ordered_map
+
+console = Console()
+
+DEPENDS_PATTERN = re.compile(r'\(\s*depends on:?\s*([^)]*)\)', re.IGNORECASE)
+PLAN_FILE = "plan.json"
+FINISHED = ("done", "skipped")
+STATUS_STYLES = {"done": "green", "skipped": "dim", "failed": "red", "pending": "yellow"}
+
+def planning_prompt(project_query, dependencies=False):
+    dependency_rule = """
+8. After each step write which earlier steps of the same iteration it needs, as (depends on: 1, 2),
+   or (depends on: none) when it is independent. Independent steps are executed at the same time,
+   so only mark a step independent if it touches different files than the others""" if dependencies else ""
+    step_suffix = " (depends on: none)" if dependencies else ""
+    dependent_suffix = " (depends on: 1)" if dependencies else ""
+
+    # Modificar o prompt para enfatizar o uso do diretório raiz
+    return f"""Create an iteration plan for the project.
+{f'Project requirements: {project_query}' if project_query else 'Analyze the current project state and create a plan for completion.'}
+
+Rules for the plan:
+1. Each iteration must have maximum 4 steps
+2. Each step should be clear and achievable
+3. Steps should be in logical order
+4. Each iteration should have a clear goal
+5. Consider dependencies between steps
+6. Include testing and validation when needed
+7. IMPORTANT: All files and directories must be created in the root directory '.'
+   - DO NOT create a new project directory inside the project
+   - Use relative paths starting with './' or just the filename
+   - Example: './src/App.js' or 'package.json', not 'my-app/src/App.js'
+   - All commands should run in the current directory
+   - For npm/yarn init, use the current directory{dependency_rule}
+
+Format your response as:
+```plan
+Iteration 1: [Goal Description]
+1. [Step 1]{step_suffix}
+2. [Step 2]{step_suffix}
+3. [Step 3]{dependent_suffix}
+4. [Step 4]{dependent_suffix}
+
+Iteration 2: [Goal Description]
+1. [Step 1]{step_suffix}
+...
+```
+
+Then explain why you chose this order and any important considerations.
+
+Remember: All files and commands must work in the current directory '.' - DO NOT create a new project directory!"""
+
+def step_prompt(iteration, number, text):
+    return f"""Current Iteration: {iteration}
+Current Step: {number} - {text}
+
+Based on this step, please:
+1. Analyze what needs to be done
+2. Generate necessary actions (file creation, modifications, terminal commands)
+3. Ensure all changes are properly tested
+4. Consider dependencies from previous steps
+
+Respond with specific actions to implement this step."""
+
+def parse_plan(plan):
+    """Splits a plan block into iterations with numbered steps and their dependencies"""
+    iterations = []
+    for block in re.findall(r'Iteration \d+:.*?(?=\nIteration \d+:|$)', plan, re.DOTALL):
+        steps = []
+        for number, text in enumerate(re.findall(r'\d+\.\s*(.*?)(?=\n\d+\.|$)', block, re.DOTALL), 1):
+            match = DEPENDS_PATTERN.search(text)
+            if match:
+                depends_on = sorted({int(n) for n in re.findall(r'\d+', match.group(1)) if 0 < int(n) < number})
+                text = DEPENDS_PATTERN.sub('', text)
+            else:
+                # Sem anotação o passo depende do anterior (execução sequencial)
+                depends_on = [number - 1] if number > 1 else []
+            steps.append({"number": number, "text": text.strip(), "depends_on": depends_on})
+        iterations.append({"text": block.strip(), "steps": steps})
+    return iterations
+
+def dependency_waves(steps):
+    """Groups steps into waves; every step only depends on steps of earlier waves"""
+    levels = {}
+    waves = {}
+    for step in steps:
+        level = 1 + max((levels.get(dep, 0) for dep in step["depends_on"]), default=0)
+        levels[step["number"]] = level
+        waves.setdefault(level, []).append(step)
+    return [waves[level] for level in sorted(waves)]
+
+def action_paths(actions):
+    """Normalized file paths an action list writes to"""
+    paths = set()
+    for action in actions:
+        action_type = action.get('action_type')
+        if action_type in ('create', 'edit', 'remove', 'patch') and action.get('path'):
+            paths.add(os.path.normpath(action['path'].strip()))
+        elif action_type == 'move':
+            for path in (action.get('path'), action.get('content')):
+                if path:
+                    paths.add(os.path.normpath(path.strip()))
+    return paths
+
+class PlanCheckpoint:
+    """Plan progress saved as plan.json next to project.json.
+
+    Keeps the parsed plan, the status of every step (pending, done, skipped
+    or failed) and the results of its actions, so /plan-resume can continue
+    from the first unfinished step without asking for a new plan.
+    """
+
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+
+    @classmethod
+    def create(cls, project_dir, query, mode, plan, iterations):
+        for iteration in iterations:
+            for step in iteration["steps"]:
+                step.setdefault("status", "pending")
+                step.setdefault("results", [])
+        data = {
+            "query": query,
+            "mode": mode,
+            "status": "in_progress",
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "plan": plan,
+            "iterations": iterations
+        }
+        checkpoint = cls(os.path.join(project_dir, PLAN_FILE), data)
+        checkpoint.save()
+        return checkpoint
+
+    @classmethod
+    def load(cls, project_dir):
+        path = os.path.join(project_dir, PLAN_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(path, json.load(f))
+
+    @property
+    def iterations(self):
+        return self.data["iterations"]
+
+    @property
+    def mode(self):
+        return self.data.get("mode", "sequential")
+
+    def unfinished_steps(self):
+        return [step for iteration in self.iterations for step in iteration["steps"]
+                if step.get("status") not in FINISHED]
+
+    def update(self, step, status, results=None, error=None):
+        step["status"] = status
+        step["results"] = list(results or [])
+        if error is not None:
+            step["error"] = str(error)
+        else:
+            step.pop("error", None)
+        self.data["status"] = "in_progress" if self.unfinished_steps() else "completed"
+        self.save()
+
+    def save(self):
+        self.data["updated"] = datetime.now().isoformat(timespec="seconds")
+        atomic_write_text(self.path, json.dumps(self.data, indent=4))
+
+class Speculation:
+    """Next plan step requested ahead of time on a branch of the chat"""
+
+    def __init__(self, model, history, step, prompt):
+        self.step = step
+        self.result = None   # (mensagens novas do ramo, texto da resposta)
+        self.error = None
+        self.changed = set()
+        self.chat_moved = False
+        self.thread = threading.Thread(target=self._run, args=(model, list(history), prompt), daemon=True)
+        self.thread.start()
+
+    def _run(self, model, history, prompt):
+        try:
+            branch = model.start_chat(history=history)
+            text = complete_chat(branch, prompt)
+            self.result = (list(branch.history[len(history):]), text)
+        except Exception as e:
+            self.error = e
+
+    def wait(self):
+        self.thread.join()
+        return self.result
+
+class PlanRunner:
+    """Creates an iteration plan in a project chat and executes its steps.
+
+    In parallel mode the plan declares dependencies between the steps of an
+    iteration; steps that do not depend on each other are sent at the same
+    time on branch chats (copies of the current history). Their file actions
+    are checked for conflicts before anything is applied, and the branch
+    messages are merged back into the main chat in step order.
+
+    In pipeline mode the next step is requested on a branch while the current
+    one is reviewed and executed. The early answer is used unless the current
+    step changed a file the next one depends on.
+
+    Progress is checkpointed after every step (see PlanCheckpoint).
+    """
+
+    def __init__(self, app, model, chat, chat_file=None, project=None, project_dir=None):
+        self.app = app
+        self.model = model
+        self.chat = chat
+        self.chat_file = chat_file
+        self.project = project
+        self.project_dir = project_dir or os.getcwd()
+        self.checkpoint = None
+        self.plan = None
+
+    def save(self):
+        if self.chat_file:
+            self.app.save_chat_history(self.chat, self.chat_file)
+
+    def record(self, step, status=None, actions=(), results=(), error=None):
+        """Saves the outcome of a step in the plan checkpoint"""
+        if self.checkpoint is None:
+            return
+        if status is None:
+            if error is not None or any(result["status"] == "failed" for result in results):
+                status = "failed"
+            elif actions and not any(result["status"] == "applied" for result in results):
+                status = "skipped"
+            else:
+                status = "done"
+        self.checkpoint.update(step, status, results, error)
+
+    def create_plan(self, project_query, mode="sequential"):
+        """Asks the model for a plan; returns the parsed iterations or None"""
+        plan_text = complete_chat(self.chat, planning_prompt(project_query, dependencies=(mode == "parallel")))
+
+        # Extrair o plano entre ```plan e ```
+        plan_match = re.search(r'```plan\n(.*?)\n```', plan_text, re.DOTALL)
+        if not plan_match:
+            console.print("[red]Could not parse the plan format[/red]")
+            return None
+
+        plan = plan_match.group(1)
+        self.plan = plan
+
+        # Mostrar o plano e a explicação
+        console.print("\n[bold blue]Project Iteration Plan:[/bold blue]")
+        console.print(plan)
+
+        # Mostrar explicação (texto após o bloco do plano)
+        explanation = plan_text.split('```')[-1].strip()
+        if explanation:
+            console.print("\n[bold]Plan Explanation:[/bold]")
+            console.print(explanation)
+        return parse_plan(plan)
+
+    def start(self, project_query, mode="sequential"):
+        iterations = self.create_plan(project_query, mode)
+        if iterations is None:
+            return
+        self.checkpoint = PlanCheckpoint.create(self.project_dir, project_query, mode, self.plan, iterations)
+        console.print(f"[dim]Plan saved to {PLAN_FILE}; /plan-resume continues it later[/dim]")
+        # Perguntar se quer começar as iterações
+        if Prompt.ask("\nStart executing iterations?", choices=["y", "n"]) == "y":
+            self.run(iterations, mode)
+
+    def resume(self):
+        try:
+            checkpoint = PlanCheckpoint.load(self.project_dir)
+        except (OSError, ValueError) as e:
+            console.print(f"[red]Could not read {PLAN_FILE}: {str(e)}[/red]")
+            return
+        if checkpoint is None:
+            console.print("[yellow]No saved plan for this project. Use /plan to create one.[/yellow]")
+            return
+        if not checkpoint.unfinished_steps():
+            console.print("[green]The saved plan is already complete[/green]")
+            return
+
+        console.print(f"\n[bold blue]Saved plan[/bold blue] [dim]({checkpoint.mode}, created {checkpoint.data.get('created', '?')})[/dim]")
+        for i, iteration in enumerate(checkpoint.iterations, 1):
+            console.print(f"\n[bold]{iteration['text'].splitlines()[0]}[/bold]")
+            for step in iteration["steps"]:
+                status = step.get("status", "pending")
+                style = STATUS_STYLES.get(status, "white")
+                console.print(f"{step['number']}. {step['text']} [{style}]({status})[/{style}]")
+                if step.get("error"):
+                    console.print(f"   [red]{step['error']}[/red]")
+                for result in step.get("results", []):
+                    if result["status"] == "failed":
+                        target = result.get('path') or result.get('command') or ''
+                        console.print(f"   [red]{escape(result['action_type'] + ' ' + target)}: {escape(result.get('detail', 'failed'))}[/red]")
+
+        if Prompt.ask("\nResume from the first unfinished step?", choices=["y", "n"]) == "y":
+            self.checkpoint = checkpoint
+            self.run(checkpoint.iterations, checkpoint.mode)
+
+    def run(self, iterations, mode="sequential"):
+        started = False
+        for i, iteration in enumerate(iterations, 1):
+            # Passos concluídos num plano retomado não são repetidos
+            steps = [step for step in iteration["steps"] if step.get("status") not in FINISHED]
+            if not steps:
+                continue
+
+            console.print(f"\n[bold blue]Starting Iteration {i}[/bold blue]")
+            console.print(iteration["text"])
+
+            if started and Prompt.ask("\nContinue to next iteration?", choices=["y", "n"]) != "y":
+                break
+            started = True
+
+            if mode == "parallel":
+                self.run_parallel(i, steps)
+            elif mode == "pipeline":
+                self.run_pipeline(i, steps)
+            else:
+                self.run_sequential(i, steps)
+
+        console.print("\n[bold green]Project plan execution completed![/bold green]")
+
+    def run_step(self, i, step):
+        """Sends one step on the main chat; returns False when the user stops the iteration"""
+        results = []
+        try:
+            _, actions = self.app.send_and_dispatch(self.chat, step_prompt(i, step["number"], step["text"]), results)
+            self.record(step, actions=actions, results=results)
+        except Exception as e:
+            self.record(step, results=results, error=e)
+            console.print(f"[red]Error in step {step['number']}: {str(e)}[/red]")
+            if Prompt.ask("Continue to next step?", choices=["y", "n"]) != "y":
+                return False
+        # Salvar histórico após cada passo
+        self.save()
+        return True
+
+    def run_sequential(self, i, steps):
+        for step in steps:
+            console.print(f"\n[bold]Step {step['number']}:[/bold] {step['text']}")
+            if Prompt.ask(f"\nExecute step {step['number']}?", choices=["y", "n"]) == "y":
+                if not self.run_step(i, step):
+                    return False
+            else:
+                self.record(step, "skipped")
+                self.save()
+        return True
+
+    def run_parallel(self, i, steps):
+        for wave in dependency_waves(steps):
+            selected = []
+            for step in wave:
+                depends = ", ".join(str(dep) for dep in step["depends_on"]) or "none"
+                console.print(f"\n[bold]Step {step['number']}:[/bold] {step['text']} [dim](depends on: {depends})[/dim]")
+                if Prompt.ask(f"\nExecute step {step['number']}?", choices=["y", "n"]) == "y":
+                    selected.append(step)
+                else:
+                    self.record(step, "skipped")
+
+            if len(selected) == 1 and not self.run_step(i, selected[0]):
+                return False
+            if len(selected) > 1 and not self.run_wave(i, selected):
+                return False
+        return True
+
+    def run_wave(self, i, steps):
+        numbers = ", ".join(str(step["number"]) for step in steps)
+        console.print(f"\n[bold blue]Running steps {numbers} in parallel...[/bold blue]")
+        base = list(self.chat.history)
+
+        def generate(step):
+            # Cada passo roda num ramo com uma cópia do histórico atual
+            branch = self.model.start_chat(history=list(base))
+            text = complete_chat(branch, step_prompt(i, step["number"], step["text"]))
+            return list(branch.history[len(base):]), text
+
+        results = list(ordered_map(generate, steps))
+
+        # Conflitos são verificados antes de aplicar qualquer ação
+        accepted, deferred, claimed = [], [], {}
+        for step, result, error in results:
+            if error is not None:
+                self.record(step, error=error)
+                console.print(f"[red]Error in step {step['number']}: {str(error)}[/red]")
+                if Prompt.ask("Continue to next step?", choices=["y", "n"]) != "y":
+                    return False
+                continue
+            messages, text = result
+            actions, _ = parse_actions(text)
+            paths = action_paths(actions)
+            conflicts = sorted(path for path in paths if path in claimed)
+            if conflicts:
+                owners = ", ".join(sorted({str(claimed[path]) for path in conflicts}))
+                console.print(f"[yellow]Step {step['number']} changes {', '.join(conflicts)} like step {owners}; it will run again after them[/yellow]")
+                deferred.append(step)
+                continue
+            for path in paths:
+                claimed[path] = step["number"]
+            accepted.append((step, messages, text))
+
+        for step, messages, text in accepted:
+            console.print(f"\n[bold]Step {step['number']} result:[/bold]")
+            # Mesclar o ramo no histórico principal antes das ações (análises vêm depois)
+            self.chat.history.extend(messages)
+            results = []
+            try:
+                actions = self.app.dispatch_response(self.chat, text, results=results)
+                self.record(step, actions=actions, results=results)
+            except Exception as e:
+                self.record(step, results=results, error=e)
+                console.print(f"[red]Error in step {step['number']}: {str(e)}[/red]")
+                if Prompt.ask("Continue to next step?", choices=["y", "n"]) != "y":
+                    return False
+            self.save()
+
+        # Passos em conflito rodam depois, já vendo as mudanças dos outros
+        for step in deferred:
+            console.print(f"\n[bold]Step {step['number']}:[/bold] {step['text']}")
+            if not self.run_step(i, step):
+                return False
+        return True
+
+    def run_pipeline(self, i, steps):
+        index = self.app.get_codebase_index(self.project_dir)
+        speculation = None
+
+        for position, step in enumerate(steps):
+            console.print(f"\n[bold]Step {step['number']}:[/bold] {step['text']}")
+            if Prompt.ask(f"\nExecute step {step['number']}?", choices=["y", "n"]) != "y":
+                speculation = None
+                self.record(step, "skipped")
+                self.save()
+                continue
+
+            results = []
+            try:
+                text = None
+                if speculation is not None and speculation.step is step:
+                    text = self.use_speculation(speculation)
+                if text is None:
+                    text = self.app.stream_renderer.send_message(
+                        self.chat, step_prompt(i, step["number"], step["text"]), echo=False).strip()
+
+                # Pedir o próximo passo enquanto este é revisado e executado
+                speculation = None
+                if position + 1 < len(steps):
+                    upcoming = steps[position + 1]
+                    speculation = Speculation(self.model, self.chat.history, upcoming,
+                                              step_prompt(i, upcoming["number"], upcoming["text"]))
+
+                # O watcher também atualiza o índice: comparar os hashes, não o retorno de refresh()
+                index.refresh()
+                before = index.snapshot()
+                history_length = len(self.chat.history)
+                actions = self.app.dispatch_response(self.chat, text, results=results)
+                self.record(step, actions=actions, results=results)
+                if speculation is not None:
+                    index.refresh()
+                    speculation.changed = set(changed_paths(before, index.snapshot()))
+                    speculation.chat_moved = len(self.chat.history) != history_length
+            except Exception as e:
+                speculation = None
+                self.record(step, results=results, error=e)
+                console.print(f"[red]Error in step {step['number']}: {str(e)}[/red]")
+                if Prompt.ask("Continue to next step?", choices=["y", "n"]) != "y":
+                    return False
+
+            # Salvar histórico após cada passo
+            self.save()
+        return True
+
+    def use_speculation(self, speculation):
+        """Merges the early answer into the chat and returns its text, or None if it is stale"""
+        result = speculation.wait()
+        if result is None:
+            console.print(f"[yellow]Early request failed ({str(speculation.error)}); asking again[/yellow]")
+            return None
+        if speculation.chat_moved:
+            console.print("[yellow]The chat continued after the early request; asking again[/yellow]")
+            return None
+
+        messages, text = result
+        actions, _ = parse_actions(text)
+        depends = action_paths(actions)
+        depends.update(os.path.normpath(path) for path in self.app.persistent_files.get(self.project, {}))
+        step_text = speculation.step["text"]
+        stale = sorted(path for path in speculation.changed
+                       if path in depends or path in step_text or os.path.basename(path) in step_text)
+        if stale:
+            console.print(f"[yellow]Previous step changed {', '.join(stale)}; asking again[/yellow]")
+            return None
+
+        console.print("[dim]Using the answer requested during the previous step[/dim]")
+        self.chat.history.extend(messages)
+        return text
@@ -3,6 +3,8 @@ import json
 from rich.console import Console
 from rich.prompt import Prompt
 from rich.table import Table
+from modules.worker_pool import ordered_map, max_workers
+from modules.continuation import complete_text
 
 console = Console()
 
@@ -70,9 +72,9 @@ class ProjectManager:
         """
         
         try:
-            response = model.generate_content(prompt)
             # Tenta encontrar o JSON na resposta usando um parser mais robusto
-            text = response.text.strip()
+            # (respostas cortadas no limite de tokens são continuadas automaticamente)
+            text = complete_text(model, prompt).strip()
             # Procura pelo primeiro '[' e último ']' para extrair apenas o JSON
             start = text.find('[')
             end = text.rfind(']') + 1
@@ -97,11 +99,15 @@ class ProjectManager:
                     project_info['steps'].append(step)
                     if Prompt.ask("Create files for this step now?", choices=["y", "n"]) == "y":
                         self.create_project_files(model, project_dir, step)
+                else:
+                    # Um novo plano não deve vir do cache de respostas
+                    model.forget(prompt)
             
             with open(os.path.join(project_dir, "project.json"), "w") as f:
                 json.dump(project_info, f, indent=4)
             
         except Exception as e:
+            model.forget(prompt)
             console.print(f"[red]Error planning project steps: {str(e)}[/red]")
             console.print("[yellow]Creating default step structure...[/yellow]")
             
@@ -179,14 +185,9 @@ class ProjectManager:
         if Prompt.ask("\nWould you like to check for pending files?", choices=["y", "n"]) == "y":
             self.create_pending_files(model, project_dir)
         
-    def create_project_files(self, model, project_dir, step):
-        console.print("\n[bold blue]Creating files for this step...[/bold blue]")
-        
-        for file_path in step['files_to_create']:
-            full_path = os.path.join(project_dir, file_path)
-            
-            # Criar o prompt para o Gemini gerar o conteúdo do arquivo
-            prompt = f"""
+    def file_prompt(self, project_dir, step, file_path):
+        # Criar o prompt para o Gemini gerar o conteúdo do arquivo
+        return f"""
             Create the content for the file: {file_path}
             This file is part of step {step['step_number']}: {step['description']}
             
@@ -197,16 +198,36 @@ class ProjectManager:
             
             Return only the file content, no explanations needed.
             """
+        
+    def create_project_files(self, model, project_dir, step):
+        console.print("\n[bold blue]Creating files for this step...[/bold blue]")
+        self.generate_files(model, project_dir, [(step, file_path) for file_path in step['files_to_create']])
+        
+    def generate_files(self, model, project_dir, jobs):
+        """Generates (step, file_path) jobs concurrently and reviews them in order"""
+        def generate(job):
+            step, file_path = job
+            return complete_text(model, self.file_prompt(project_dir, step, file_path)).strip()
+        
+        total = len(jobs)
+        if total > 1:
+            console.print(f"[dim]Generating {total} files with up to {min(max_workers(), total)} parallel requests...[/dim]")
+        
+        # Os próximos arquivos continuam sendo gerados enquanto o usuário revisa
+        for index, (job, content, error) in enumerate(ordered_map(generate, jobs), 1):
+            step, file_path = job
+            full_path = os.path.join(project_dir, file_path)
+            
+            if error is not None:
+                console.print(f"[red]Error creating {file_path}: {str(error)}[/red]")
+                continue
             
             try:
-                response = model.generate_content(prompt)
-                content = response.text.strip()
-                
                 # Criar diretórios necessários
                 os.makedirs(os.path.dirname(full_path), exist_ok=True)
                 
                 # Mostrar o conteúdo gerado para aprovação
-                console.print(f"\n[bold]Generated content for {file_path}:[/bold]")
+                console.print(f"\n[bold]Generated content for {file_path}[/bold] [dim]({index}/{total})[/dim]:")
                 console.print(content)
                 
                 if Prompt.ask("\nAccept this content?", choices=["y", "n"]) == "y":
@@ -214,6 +235,8 @@ class ProjectManager:
                         f.write(content)
                     console.print(f"[green]File created: {file_path}[/green]")
                 else:
+                    # Gerar de novo deve pedir outra versão ao modelo, não a rejeitada
+                    model.forget(self.file_prompt(project_dir, step, file_path))
                     console.print(f"[yellow]Skipped: {file_path}[/yellow]")
                     
             except Exception as e:
@@ -225,16 +248,26 @@ class ProjectManager:
         
         console.print("\n[bold]Pending files from accepted steps:[/bold]")
         
+        jobs = []
         for step in project_info['steps']:
             console.print(f"\n[bold]Step {step['step_number']}:[/bold] {step['description']}")
             
+            pending = []
             for file_path in step['files_to_create']:
                 full_path = os.path.join(project_dir, file_path)
                 
                 if not os.path.exists(full_path):
                     console.print(f"- {file_path} [yellow](pending)[/yellow]")
+                    pending.append(file_path)
                 else:
                     console.print(f"- {file_path} [green](created)[/green]")
             
+            if not pending:
+                continue
             if Prompt.ask("\nCreate pending files for this step?", choices=["y", "n"]) == "y":
-                self.create_project_files(model, project_dir, step) 
\ No newline at end of file
+                jobs.extend((step, file_path) for file_path in pending)
+        
+        # Todos os passos selecionados são gerados juntos
+        if jobs:
+            console.print("\n[bold blue]Creating pending files...[/bold blue]")
+            self.generate_files(model, project_dir, jobs)
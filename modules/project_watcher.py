@@ -0,0 +1,293 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from modules.codebase_index import ignored_dir, walk_files
+
+# Constantes de <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+EVENT_HEADER = struct.Struct("iIII")
+
+MAX_DELAY = 2.0     # um lote nunca espera mais que isso, mesmo com eventos contínuos
+MAX_BATCH = 1000    # acima disso o lote vira uma varredura completa
+
+class InotifyBackend:
+    """inotify watches (through libc) on every project directory that is not ignored"""
+
+    name = "inotify"
+
+    def __init__(self, project_dir):
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        self.project_dir = project_dir
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            self.raise_error()
+        self.watches = {}   # wd -> diretório relativo
+        self.dirs = {}      # diretório relativo -> wd
+        self.incomplete = False
+        try:
+            self.add_tree("")
+        except OSError:
+            self.close()
+            raise
+
+    def raise_error(self):
+        code = ctypes.get_errno()
+        raise OSError(code, os.strerror(code))
+
+    def add_watch(self, rel_dir):
+        path = os.path.join(self.project_dir, rel_dir) if rel_dir else self.project_dir
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            self.raise_error()
+        self.watches[wd] = rel_dir
+        self.dirs[rel_dir] = wd
+
+    def add_tree(self, rel_dir):
+        top = os.path.join(self.project_dir, rel_dir) if rel_dir else self.project_dir
+        for root, dirs, _ in os.walk(top):
+            dirs[:] = [d for d in dirs if not ignored_dir(d)]
+            rel = os.path.relpath(root, self.project_dir)
+            self.add_watch("" if rel == "." else rel)
+
+    def remove_tree(self, rel_dir):
+        prefix = rel_dir + os.sep
+        for watched in [d for d in self.dirs if d == rel_dir or d.startswith(prefix)]:
+            wd = self.dirs.pop(watched)
+            self.watches.pop(wd, None)
+            self.libc.inotify_rm_watch(self.fd, wd)
+
+    def wait(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        return bool(ready)
+
+    def read(self):
+        """Pending events as [(rel_path, is_dir)], or None when the kernel queue overflowed"""
+        events = []
+        for _ in range(64):
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                start = offset + EVENT_HEADER.size
+                name = data[start:start + length].split(b"\0", 1)[0]
+                offset = start + length
+
+                if mask & IN_Q_OVERFLOW:
+                    return None
+                if mask & IN_IGNORED:
+                    # Diretório removido: o kernel já descartou o watch
+                    rel_dir = self.watches.pop(wd, None)
+                    if rel_dir is not None and self.dirs.get(rel_dir) == wd:
+                        del self.dirs[rel_dir]
+                    continue
+                parent = self.watches.get(wd)
+                if parent is None or not name:
+                    continue
+
+                name = os.fsdecode(name)
+                rel_path = os.path.join(parent, name) if parent else name
+                if mask & IN_ISDIR:
+                    if ignored_dir(name):
+                        continue
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        try:
+                            self.add_tree(rel_path)
+                        except OSError as e:
+                            # Sem watch (limite de watches atingido) mudanças ali não seriam vistas
+                            if e.errno != errno.ENOENT:
+                                self.incomplete = True
+                    elif mask & (IN_DELETE | IN_MOVED_FROM):
+                        self.remove_tree(rel_path)
+                    events.append((rel_path, True))
+                elif not name.startswith('.'):
+                    events.append((rel_path, False))
+        return events
+
+    @property
+    def closed(self):
+        return self.fd < 0
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+class PollingBackend:
+    """Fallback that compares mtime and size of every project file each interval seconds"""
+
+    name = "polling"
+    incomplete = False
+    closed = False
+
+    def __init__(self, project_dir, interval):
+        self.project_dir = project_dir
+        self.interval = interval
+        self.snapshot = self.scan()
+        self.next_scan = time.monotonic() + interval
+
+    def scan(self):
+        snapshot = {}
+        for rel_path in walk_files(self.project_dir):
+            try:
+                st = os.stat(os.path.join(self.project_dir, rel_path))
+            except OSError:
+                continue
+            snapshot[rel_path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def wait(self, timeout):
+        delay = self.next_scan - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return False
+        time.sleep(max(0, delay))
+        return True
+
+    def read(self):
+        snapshot = self.scan()
+        self.next_scan = time.monotonic() + self.interval
+        events = [(rel_path, False) for rel_path, stat in snapshot.items() if self.snapshot.get(rel_path) != stat]
+        events.extend((rel_path, False) for rel_path in self.snapshot if rel_path not in snapshot)
+        self.snapshot = snapshot
+        return events
+
+    def close(self):
+        self.closed = True
+
+class ProjectWatcher:
+    """Watches a project directory in a background thread and reports changes in batches.
+
+    Uses inotify when available and falls back to polling. Events are
+    debounced: a batch is delivered once no event arrived for debounce
+    seconds (or MAX_DELAY after its first event), so bursts like an
+    `npm install` or a git checkout become a single callback.
+    on_change(files, dirs) receives the changed file paths and the
+    directories to rescan, relative to the project; {""} in dirs means the
+    whole project (first batch, queue overflow or a huge burst).
+    """
+
+    def __init__(self, project_dir, on_change, debounce=None, interval=None, polling=False):
+        self.project_dir = os.path.abspath(project_dir)
+        self.on_change = on_change
+        self.debounce = debounce if debounce is not None else float(os.getenv('GEMICODER_WATCH_DEBOUNCE', '0.3'))
+        self.interval = interval if interval is not None else float(os.getenv('GEMICODER_WATCH_INTERVAL', '2'))
+        self.polling = polling
+        self.backend = None
+        self.lock = threading.RLock()
+        self.stopped = threading.Event()
+        self.thread = None
+        # A primeira entrega é uma varredura completa: pega o que mudou com o GemiCoder fechado
+        self.files, self.dirs = set(), {""}
+        self.first_event = self.last_event = time.monotonic()
+        self.batches = 0
+        self.error = None
+
+    def start(self):
+        if not self.polling:
+            try:
+                self.backend = InotifyBackend(self.project_dir)
+            except (OSError, AttributeError):
+                self.backend = None
+        if self.backend is None:
+            self.backend = PollingBackend(self.project_dir, self.interval)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    @property
+    def live(self):
+        """True when every change is reported as it happens (no directory was left unwatched)"""
+        return self.backend is not None and self.backend.name == "inotify" and not self.backend.incomplete
+
+    def covers(self, rel_path):
+        """Whether changes to rel_path are reported immediately"""
+        if not self.live:
+            return False
+        rel_path = os.path.normpath(rel_path)
+        parent = os.path.dirname(rel_path)
+        return parent in self.backend.dirs and not os.path.basename(rel_path).startswith('.')
+
+    def sync(self):
+        """Delivers the pending changes now (waits for a batch being delivered)"""
+        with self.lock:
+            self._collect()
+            self._deliver()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join(timeout=2)
+        with self.lock:
+            if self.backend:
+                self.backend.close()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            timeout = 0.5
+            if self.files or self.dirs:
+                now = time.monotonic()
+                timeout = max(0, min(timeout, self.debounce - (now - self.last_event), MAX_DELAY - (now - self.first_event)))
+            ready = self.backend.wait(timeout)
+            if self.stopped.is_set():
+                break
+            with self.lock:
+                if ready:
+                    self._collect()
+                now = time.monotonic()
+                if now - self.last_event >= self.debounce or now - self.first_event >= MAX_DELAY:
+                    self._deliver()
+
+    def _collect(self):
+        if self.backend.closed:
+            return
+        events = self.backend.read()
+        if events == []:
+            return
+        now = time.monotonic()
+        if not (self.files or self.dirs):
+            self.first_event = now
+        self.last_event = now
+        if events is None:
+            self.dirs.add("")
+            return
+        for rel_path, is_dir in events:
+            (self.dirs if is_dir else self.files).add(rel_path)
+        if len(self.files) > MAX_BATCH:
+            self.files.clear()
+            self.dirs.add("")
+
+    def _deliver(self):
+        if not (self.files or self.dirs):
+            return
+        files, dirs = self.files, self.dirs
+        self.files, self.dirs = set(), set()
+        if "" in dirs:
+            files, dirs = set(), {""}
+        try:
+            self.on_change(files, dirs)
+        except Exception as e:
+            # Falha no callback não pode derrubar o watcher
+            self.error = e
+        self.batches += 1
@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from modules.atomic_io import atomic_write_text
+from modules.cassette import RecordingStream, prompt_digest, finish_reason_name
+from modules.model_backend import ModelBackend, FakeResponse
+from modules.tokens import format_size
+
+class ResponseCache:
+    """Content-addressed cache of model responses on disk.
+
+    One JSON file per response, named by the key. The least recently used
+    entries are evicted once the files exceed max_bytes, and entries older
+    than ttl seconds are ignored (and removed) when read.
+    """
+
+    def __init__(self, cache_dir, max_bytes=100 * 1024 * 1024, ttl=7 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()   # chave -> tamanho, do menos para o mais recente
+        self.total_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0, "saved_seconds": 0.0}
+        self.load()
+
+    def load(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(".json"):
+                st = entry.stat()
+                found.append((st.st_mtime, entry.name[:-5], st.st_size))
+        # mtime é o último acesso (atualizado a cada hit)
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total_bytes += size
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.stats["misses"] += 1
+                return None
+            try:
+                with open(self.path(key), "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self._remove(key)
+                self.stats["misses"] += 1
+                return None
+
+            if self.ttl and time.time() - entry.get("created", 0) > self.ttl:
+                self._remove(key)
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            self.entries.move_to_end(key)
+            try:
+                os.utime(self.path(key))
+            except OSError:
+                pass
+            self.stats["hits"] += 1
+            self.stats["saved_seconds"] += entry.get("duration", 0.0)
+            return entry
+
+    def put(self, key, entry):
+        entry = dict(entry, created=time.time())
+        data = json.dumps(entry, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            atomic_write_text(self.path(key), data)
+            self.total_bytes += size - self.entries.pop(key, 0)
+            self.entries[key] = size
+            self.stats["stores"] += 1
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                self.stats["evictions"] += 1
+
+    def discard(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            for key in list(self.entries):
+                self._remove(key)
+            return self.stats
+
+    def _remove(self, key):
+        self.total_bytes -= self.entries.pop(key, 0)
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def summary(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        hit_rate = self.stats["hits"] / lookups * 100 if lookups else 0
+        return (f"{len(self.entries)} responses, {format_size(self.total_bytes)} of {format_size(self.max_bytes)} | "
+                f"{self.stats['hits']} hits, {self.stats['misses']} misses ({hit_rate:.0f}% hit rate), "
+                f"{self.stats['evictions']} evicted, {self.stats['expired']} expired | "
+                f"~{self.stats['saved_seconds']:.1f}s of model time saved")
+
+class CachingBackend(ModelBackend):
+    """Wraps a backend and answers repeated generate_content calls from a ResponseCache.
+
+    Only stateless calls are cached: chats are passed through. The key covers
+    the model name, the generation config, extra call arguments and the
+    digest of the prompt parts (images are hashed by their bytes). Only
+    complete responses (finish reason STOP) are stored. Set bypass to send
+    every call to the model; forget() drops a response the user rejected.
+    """
+
+    def __init__(self, backend, cache):
+        self.backend = backend
+        self.cache = cache
+        self.model_name = backend.model_name
+        self.generation_config = backend.generation_config
+        self.bypass = False
+
+    def key(self, contents, kwargs):
+        material = json.dumps({
+            "model": self.model_name,
+            "config": self.generation_config,
+            "kwargs": kwargs,
+            "prompt": prompt_digest(contents)
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        if self.bypass:
+            return self.backend.generate_content(contents, stream=stream, **kwargs)
+
+        key = self.key(contents, kwargs)
+        entry = self.cache.get(key)
+        if entry is not None:
+            return FakeResponse(entry["text"], stream=stream, chunks=[entry["text"]])
+
+        started = time.perf_counter()
+        response = self.backend.generate_content(contents, stream=stream, **kwargs)
+
+        def store(text):
+            if text and finish_reason_name(response) == "STOP":
+                self.cache.put(key, {"text": text, "duration": time.perf_counter() - started})
+
+        if stream:
+            return RecordingStream(response, started, lambda recorded: store("".join(recorded.chunks)))
+
+        try:
+            store(response.text)
+        except (ValueError, AttributeError):
+            # Resposta bloqueada ou sem texto: não guardar
+            pass
+        return response
+
+    def forget(self, contents, **kwargs):
+        self.cache.discard(self.key(contents, kwargs))
+
+    def start_chat(self, history=None):
+        return self.backend.start_chat(history)
+
+    def __getattr__(self, name):
+        # summary() do cassete e outros atributos do backend original
+        return getattr(self.backend, name)
@@ -0,0 +1,223 @@
+import os
+import re
+import json
+import math
+import hashlib
+from collections import Counter, defaultdict
+from modules.atomic_io import atomic_write_text
+from modules.tokens import estimate_tokens
+
+WORD = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\d+')
+CAMEL = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+STOPWORDS = {
+    'the', 'and', 'or', 'is', 'are', 'of', 'to', 'in', 'for', 'on', 'it', 'this', 'that', 'with',
+    'as', 'be', 'by', 'an', 'at', 'if', 'else', 'not', 'do', 'does', 'how', 'what', 'where', 'which',
+    'self', 'def', 'return', 'import', 'from', 'const', 'let', 'var', 'true', 'false', 'none', 'null'
+}
+
+def tokenize(text):
+    """Lowercase terms; identifiers also contribute their camelCase/snake_case parts"""
+    terms = []
+    for word in WORD.findall(text):
+        lower = word.lower()
+        if len(lower) > 1 and lower not in STOPWORDS:
+            terms.append(lower)
+        parts = [part.lower() for piece in word.split('_') for part in CAMEL.findall(piece)]
+        if len(parts) > 1:
+            terms.extend(part for part in parts if len(part) > 1 and part not in STOPWORDS)
+    return terms
+
+def trigrams(term):
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class RetrievalIndex:
+    """BM25 index over line chunks of the project's text files.
+
+    Chunks are windows of chunk_lines lines (overlapping by a few lines).
+    The term counts of each chunk are persisted next to the codebase index,
+    split in SHARDS files by path hash, and update() only re-chunks files
+    whose content hash changed and only rewrites the shards they fall in. Query
+    terms missing from the vocabulary are matched to similar terms by
+    trigram overlap (typos, partial identifiers).
+    """
+
+    VERSION = 1
+    SHARDS = 16
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, codebase_index, index_dir, chunk_lines=60, overlap=10):
+        self.codebase_index = codebase_index
+        self.index_dir = index_dir
+        self.chunk_lines = chunk_lines
+        self.overlap = overlap
+        self.files = {}       # rel_path -> {"hash", "chunks": [{"start", "end", "length", "terms"}]}
+        self.postings = None  # termo -> [(rel_path, número do chunk, tf)], reconstruído quando necessário
+        self.load()
+
+    def shard(self, rel_path):
+        return int(hashlib.md5(rel_path.encode("utf-8")).hexdigest()[:4], 16) % self.SHARDS
+
+    def shard_file(self, number):
+        return os.path.join(self.index_dir, f"{number:02d}.json")
+
+    def load(self):
+        for number in range(self.SHARDS):
+            path = self.shard_file(number)
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if data.get("version") == self.VERSION and data.get("chunk_lines") == self.chunk_lines:
+                # Entradas no shard errado (SHARDS mudou) são ignoradas e reindexadas
+                self.files.update((rel_path, entry) for rel_path, entry in data.get("files", {}).items()
+                                  if self.shard(rel_path) == number)
+
+    def save(self, shards=None):
+        """Writes the given shards (all of them by default)"""
+        for number in sorted(range(self.SHARDS) if shards is None else shards):
+            files = {rel_path: entry for rel_path, entry in self.files.items() if self.shard(rel_path) == number}
+            data = {"version": self.VERSION, "chunk_lines": self.chunk_lines, "files": files}
+            atomic_write_text(self.shard_file(number), json.dumps(data))
+
+    def update(self):
+        """Re-chunks changed files and drops removed ones; returns the number of files re-indexed.
+
+        Call it after the codebase index was refreshed.
+        """
+        index = self.codebase_index
+        current = set(index.text_files())
+        changed = 0
+        dirty = set()
+        for rel_path in list(self.files):
+            if rel_path not in current:
+                del self.files[rel_path]
+                dirty.add(self.shard(rel_path))
+                changed += 1
+        for rel_path in current:
+            digest = index.file_hash(rel_path)
+            entry = self.files.get(rel_path)
+            if entry and digest and entry["hash"] == digest:
+                continue
+            try:
+                content = index.read(rel_path)
+            except (OSError, UnicodeDecodeError):
+                if self.files.pop(rel_path, None):
+                    dirty.add(self.shard(rel_path))
+                continue
+            self.files[rel_path] = {"hash": index.file_hash(rel_path), "chunks": self.chunk(rel_path, content)}
+            dirty.add(self.shard(rel_path))
+            changed += 1
+        if dirty:
+            self.postings = None
+            self.save(dirty)
+        return changed
+
+    def chunk(self, rel_path, content):
+        lines = content.split("\n")
+        # O caminho conta como parte de todos os chunks do arquivo
+        path_terms = tokenize(rel_path.replace(os.sep, " "))
+        step = max(1, self.chunk_lines - self.overlap)
+        chunks = []
+        for start in range(0, max(1, len(lines)), step):
+            end = min(len(lines), start + self.chunk_lines)
+            terms = tokenize("\n".join(lines[start:end])) + path_terms
+            chunks.append({"start": start + 1, "end": end, "length": len(terms), "terms": dict(Counter(terms))})
+            if end >= len(lines):
+                break
+        return chunks
+
+    def build_postings(self):
+        self.postings = defaultdict(list)
+        self.trigram_terms = defaultdict(set)
+        total_length, count = 0, 0
+        for rel_path, entry in self.files.items():
+            for number, chunk in enumerate(entry["chunks"]):
+                total_length += chunk["length"]
+                count += 1
+                for term, tf in chunk["terms"].items():
+                    self.postings[term].append((rel_path, number, tf))
+        for term in self.postings:
+            for gram in trigrams(term):
+                self.trigram_terms[gram].add(term)
+        self.chunk_count = count
+        self.average_length = total_length / count if count else 1
+
+    def expand(self, term, limit=3, threshold=0.45):
+        """Vocabulary terms similar to term, with a weight (1.0 for the term itself)"""
+        if term in self.postings:
+            return {term: 1.0}
+        grams = trigrams(term)
+        overlap = Counter()
+        for gram in grams:
+            for candidate in self.trigram_terms.get(gram, ()):
+                overlap[candidate] += 1
+        similar = {}
+        for candidate, shared in overlap.items():
+            # Um termo com n letras tem n + 1 trigramas (com as bordas)
+            similarity = shared / (len(grams) + len(candidate) + 1 - shared)
+            if len(term) >= 3 and candidate.startswith(term):
+                similarity = max(similarity, 0.6)
+            if similarity >= threshold:
+                similar[candidate] = similarity
+        return dict(sorted(similar.items(), key=lambda item: -item[1])[:limit])
+
+    def search(self, query, limit=None):
+        """Chunks ranked by BM25 score: [(score, rel_path, chunk)]"""
+        if self.postings is None:
+            self.build_postings()
+        if not self.chunk_count:
+            return []
+
+        weights = Counter()
+        for term in tokenize(query):
+            for match, weight in self.expand(term).items():
+                weights[match] = max(weights[match], weight)
+
+        scores = Counter()
+        for term, weight in weights.items():
+            postings = self.postings.get(term, [])
+            idf = math.log(1 + (self.chunk_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for rel_path, number, tf in postings:
+                length = self.files[rel_path]["chunks"][number]["length"]
+                norm = tf * (self.K1 + 1) / (tf + self.K1 * (1 - self.B + self.B * length / self.average_length))
+                scores[(rel_path, number)] += weight * idf * norm
+
+        ranked = scores.most_common(limit)
+        return [(score, rel_path, self.files[rel_path]["chunks"][number]) for (rel_path, number), score in ranked]
+
+    def select(self, query, budget, top_k, min_ratio=0.1):
+        """Best chunks for query whose text fits in budget tokens.
+
+        Chunks scoring below min_ratio of the best one are left out. Returns
+        ([(rel_path, start, end, text)] grouped by file in line order,
+        estimated tokens used).
+        """
+        selected = {}
+        used = 0
+        ranked = self.search(query)
+        for score, rel_path, chunk in ranked:
+            if len(selected) >= top_k or score < ranked[0][0] * min_ratio:
+                break
+            lines = self.codebase_index.read(rel_path).split("\n")
+            # Chunks vizinhos se sobrepõem: enviar só as linhas novas
+            taken = [key for key in selected if key[0] == rel_path]
+            start, end = chunk["start"], chunk["end"]
+            for _, other_start, other_end in taken:
+                if other_start <= start <= other_end:
+                    start = other_end + 1
+                if other_start <= end <= other_end:
+                    end = other_start - 1
+            if start > end:
+                continue
+            text = "\n".join(lines[start - 1:end])
+            cost = estimate_tokens(text) + 20
+            if used + cost > budget:
+                continue
+            selected[(rel_path, start, end)] = text
+            used += cost
+        return [(rel_path, start, end, text) for (rel_path, start, end), text in sorted(selected.items())], used
@@ -0,0 +1,156 @@
+import queue
+import threading
+from rich.console import Console
+from modules.continuation import (Stitcher, continuation_contents, continuation_prompt, max_continuations,
+                                  merge_continuation, truncation_reason)
+
+console = Console()
+
+class StreamRenderer:
+    """Renders model responses chunk by chunk as they arrive"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        # Título da resposta atual, mostrado só quando aparecer o primeiro texto visível
+        self.pending_title = None
+
+    def send_message(self, chat, content, title="AI Response:", echo=True, on_text=None):
+        """Envia a mensagem para o chat e retorna o texto completo da resposta"""
+        return self.respond(
+            lambda message, stream, previous: chat.send_message(message, stream=stream),
+            content, title, echo, on_text,
+            merge=lambda prompt, text: merge_continuation(chat.history, prompt, text)
+        )
+
+    def generate_content(self, model, content, title=None, echo=True, on_text=None):
+        def send(message, stream, previous):
+            if previous is None:
+                return model.generate_content(message, stream=stream)
+            return model.generate_content(continuation_contents(content, previous, message), stream=stream)
+        return self.respond(send, content, title, echo, on_text)
+
+    def respond(self, send, content, title, echo, on_text, merge=None):
+        """Sends content and keeps requesting continuations while the response is cut off.
+
+        Continuations are stitched to the text received so far and passed to
+        on_text as if they were part of the same response.
+        """
+        # Continuações herdam o título ainda não mostrado da primeira parte
+        self.pending_title = None
+        response = send(content, self.enabled, None)
+        text = self.receive(response, title, echo, on_text)
+
+        for _ in range(max_continuations()):
+            reason = truncation_reason(text, response)
+            if not reason:
+                break
+            console.print(f"\n[dim]Response cut off ({reason}), requesting the rest...[/dim]")
+            prompt = continuation_prompt(text)
+            stitcher = Stitcher(text)
+
+            def stitched(chunk):
+                piece = stitcher.feed(chunk)
+                if not piece:
+                    return ""
+                return on_text(piece) if on_text else piece
+
+            response = send(prompt, self.enabled, text)
+            self.receive(response, None, echo, stitched)
+            # Final da continuação retido enquanto a sobreposição não era conhecida
+            rest = stitcher.flush()
+            if rest:
+                shown = on_text(rest) if on_text else rest
+                if echo and shown and self.enabled:
+                    console.print(shown, markup=False, highlight=False)
+            text += stitcher.text
+            if merge:
+                merge(prompt, text)
+
+        if echo and not self.enabled:
+            self.print_full(text, title)
+        return text
+
+    def receive(self, response, title, echo, on_text):
+        if self.enabled:
+            return self.render(response, title, echo, on_text)
+        text = response.text
+        if on_text:
+            on_text(text)
+        return text
+
+    def render(self, response, title=None, echo=True, on_text=None):
+        """Prints the response while it streams.
+
+        on_text is called with every chunk; when given, its return value is
+        the part of the chunk that gets printed. The title is printed before
+        the first visible text, so a response that is only an action list
+        has none.
+        """
+        chunks = []
+        stream = self.stream(response)
+
+        # Mostrar indicador até o primeiro token chegar
+        with console.status("[bold blue]Waiting for response...[/bold blue]"):
+            first = next(stream, None)
+
+        if echo and title:
+            self.pending_title = title
+
+        text = first
+        while text is not None:
+            chunks.append(text)
+            shown = on_text(text) if on_text else text
+            if echo and shown:
+                self.print_title()
+                console.print(shown, end="", markup=False, highlight=False)
+            text = next(stream, None)
+
+        if echo:
+            console.print("")
+        return "".join(chunks)
+
+    def stream(self, response):
+        """Yields the text of each chunk.
+
+        The response is consumed in a background thread so the model keeps
+        generating while the caller is busy (e.g. waiting for a confirmation).
+        """
+        chunks = queue.Queue()
+
+        def pump():
+            try:
+                for chunk in response:
+                    chunks.put(("text", self.chunk_text(chunk)))
+            except Exception as e:
+                chunks.put(("error", e))
+            chunks.put(("done", None))
+
+        threading.Thread(target=pump, daemon=True).start()
+
+        while True:
+            kind, value = chunks.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+            if value:
+                yield value
+
+    def print_title(self):
+        """Prints the title of the response being rendered, once, if it was not shown yet"""
+        if self.pending_title:
+            console.print(f"\n[bold]{self.pending_title}[/bold]")
+            self.pending_title = None
+
+    def print_full(self, text, title=None):
+        if title:
+            console.print(f"\n[bold]{title}[/bold]")
+        console.print(text)
+
+    @staticmethod
+    def chunk_text(chunk):
+        # Chunks without text parts (e.g. safety stops) raise on .text
+        try:
+            return chunk.text
+        except Exception:
+            return ""
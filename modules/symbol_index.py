@@ -0,0 +1,336 @@
+import os
+import re
+import ast
+import json
+import bisect
+import posixpath
+from collections import deque
+from modules.atomic_io import atomic_write_text
+from modules.tokens import estimate_tokens
+
+JS_EXTENSIONS = ('.js', '.jsx', '.ts', '.tsx', '.vue')
+C_EXTENSIONS = ('.c', '.h', '.cpp', '.hpp')
+
+# Definições estilo ctags para as linguagens sem parser
+DEFINITION_PATTERNS = {
+    JS_EXTENSIONS: [
+        (re.compile(r'^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*(\w+)', re.M), "function"),
+        (re.compile(r'^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+(\w+)', re.M), "class"),
+        (re.compile(r'^\s*(?:export\s+)?(?:const|let|var)\s+(\w+)\s*=\s*(?:async\s+)?(?:function|\([^)]*\)\s*=>|\w+\s*=>)', re.M), "function"),
+        (re.compile(r'^\s*(?:export\s+)?(?:interface|type|enum)\s+(\w+)', re.M), "type"),
+    ],
+    ('.java',): [
+        (re.compile(r'^\s*(?:(?:public|private|protected|static|final|abstract)\s+)*(?:class|interface|enum|record)\s+(\w+)', re.M), "class"),
+        (re.compile(r'^\s*(?:(?:public|private|protected|static|final|synchronized|abstract)\s+)+[\w<>\[\],\s]+?\s+(\w+)\s*\(', re.M), "method"),
+    ],
+    ('.go',): [
+        (re.compile(r'^func\s+(?:\([^)]*\)\s*)?(\w+)', re.M), "function"),
+        (re.compile(r'^type\s+(\w+)', re.M), "type"),
+    ],
+    ('.php',): [
+        (re.compile(r'^\s*(?:(?:public|private|protected|static|abstract|final)\s+)*function\s+(\w+)', re.M), "function"),
+        (re.compile(r'^\s*(?:abstract\s+|final\s+)?(?:class|interface|trait)\s+(\w+)', re.M), "class"),
+    ],
+    ('.rb',): [
+        (re.compile(r'^\s*def\s+(?:self\.)?(\w+[?!]?)', re.M), "method"),
+        (re.compile(r'^\s*(?:class|module)\s+(\w+)', re.M), "class"),
+    ],
+    C_EXTENSIONS: [
+        (re.compile(r'^\s*(?:class|struct|enum|union)\s+(\w+)\s*[:{]', re.M), "type"),
+        (re.compile(r'^(?!\s*(?:if|for|while|switch|return|else)\b)[\w:<>\*&]+(?:\s+[\w:<>\*&]+)*\s+\**(\w+)\s*\([^;]*$', re.M), "function"),
+        (re.compile(r'^\s*#define\s+(\w+)', re.M), "macro"),
+    ],
+    ('.sh',): [
+        (re.compile(r'^\s*(?:function\s+)?(\w+)\s*\(\)\s*\{', re.M), "function"),
+    ],
+    ('.pl',): [
+        (re.compile(r'^\s*sub\s+(\w+)', re.M), "function"),
+    ],
+}
+
+# Importações: cada padrão captura o caminho/módulo importado
+IMPORT_PATTERNS = {
+    JS_EXTENSIONS: [
+        re.compile(r'''^\s*(?:import|export)\s[^'"]*?from\s*['"]([^'"]+)['"]''', re.M),
+        re.compile(r'''^\s*import\s*['"]([^'"]+)['"]''', re.M),
+        re.compile(r'''\b(?:require|import)\s*\(\s*['"]([^'"]+)['"]\s*\)'''),
+    ],
+    ('.java',): [re.compile(r'^\s*import\s+(?:static\s+)?([\w.]+)\s*;', re.M)],
+    ('.go',): [re.compile(r'^import\s+(?:\w+\s+)?"([^"]+)"', re.M)],
+    ('.php',): [re.compile(r'''\b(?:require|include)(?:_once)?\s*\(?\s*(?:__DIR__\s*\.\s*)?['"]([^'"]+)['"]''')],
+    ('.rb',): [re.compile(r'''^\s*require(?:_relative)?\s+['"]([^'"]+)['"]''', re.M)],
+    C_EXTENSIONS: [re.compile(r'^\s*#\s*include\s+"([^"]+)"', re.M)],
+    ('.css',): [re.compile(r'''@import\s+(?:url\()?['"]?([^'")\s;]+)''')],
+    ('.html',): [re.compile(r'''<(?:script|link|img)\b[^>]*?\b(?:src|href)\s*=\s*['"]([^'"#?]+)''', re.I)],
+    ('.sh',): [re.compile(r'''^\s*(?:source|\.)\s+['"]?([^'"\s;]+)''', re.M)],
+}
+
+RESOLVE_EXTENSIONS = ('', '.js', '.ts', '.jsx', '.tsx', '.vue', '.json', '.py', '.php', '.rb', '.css', '.h', '.hpp',
+                      '/index.js', '/index.ts', '/index.jsx', '/index.tsx')
+
+def patterns_for(table, extension):
+    for extensions, patterns in table.items():
+        if extension in extensions:
+            return patterns
+    return []
+
+def line_finder(content):
+    """Function mapping a character offset to its 1-based line number"""
+    starts = [match.end() for match in re.finditer("\n", content)]
+    return lambda offset: bisect.bisect_right(starts, offset) + 1
+
+def parse_python(content):
+    """Definitions and imports of a Python file (regex fallback for files that do not parse)"""
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        line_number = line_finder(content)
+        definitions = [[m.group(2), "class" if m.group(1) == "class" else "function", line_number(m.start())]
+                       for m in re.finditer(r'^\s*(?:async\s+)?(def|class)\s+(\w+)', content, re.M)]
+        imports = []
+        for m in re.finditer(r'^\s*(?:from\s+(\.*)([\w.]*)\s+import\s+([\w, ]+)|import\s+([\w.]+))', content, re.M):
+            if m.group(4):
+                imports.append([m.group(4), 0, []])
+            else:
+                imports.append([m.group(2), len(m.group(1)), [name.strip() for name in m.group(3).split(",") if name.strip()]])
+        return definitions, imports
+
+    definitions, imports = [], []
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            definitions.append([node.name, "class", node.lineno])
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    definitions.append([f"{node.name}.{item.name}", "method", item.lineno])
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            definitions.append([node.name, "function", node.lineno])
+        elif isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    definitions.append([target.id, "variable", node.lineno])
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.extend([alias.name, 0, []] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            imports.append([node.module or "", node.level, [alias.name for alias in node.names]])
+    return definitions, imports
+
+def parse_source(rel_path, content):
+    extension = os.path.splitext(rel_path)[1].lower()
+    if extension == '.py':
+        return parse_python(content)
+    definitions = []
+    line_number = line_finder(content)
+    for pattern, kind in patterns_for(DEFINITION_PATTERNS, extension):
+        for match in pattern.finditer(content):
+            definitions.append([match.group(1), kind, line_number(match.start())])
+    definitions.sort(key=lambda definition: definition[2])
+    imports = [[match.group(1), 0, []]
+               for pattern in patterns_for(IMPORT_PATTERNS, extension)
+               for match in pattern.finditer(content)]
+    if extension == '.go':
+        # Bloco import ( ... )
+        for block in re.finditer(r'^import\s*\(([^)]*)\)', content, re.M):
+            imports.extend([spec, 0, []] for spec in re.findall(r'"([^"]+)"', block.group(1)))
+    return definitions, imports
+
+class SymbolIndex:
+    """Definitions and imports of the project's source files, with the import graph.
+
+    Python files are parsed with ast, the other languages of TEXT_EXTENSIONS
+    with ctags-style regexes. Parsed files are persisted next to the codebase
+    index and update() only parses files whose content hash changed. Imports
+    are resolved to project files; external packages are ignored.
+    """
+
+    VERSION = 1
+
+    def __init__(self, codebase_index, index_file):
+        self.codebase_index = codebase_index
+        self.index_file = index_file
+        self.files = {}   # rel_path -> {"hash", "definitions": [[nome, tipo, linha]], "imports": [[módulo, nível, nomes]]}
+        self.graph = None # rel_path -> dependências diretas, recalculado quando algo muda
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION:
+                self.files = data.get("files", {})
+        except (OSError, ValueError):
+            self.files = {}
+
+    def save(self):
+        atomic_write_text(self.index_file, json.dumps({"version": self.VERSION, "files": self.files}))
+
+    def update(self):
+        """Parses changed files and drops removed ones; call it after the codebase index was refreshed"""
+        index = self.codebase_index
+        current = set(index.text_files())
+        changed = 0
+        for rel_path in list(self.files):
+            if rel_path not in current:
+                del self.files[rel_path]
+                changed += 1
+        for rel_path in current:
+            digest = index.file_hash(rel_path)
+            entry = self.files.get(rel_path)
+            if entry and digest and entry["hash"] == digest:
+                continue
+            try:
+                content = index.read(rel_path)
+            except (OSError, UnicodeDecodeError):
+                self.files.pop(rel_path, None)
+                continue
+            definitions, imports = parse_source(rel_path, content)
+            self.files[rel_path] = {"hash": index.file_hash(rel_path), "definitions": definitions, "imports": imports}
+            changed += 1
+        if changed:
+            self.graph = None
+            self.save()
+        return changed
+
+    def posix_files(self):
+        # Caminhos com "/" para resolver importações em qualquer sistema
+        return {rel_path.replace(os.sep, "/"): rel_path for rel_path in self.files}
+
+    def resolve(self, rel_path, spec, level, names, known):
+        """Project files a single import refers to"""
+        source = rel_path.replace(os.sep, "/")
+        folder = posixpath.dirname(source)
+        extension = os.path.splitext(source)[1].lower()
+
+        if extension == '.py':
+            if level:
+                base = folder
+                for _ in range(level - 1):
+                    base = posixpath.dirname(base)
+                roots = [base]
+            else:
+                roots = ["", "src", folder]
+            module = spec.replace(".", "/")
+            found = []
+            for root in roots:
+                path = posixpath.join(root, module) if module else root
+                for name in names:
+                    # "from pacote import modulo"
+                    candidate = posixpath.join(path, name) + ".py"
+                    if candidate in known:
+                        found.append(known[candidate])
+                for candidate in (path + ".py", posixpath.join(path, "__init__.py")):
+                    if module and candidate in known:
+                        found.append(known[candidate])
+                        break
+                if found:
+                    break
+            return found
+
+        if extension == '.java':
+            suffix = spec.replace(".", "/")
+            return [rel for path, rel in known.items() if posixpath.splitext(path)[0].endswith(suffix)][:10]
+
+        if extension == '.go' and not spec.startswith('.'):
+            # Pacote Go: diretório do projeto com o final mais longo do caminho importado
+            parts = spec.split("/")
+            for i in range(len(parts)):
+                suffix = "/".join(parts[i:])
+                found = [rel for path, rel in known.items() if path.endswith(".go")
+                         and (posixpath.dirname(path) == suffix or posixpath.dirname(path).endswith("/" + suffix))]
+                if found:
+                    return found[:10]
+            return []
+
+        if spec.startswith("@/"):
+            candidates = [posixpath.join("src", spec[2:])]
+        elif spec.startswith("/"):
+            candidates = [spec.lstrip("/")]
+        elif spec.startswith(".") or extension in C_EXTENSIONS + ('.css', '.html', '.sh', '.php', '.rb'):
+            candidates = [posixpath.normpath(posixpath.join(folder, spec)), spec]
+        else:
+            # Pacote externo (node_modules etc.)
+            return []
+        for candidate in candidates:
+            for suffix in RESOLVE_EXTENSIONS:
+                if candidate + suffix in known:
+                    return [known[candidate + suffix]]
+        return []
+
+    def build_graph(self):
+        known = self.posix_files()
+        self.graph = {}
+        for rel_path, entry in self.files.items():
+            dependencies = []
+            for spec, level, names in entry["imports"]:
+                for dependency in self.resolve(rel_path, spec, level, names, known):
+                    if dependency != rel_path and dependency not in dependencies:
+                        dependencies.append(dependency)
+            self.graph[rel_path] = dependencies
+        return self.graph
+
+    def dependencies(self, rel_path):
+        if self.graph is None:
+            self.build_graph()
+        return self.graph.get(rel_path, [])
+
+    def find_definitions(self, name):
+        """[(rel_path, name, kind, line)] for a symbol ("Class", "Class.method" or "method")"""
+        found = []
+        for rel_path, entry in sorted(self.files.items()):
+            for definition, kind, line in entry["definitions"]:
+                if definition == name or definition.endswith("." + name):
+                    found.append((rel_path, definition, kind, line))
+        return found
+
+    def find_target(self, target):
+        """Files a target names: a path, "path:symbol", a dotted module or a symbol"""
+        target = target.strip()
+        known = self.posix_files()
+        path, _, symbol = target.partition(":")
+        path = path.replace("\\", "/").strip("/")
+
+        if path in known:
+            return [known[path]], symbol or None
+        module = path.replace(".", "/")
+        for candidate in (module + ".py", module + "/__init__.py"):
+            if candidate in known:
+                return [known[candidate]], symbol or None
+
+        definitions = self.find_definitions(target)
+        if definitions:
+            return list(dict.fromkeys(rel_path for rel_path, *_ in definitions)), target
+
+        # Nome do arquivo sem diretório/extensão
+        stem = posixpath.splitext(posixpath.basename(path))[0]
+        matches = [rel for posix, rel in known.items() if posixpath.splitext(posixpath.basename(posix))[0] == stem]
+        return matches, None
+
+    def collect(self, start_files, budget):
+        """Start files and their transitive dependencies, nearest first, within budget tokens.
+
+        Returns (included, skipped); both are lists of (rel_path, depth, tokens).
+        """
+        included, skipped = [], []
+        used = 0
+        queue = deque((rel_path, 0) for rel_path in start_files)
+        seen = set(start_files)
+        while queue:
+            rel_path, depth = queue.popleft()
+            try:
+                tokens = estimate_tokens(self.codebase_index.read(rel_path))
+            except (OSError, UnicodeDecodeError):
+                continue
+            if used + tokens > budget:
+                # Arquivo grande demais: suas dependências também ficam de fora
+                skipped.append((rel_path, depth, tokens))
+                continue
+            used += tokens
+            included.append((rel_path, depth, tokens))
+            for dependency in self.dependencies(rel_path):
+                if dependency not in seen:
+                    seen.add(dependency)
+                    queue.append((dependency, depth + 1))
+        return included, skipped
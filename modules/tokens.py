@@ -0,0 +1,17 @@
+def estimate_tokens(text):
+    """Rough token estimate (about 4 characters per token) used for budgets"""
+    return tokens_for_length(len(text))
+
+def tokens_for_length(length):
+    return (max(0, length) + 3) // 4
+
+def format_size(num_bytes):
+    for unit in ("B", "KB", "MB"):
+        if abs(num_bytes) < 1024 or unit == "MB":
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+def format_tokens(tokens):
+    if tokens >= 1000:
+        return f"~{tokens / 1000:.1f}k tokens"
+    return f"~{tokens} tokens"
@@ -0,0 +1,33 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+def max_workers(default=4):
+    """Pool size from GEMICODER_MAX_WORKERS (at least 1)"""
+    try:
+        return max(1, int(os.getenv('GEMICODER_MAX_WORKERS', default)))
+    except ValueError:
+        return default
+
+def ordered_map(func, items, workers=None):
+    """Runs func over items in a bounded thread pool and yields (item, result, error) in input order.
+
+    Later items keep running while the caller handles earlier ones, so a slow
+    review of one result overlaps with producing the next. Closing the
+    generator early cancels the items that have not started yet.
+    """
+    items = list(items)
+    if not items:
+        return
+    executor = ThreadPoolExecutor(max_workers=min(workers or max_workers(), len(items)))
+    futures = [executor.submit(func, item) for item in items]
+    try:
+        for item, future in zip(items, futures):
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
+    finally:
+        # cancel_futures só existe a partir do Python 3.9
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
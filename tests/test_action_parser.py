@@ -0,0 +1,60 @@
+from modules.action_parser import ActionStreamParser, ActionTextFilter, parse_actions
+
+RESPONSE = """I'll create the file now.
+```json
+[
+    {"action_type": "create", "path": "a.py", "content": "x = [1, 2]\\nprint('}')"},
+    {"action_type": "terminal", "content": "python a.py"}
+]
+```
+Done, run it with `python a.py`."""
+
+def feed_in_chunks(text, size):
+    display = ActionTextFilter()
+    actions, shown = [], []
+    for i in range(0, len(text), size):
+        new_actions, before, after = display.feed(text[i:i + size])
+        actions.extend(new_actions)
+        shown.append(before + after)
+    shown.append(display.flush())
+    return actions, "".join(shown), display.parser
+
+def test_parse_actions_complete_response():
+    actions, parser = parse_actions(RESPONSE)
+    assert [a["action_type"] for a in actions] == ["create", "terminal"]
+    assert actions[0]["content"] == "x = [1, 2]\nprint('}')"
+    assert not parser.truncated and not parser.errors
+
+def test_parser_returns_objects_as_they_complete():
+    parser = ActionStreamParser()
+    assert parser.feed('[{"action_type": "create", "path": "a"') == []
+    assert parser.feed('}, {"action_type"') == [{"action_type": "create", "path": "a"}]
+    assert parser.truncated
+
+def test_parser_skips_malformed_objects_and_ignores_plain_brackets():
+    actions, parser = parse_actions('See [1] and [note].\n[{"a": 1}, {"b": nope}, {"c": 3}]')
+    assert actions == [{"a": 1}, {"c": 3}]
+    assert len(parser.errors) == 1
+
+def test_filter_hides_array_fence_and_brackets_for_any_chunk_size():
+    for size in (1, 2, 3, 7, 40, len(RESPONSE)):
+        actions, shown, _ = feed_in_chunks(RESPONSE, size)
+        assert len(actions) == 2
+        assert "[" not in shown and "]" not in shown
+        assert "```" not in shown
+        assert shown.startswith("I'll create the file now.")
+        assert shown.rstrip().endswith("Done, run it with `python a.py`.")
+
+def test_filter_keeps_code_blocks_and_brackets_outside_actions():
+    text = "Use a list:\n```python\nitems = [1, 2]\n```\nThat's all [really]."
+    for size in (1, 5, len(text)):
+        actions, shown, _ = feed_in_chunks(text, size)
+        assert actions == []
+        assert shown == text
+
+def test_filter_hides_truncated_array():
+    text = 'Working on it.\n```json\n[{"action_type": "create", "path": "a.py", "content": "x'
+    actions, shown, parser = feed_in_chunks(text, 4)
+    assert actions == []
+    assert parser.truncated
+    assert shown.strip() == "Working on it."
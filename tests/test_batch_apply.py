@@ -0,0 +1,82 @@
+import os
+import pytest
+from modules.batch_apply import BatchApplier, BatchError
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+def test_validate_swaps_create_and_edit_by_existence(tmp_path):
+    write(str(tmp_path / "a.txt"), "old")
+    operations, problems = BatchApplier(str(tmp_path)).validate([
+        {"action_type": "create", "path": "a.txt", "content": "new"},
+        {"action_type": "edit", "path": "b.txt", "content": "new"},
+    ])
+    assert problems == []
+    assert [op["type"] for op in operations] == ["edit", "create"]
+    assert all(op["note"] for op in operations)
+
+def test_validate_reports_conflicts_missing_sources_and_outside_paths(tmp_path):
+    write(str(tmp_path / "a.txt"), "old")
+    operations, problems = BatchApplier(str(tmp_path)).validate([
+        {"action_type": "edit", "path": "a.txt", "content": "one"},
+        {"action_type": "edit", "path": "./a.txt", "content": "two"},
+        {"action_type": "remove", "path": "missing.txt"},
+        {"action_type": "move", "path": "missing.txt", "content": "b.txt"},
+        {"action_type": "create", "path": "../escape.txt", "content": "x"},
+    ])
+    assert len(operations) == 1
+    reasons = [reason for _, reason in problems]
+    assert "also changed by another action" in reasons[0]
+    assert "does not exist" in reasons[1] and "does not exist" in reasons[2]
+    assert "outside the project" in reasons[3]
+
+def test_move_destination_counts_as_touched(tmp_path):
+    write(str(tmp_path / "a.txt"), "old")
+    operations, problems = BatchApplier(str(tmp_path)).validate([
+        {"action_type": "move", "path": "a.txt", "content": "b.txt"},
+        {"action_type": "create", "path": "b.txt", "content": "other"},
+    ])
+    assert len(operations) == 1
+    assert "also changed by another action" in problems[0][1]
+
+def test_apply_writes_moves_and_removes(tmp_path):
+    write(str(tmp_path / "a.txt"), "old")
+    write(str(tmp_path / "m.txt"), "moved")
+    write(str(tmp_path / "r.txt"), "gone")
+    applier = BatchApplier(str(tmp_path))
+    operations, problems = applier.validate([
+        {"action_type": "edit", "path": "a.txt", "content": "new"},
+        {"action_type": "create", "path": "src/b.txt", "content": "b"},
+        {"action_type": "move", "path": "m.txt", "content": "dest/m.txt"},
+        {"action_type": "remove", "path": "r.txt"},
+    ])
+    assert problems == []
+    applier.apply(operations)
+    assert read(str(tmp_path / "a.txt")) == "new"
+    assert read(str(tmp_path / "src" / "b.txt")) == "b"
+    assert read(str(tmp_path / "dest" / "m.txt")) == "moved"
+    assert sorted(os.listdir(tmp_path)) == ["a.txt", "dest", "src"]
+
+def test_failed_step_rolls_back_every_change(tmp_path):
+    write(str(tmp_path / "a.txt"), "old")
+    write(str(tmp_path / "r.txt"), "keep")
+    applier = BatchApplier(str(tmp_path))
+    operations, problems = applier.validate([
+        {"action_type": "edit", "path": "a.txt", "content": "new"},
+        {"action_type": "create", "path": "src/b.txt", "content": "b"},
+        {"action_type": "remove", "path": "r.txt"},
+    ])
+    assert problems == []
+    # Some entre a validação e o commit: a remoção falha depois das gravações
+    os.remove(tmp_path / "r.txt")
+
+    with pytest.raises(BatchError):
+        applier.apply(operations)
+    assert read(str(tmp_path / "a.txt")) == "old"
+    assert sorted(os.listdir(tmp_path)) == ["a.txt"]
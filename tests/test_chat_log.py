@@ -0,0 +1,113 @@
+import json
+from modules.chat_log import ChatLog
+
+def message(role, text):
+    return {"role": role, "parts": [{"text": text}]}
+
+def records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def test_sync_appends_only_new_messages(tmp_path):
+    path = str(tmp_path / "main.jsonl")
+    history = [message("user", "system")]
+    log = ChatLog(path, fsync=False)
+    log.attach(history)
+    history += [message("user", "hi"), message("model", "hello")]
+    log.sync(history)
+    log.sync(history)
+    assert [r["op"] for r in records(path)] == ["append"] * 3
+    assert ChatLog(path).load() == history
+
+def test_replaced_message_is_truncated_and_appended(tmp_path):
+    path = str(tmp_path / "main.jsonl")
+    history = [message("user", "system"), message("user", "hi"), message("model", "hel")]
+    log = ChatLog(path, fsync=False)
+    log.attach(history)
+    history[-1] = message("model", "hello")
+    log.sync(history)
+    assert records(path)[-2] == {"op": "truncate", "length": 2}
+    assert ChatLog(path).load()[-1] == message("model", "hello")
+
+def test_torn_last_line_is_ignored(tmp_path):
+    path = tmp_path / "main.jsonl"
+    history = [message("user", "system")]
+    log = ChatLog(str(path), fsync=False)
+    log.attach(history)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"op": "append", "message": {"ro')
+
+    reopened = ChatLog(str(path), fsync=False)
+    loaded = reopened.load()
+    assert loaded == history
+    reopened.attach(loaded)
+    loaded.append(message("user", "next"))
+    reopened.sync(loaded)
+    assert ChatLog(str(path)).load() == loaded
+
+def test_log_is_rewritten_when_dead_records_pile_up(tmp_path):
+    path = str(tmp_path / "main.jsonl")
+    history = [message("user", "system"), message("model", "v0")]
+    log = ChatLog(path, fsync=False)
+    log.attach(history)
+    for i in range(1, 40):
+        history[-1] = message("model", f"v{i}")
+        log.sync(history)
+    assert len(records(path)) <= ChatLog.COMPACT_MIN_RECORDS
+    assert ChatLog(path).load() == history
+
+def test_legacy_json_chat_is_read(tmp_path):
+    legacy = [message("user", "system"), message("model", "old")]
+    (tmp_path / "main.json").write_text(json.dumps(legacy))
+    log = ChatLog(str(tmp_path / "main.jsonl"), fsync=False)
+    loaded = log.load()
+    assert loaded == legacy
+    log.attach(loaded)
+    assert ChatLog(str(tmp_path / "main.jsonl")).load() == legacy
+
+def compact(history, cut, summary):
+    return [history[0], message("user", f"Summary: {summary}"), message("model", "ok")] + history[cut:]
+
+def test_compaction_keeps_every_original_message(tmp_path):
+    path = str(tmp_path / "main.jsonl")
+    history = [message("user", "system")] + [message("user" if i % 2 else "model", f"m{i}") for i in range(1, 9)]
+    log = ChatLog(path, fsync=False)
+    log.attach(history)
+    original = list(history)
+
+    history[:] = compact(history, 5, "first")
+    log.compact(history, 5, "first")
+    history.append(message("user", "m9"))
+    log.sync(history)
+    # Segunda compactação sobre um contexto já compactado
+    history[:] = compact(history, 5, "second")
+    log.compact(history, 5, "second")
+    history.append(message("model", "m10"))
+    log.sync(history)
+
+    reopened = ChatLog(path, fsync=False)
+    loaded = reopened.load()
+    assert loaded == original + [message("user", "m9"), message("model", "m10")]
+    start, summary = reopened.compaction
+    assert summary == "second"
+    assert compact(loaded, start, summary) == history
+
+def test_rewrite_after_compaction_keeps_hidden_messages(tmp_path):
+    path = str(tmp_path / "main.jsonl")
+    history = [message("user", "system")] + [message("model", f"m{i}") for i in range(1, 7)]
+    log = ChatLog(path, fsync=False)
+    log.attach(history)
+    original = list(history)
+    history[:] = compact(history, 4, "sum")
+    log.compact(history, 4, "sum")
+    log.rewrite(history)
+
+    reopened = ChatLog(path, fsync=False)
+    assert reopened.load() == original
+    assert reopened.compaction == (4, "sum")
+    # Reaberto com o contexto compactado, novas mensagens continuam no lugar certo
+    view = compact(original, 4, "sum")
+    reopened.attach(view, prefix=3)
+    view.append(message("user", "new"))
+    reopened.sync(view)
+    assert ChatLog(path).load() == original + [message("user", "new")]
@@ -0,0 +1,56 @@
+import os
+import json
+import pytest
+from modules.codebase_index import CodebaseIndex, changed_paths
+
+@pytest.fixture
+def project(tmp_path):
+    root = tmp_path / "proj"
+    (root / "src").mkdir(parents=True)
+    (root / "src" / "a.py").write_text("print('a')\n")
+    return root
+
+def test_equivalent_paths_share_one_entry(project, tmp_path):
+    index = CodebaseIndex(str(project), str(tmp_path / "index.json"))
+    index.refresh()
+    absolute = str(project / "src" / "a.py")
+    for path in ("./src/a.py", absolute, "src/../src/a.py"):
+        assert index.read(path) == "print('a')\n"
+    index.refresh_paths(["./src/a.py", absolute])
+    assert index.files() == [os.path.join("src", "a.py")]
+
+def test_paths_outside_the_project_are_rejected(project, tmp_path):
+    (tmp_path / "secret.txt").write_text("no")
+    index = CodebaseIndex(str(project), str(tmp_path / "index.json"))
+    with pytest.raises(ValueError):
+        index.read("../secret.txt")
+    with pytest.raises(ValueError):
+        index.read(str(tmp_path / "secret.txt"))
+    assert index.refresh_paths(["../secret.txt"]) == []
+    assert index.files() == []
+
+def test_refresh_reports_only_content_changes(project, tmp_path):
+    index = CodebaseIndex(str(project), str(tmp_path / "index.json"))
+    assert index.refresh() == [os.path.join("src", "a.py")]
+    assert index.refresh() == []
+    (project / "src" / "a.py").write_text("print('b')\n")
+    assert index.refresh_paths(["src/a.py"]) == [os.path.join("src", "a.py")]
+
+def test_denormalized_entries_of_old_index_files_are_dropped(project, tmp_path):
+    index_file = tmp_path / "index.json"
+    entry = [0, 11, None]
+    index_file.write_text(json.dumps({"version": 1, "files": {
+        os.path.join("src", "a.py"): entry, "./src/a.py": entry, "../x.py": entry}}))
+    index = CodebaseIndex(str(project), str(index_file))
+    assert index.files() == [os.path.join("src", "a.py")]
+
+def test_snapshot_sees_changes_another_refresh_already_picked_up(project, tmp_path):
+    index = CodebaseIndex(str(project), str(tmp_path / "index.json"))
+    index.refresh()
+    before = index.snapshot()
+    (project / "src" / "a.py").write_text("print('changed')\n")
+    (project / "b.py").write_text("b = 1\n")
+    # Outro consumidor (o watcher) atualiza o índice primeiro
+    index.refresh()
+    assert index.refresh() == []
+    assert changed_paths(before, index.snapshot()) == ["b.py", os.path.join("src", "a.py")]
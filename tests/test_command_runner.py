@@ -0,0 +1,24 @@
+import sys
+import pytest
+from modules.command_runner import CommandRunner
+
+def command(code):
+    return f'"{sys.executable}" -c "{code}"'
+
+def test_output_is_kept_and_exit_code_reported():
+    job = CommandRunner(max_lines=2).run(command("print(1); print(2); print(3)"))
+    assert job.exit_code == 0
+    assert job.tail() == "2\n3"
+    assert job.total_lines == 3
+
+def test_timeout_stops_the_command():
+    job = CommandRunner().run(command("import time; time.sleep(30)"), timeout=0.5)
+    assert job.timed_out
+    assert not job.running
+
+def test_failed_wait_stops_the_command():
+    job = CommandRunner()._create(command("import time; time.sleep(30)"), echo=False)
+    with pytest.raises(TypeError):
+        job.wait("30")
+    assert not job.running
+    assert not job.reader.is_alive()
@@ -0,0 +1,32 @@
+from modules.continuation import trim_continuation, continuation_prompt, truncation_reason, Stitcher
+
+def test_repetitive_code_is_not_taken_for_an_echo():
+    previous = "rows = [\n" + "    0,\n" * 40
+    text = "    0,\n    0,\n]\n"
+    assert trim_continuation(previous, text) == text
+
+def test_continuation_without_overlap_is_kept():
+    previous = "def total(items):\n    result = 0\n"
+    text = "    for item in items:\n        result += item\n    return result\n"
+    assert trim_continuation(previous, text) == text
+
+def test_exact_echo_of_the_quoted_tail_is_removed():
+    previous = "".join(f"line {i}\n" for i in range(60))
+    tail = continuation_prompt(previous).rsplit("ended with:\n", 1)[1]
+    assert trim_continuation(previous, tail + "line 60\n") == "line 60\n"
+
+def test_restarted_last_line_is_removed():
+    previous = "x = 1\n    return compute_total("
+    assert trim_continuation(previous, "    return compute_total(items)\n") == "items)\n"
+
+def test_reopened_code_block_is_dropped():
+    previous = "Here:\n```python\nx = 1\n"
+    assert truncation_reason(previous) == "code block not closed"
+    assert trim_continuation(previous, "```python\ny = 2\n```") == "y = 2\n```"
+
+def test_stitcher_streams_the_trimmed_continuation():
+    previous = "a" * 50 + "\nvalue = compute("
+    stitcher = Stitcher(previous)
+    text = "value = compute(1)\n" + "b" * 300
+    out = "".join(stitcher.feed(text[i:i + 7]) for i in range(0, len(text), 7)) + stitcher.flush()
+    assert out == "1)\n" + "b" * 300
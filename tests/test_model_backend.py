@@ -0,0 +1,49 @@
+import pytest
+from modules.model_backend import ModelBackend, FakeBackend
+
+def test_incomplete_backend_fails_when_created():
+    class HalfBackend(ModelBackend):
+        def generate_content(self, contents, stream=False, **kwargs):
+            return None
+
+    with pytest.raises(TypeError):
+        HalfBackend()
+
+def test_fake_backend_answers_from_script():
+    backend = FakeBackend({"responses": [{"match": "hello", "text": "hi there"}], "default": "?"})
+    assert backend.generate_content("say hello").text == "hi there"
+    assert backend.generate_content("other").text == "?"
+
+    chat = backend.start_chat()
+    response = chat.send_message("hello", stream=True)
+    assert "".join(chunk.text for chunk in response) == "hi there"
+    assert len(chat.history) == 2
+
+def test_recorded_cassette_replays_repeated_prompts_with_cache_on(tmp_path, monkeypatch):
+    from modules.model_backend import create_backend
+    cassette = str(tmp_path / "session.jsonl")
+    monkeypatch.setenv("GEMICODER_BACKEND", "fake")
+    monkeypatch.setenv("GEMICODER_RESPONSE_CACHE", "on")
+    monkeypatch.setenv("GEMICODER_CASSETTE", cassette)
+    monkeypatch.setenv("GEMICODER_CASSETTE_MODE", "record")
+    recorder = create_backend(cache_dir=str(tmp_path / "cache"))
+    texts = [recorder.generate_content("same prompt").text for _ in range(2)]
+    assert recorder.recorded == 2
+
+    monkeypatch.setenv("GEMICODER_CASSETTE_MODE", "replay")
+    monkeypatch.setenv("GEMICODER_REPLAY_SPEED", "0")
+    player = create_backend(cache_dir=str(tmp_path / "cache"))
+    assert [player.generate_content("same prompt").text for _ in range(2)] == texts
+
+def test_forgotten_response_is_asked_again(tmp_path, monkeypatch):
+    from modules.model_backend import create_backend
+    monkeypatch.setenv("GEMICODER_BACKEND", "fake")
+    monkeypatch.setenv("GEMICODER_RESPONSE_CACHE", "on")
+    monkeypatch.delenv("GEMICODER_CASSETTE", raising=False)
+    backend = create_backend(cache_dir=str(tmp_path / "cache"))
+    first = backend.generate_content("write a.py").text
+    assert backend.generate_content("write a.py").text == first
+    # Conteúdo rejeitado: a próxima geração não pode vir do cache
+    backend.forget("write a.py")
+    assert backend.generate_content("write a.py").text != first
+    FakeBackend().forget("no cache here")
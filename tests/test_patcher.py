@@ -0,0 +1,50 @@
+from modules.patcher import parse_patch, apply_patch, merge_window, summarize
+from modules.file_manager import FileManager
+
+def block(old, new):
+    return f"<<<<<<< SEARCH\n{old}\n=======\n{new}\n>>>>>>> REPLACE"
+
+def test_parse_unified_diff_with_line_numbers():
+    hunks = parse_patch("--- a/x.py\n+++ b/x.py\n@@ -2,2 +2,2 @@\n a = 1\n-b = 2\n+b = 3\n")
+    assert hunks == [{"number": 1, "old": ["a = 1", "b = 2"], "new": ["a = 1", "b = 3"], "start": 2, "kind": "diff"}]
+
+def test_search_replace_applies_exactly():
+    result = apply_patch("a = 1\nb = 2\n", block("b = 2", "b = 3"))
+    assert result["content"] == "a = 1\nb = 3\n"
+    assert [match for _, match in result["applied"]] == ["exact"]
+
+def test_whitespace_match_keeps_each_lines_indentation():
+    content = "class A:\n    def f(self):\n        if x:\n            return 1\n"
+    # O modelo errou a indentação de forma diferente em cada linha
+    patch = block("def f(self):\n  if x:\n      return 1", "def f(self):\n  if x:\n      return 2\n  return 0")
+    result = apply_patch(content, patch)
+    assert result["applied"][0][1] == "whitespace"
+    assert result["content"] == "class A:\n    def f(self):\n        if x:\n            return 2\n        return 0\n"
+
+def test_merge_window_uses_the_replaced_lines_indentation():
+    old = ["a", "  b", "c"]
+    window = ["    a", "\tb", "    c"]
+    assert merge_window(old, ["a", "  b2", "c"], window) == ["    a", "\tb2", "    c"]
+
+def test_crlf_line_endings_are_kept():
+    result = apply_patch("a = 1\r\nb = 2\r\n", block("b = 2", "b = 3\nc = 4"))
+    assert result["content"] == "a = 1\r\nb = 3\r\nc = 4\r\n"
+
+def test_failed_hunk_is_reported():
+    result = apply_patch("a = 1\n", block("a = 1", "a = 2") + "\n" + block("missing", "x"))
+    assert len(result["applied"]) == 1
+    assert result["failed"][0][1] == "context not found"
+    assert "nothing written" in summarize(result)
+
+def test_patch_file_writes_nothing_when_a_hunk_fails(tmp_path, monkeypatch):
+    monkeypatch.setenv("GEMICODER_PATCH_RETRIES", "0")
+    path = tmp_path / "x.py"
+    path.write_bytes(b"a = 1\r\nb = 2\r\n")
+    manager = FileManager(model=None)
+
+    result = manager.patch_file(str(path), block("a = 1", "a = 2") + "\n" + block("missing", "x"))
+    assert result["failed"]
+    assert path.read_bytes() == b"a = 1\r\nb = 2\r\n"
+
+    manager.patch_file(str(path), block("a = 1", "a = 2"))
+    assert path.read_bytes() == b"a = 2\r\nb = 2\r\n"
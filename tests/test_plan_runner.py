@@ -0,0 +1,33 @@
+import os
+from modules.plan_runner import parse_plan, dependency_waves, action_paths
+
+PLAN = """Iteration 1:
+1. Create the models in models.py
+2. Create the API in api.py (depends on: 1)
+3. Write the README (depends on: none)
+4. Add tests for the API (depends on: 2, 3)
+Iteration 2:
+1. Add logging
+2. Document logging
+"""
+
+def test_parse_plan_reads_steps_and_dependencies():
+    iterations = parse_plan(PLAN)
+    assert len(iterations) == 2
+    steps = iterations[0]["steps"]
+    assert [step["depends_on"] for step in steps] == [[], [1], [], [2, 3]]
+    assert steps[1]["text"] == "Create the API in api.py"
+    # Sem anotação cada passo depende do anterior
+    assert [step["depends_on"] for step in iterations[1]["steps"]] == [[], [1]]
+
+def test_dependency_waves_run_independent_steps_together():
+    waves = dependency_waves(parse_plan(PLAN)[0]["steps"])
+    assert [[step["number"] for step in wave] for wave in waves] == [[1, 3], [2], [4]]
+
+def test_action_paths_normalizes_written_paths():
+    actions = [
+        {"action_type": "create", "path": "./src/a.py"},
+        {"action_type": "move", "path": "old.py", "content": "new/b.py"},
+        {"action_type": "terminal", "content": "ls"},
+    ]
+    assert action_paths(actions) == {os.path.join("src", "a.py"), "old.py", os.path.join("new", "b.py")}
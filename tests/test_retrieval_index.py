@@ -0,0 +1,48 @@
+import os
+from modules.codebase_index import CodebaseIndex
+from modules.retrieval_index import RetrievalIndex, tokenize
+
+def make_project(root, count=20):
+    for i in range(count):
+        (root / f"mod{i}.py").write_text(f"def handler_{i}(request):\n    return render_page_{i}(request)\n")
+
+def open_index(tmp_path):
+    index = CodebaseIndex(str(tmp_path / "project"), str(tmp_path / "cache" / "index.json"))
+    index.refresh()
+    return index, RetrievalIndex(index, str(tmp_path / "cache" / "retrieval"))
+
+def shard_inodes(tmp_path):
+    folder = tmp_path / "cache" / "retrieval"
+    return {name: os.stat(folder / name).st_ino for name in os.listdir(folder)}
+
+def test_tokenize_splits_identifiers():
+    assert tokenize("parseHTTPRequest user_id") == ["parsehttprequest", "parse", "http", "request", "user_id", "user", "id"]
+
+def test_search_ranks_the_file_with_the_term(tmp_path):
+    (tmp_path / "project").mkdir()
+    make_project(tmp_path / "project")
+    index, retrieval = open_index(tmp_path)
+    assert retrieval.update() == 20
+    assert retrieval.search("render_page_7")[0][1] == "mod7.py"
+    # Termo incompleto ainda encontra o termo por trigramas
+    assert retrieval.search("render_pag_3")[0][1] == "mod3.py"
+
+def test_update_rewrites_only_changed_shards(tmp_path):
+    (tmp_path / "project").mkdir()
+    make_project(tmp_path / "project")
+    index, retrieval = open_index(tmp_path)
+    retrieval.update()
+    before = shard_inodes(tmp_path)
+    assert retrieval.update() == 0
+    assert shard_inodes(tmp_path) == before
+
+    (tmp_path / "project" / "mod4.py").write_text("def changed():\n    pass\n")
+    index.refresh()
+    assert retrieval.update() == 1
+    after = shard_inodes(tmp_path)
+    rewritten = [name for name in after if after[name] != before.get(name)]
+    assert rewritten == [f"{retrieval.shard('mod4.py'):02d}.json"]
+
+    reopened = RetrievalIndex(index, str(tmp_path / "cache" / "retrieval"))
+    assert reopened.files == retrieval.files
+    assert reopened.update() == 0
@@ -0,0 +1,15 @@
+from modules.model_backend import FakeBackend
+from modules.stream_renderer import StreamRenderer
+
+def send(renderer, text, on_text=None):
+    chat = FakeBackend({"default": text, "chunk_size": 5}).start_chat()
+    return renderer.send_message(chat, "prompt", on_text=on_text)
+
+def test_title_waits_for_visible_text(capsys):
+    renderer = StreamRenderer()
+    assert send(renderer, '[{"action_type": "terminal"}]', on_text=lambda chunk: "") == '[{"action_type": "terminal"}]'
+    assert "AI Response:" not in capsys.readouterr().out
+
+    send(renderer, "Hello there.")
+    out = capsys.readouterr().out
+    assert out.index("AI Response:") < out.index("Hello there.")